@@ -1,9 +1,13 @@
 import json
 from pathlib import Path
 import streamlit as st
-from monte_carlo import generate_monte_carlo_results
-import csv
-import re
+from monte_carlo import (N_ITER, SEED, generate_monte_carlo_results, inputs_hash, load_role_poa,
+                         plot_loss_distribution, plot_mitigation_comparison)
+from drilldown import load_cube
+from feature_cache import open_feature_cache
+from peer_analytics import peer_outliers, user_profile
+from portfolio import load_software_solutions, optimize_portfolio, plot_frontier
+from tail_metrics import plot_tail_metrics
 
 st.set_page_config(
     page_title="BillyBank Insider Risk Dashboard",
@@ -48,25 +52,64 @@ LOSS_DIST_IMG = OUTPUT_DIR / "monte_carlo_results" / "monte_carlo_loss_distribut
 COMPARISON_IMG = OUTPUT_DIR / "monte_carlo_results" / "mitigation_comparison.jpg"
 RESULTS_JSON = OUTPUT_DIR / "monte_carlo_results" / "monte_carlo_results.json"
 
-def load_software_solutions(csv_path):
-    software_solutions = {}
-    with open(csv_path, newline="") as file:
-        reader = csv.reader(file)
-        next(reader) # Skip header row
-        for row in reader:
-            name = row[1].strip()
-            weight = float(row[2]) / 100.0
-            cost = int(row[3])
-            key = re.sub(r"[^a-z0-9]", "", name.lower())
-            software_solutions[name] = {
-                "key": key,
-                "cost": cost,
-                "weight": weight
-            }
-
-    return software_solutions
-
-SOFTWARE_SOLUTIONS = load_software_solutions(BASE_DIR / "Docs/insider_threat_solutions_weights.csv")
+# Simulation results are shared across browser sessions for an hour, at most
+# RESULT_CACHE_ENTRIES distinct scenarios at a time.
+RESULT_CACHE_TTL = 3600
+RESULT_CACHE_ENTRIES = 64
+
+@st.cache_resource
+def get_software_solutions():
+    """Solution catalogue, read once per server process."""
+    return load_software_solutions(BASE_DIR / "Docs/insider_threat_solutions_weights.csv")
+
+@st.cache_resource
+def get_model_context():
+    """Dataset-derived inputs shared by every session: PoA table, drill-down cube, inputs hash."""
+    load_role_poa()
+    return {"inputs_hash": inputs_hash(), "cube": load_cube()}
+
+@st.cache_data(ttl=RESULT_CACHE_TTL, max_entries=RESULT_CACHE_ENTRIES, show_spinner=False)
+def run_cached_simulation(mitigation_weight, dependence, seed, iterations, input_hash):
+    """
+    generate_monte_carlo_results keyed by (mitigation_weight, dependence, seed,
+    iterations, inputs_hash). Concurrent sessions asking for the same key wait
+    for one computation. Figures are not cached; they are rebuilt from the
+    returned arrays.
+    """
+    return generate_monte_carlo_results(mitigation_weight, dependence, make_figures=False,
+                                        n_iterations=iterations, seed=seed)
+
+@st.cache_resource
+def get_portfolio_result(input_hash):
+    """Pareto search over every control subset, once per model inputs."""
+    return optimize_portfolio(get_software_solutions())
+
+@st.cache_resource
+def get_peer_outliers(input_hash, method):
+    """Top peer-group outliers from the feature cache, or None when there is no fresh cache."""
+    cache = open_feature_cache()
+    return None if cache is None else peer_outliers(cache, method)
+
+def simulate(mitigation_weight, dependence=None):
+    """Cached simulation plus this session's figures, in the shape main() expects."""
+    context = get_model_context()
+    # Summed control weights can differ in the last float bits for the same selection
+    mitigation_weight = round(mitigation_weight, 6)
+    output = run_cached_simulation(mitigation_weight, dependence, SEED, N_ITER, context["inputs_hash"])
+    return {
+        **output,
+        'fig_distribution': plot_loss_distribution(output['results'], output['stats']),
+        'fig_comparison': plot_mitigation_comparison(output['baseline'], output['stats'], mitigation_weight),
+    }
+
+SOFTWARE_SOLUTIONS = get_software_solutions()
+
+DEPENDENCE_OPTIONS = {
+    "Independent roles": None,
+    "Firm-wide stress year": "stress_year",
+    "Trader / IT Admin collusion": "collusion",
+    "Heavy-tailed stress (t-copula)": "heavy_tail",
+}
 
 def calculate_weights_and_costs(selections):
     mitigation_weight = 0.0
@@ -90,6 +133,93 @@ def load_total_company_loss():
     except Exception:
         return None
 
+def render_drilldown(cube):
+    """Interactive role / region / month / feature drill-down served from the precomputed cube."""
+    with st.expander("Drill down by role, region, month and behaviour"):
+        f1, f2, f3, f4 = st.columns(4)
+        with f1:
+            roles = st.multiselect("Role", cube.roles, key="dd_roles")
+        with f2:
+            regions = st.multiselect("Region", cube.regions, key="dd_regions")
+        with f3:
+            months = st.multiselect("Month", cube.months, key="dd_months")
+        with f4:
+            feature = st.selectbox("Behaviour", cube.features, key="dd_feature")
+
+        summary = cube.summary(roles, regions, months)
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Users", f"{summary['users']:,}")
+        m2.metric("Users with an incident", f"{summary['incident_users']:,}")
+        m3.metric("Incident probability", f"{summary['annual_probability']*100:.2f}%")
+        m4.metric("Malicious days", f"{summary['malicious_days']:,}")
+
+        left, right = st.columns(2)
+        with left:
+            st.markdown("**Incident probability (%) by role × region**")
+            st.dataframe(cube.probability_matrix(months).style.format("{:.2f}"), use_container_width=True)
+        with right:
+            st.markdown(f"**Mean daily `{feature}` per user**")
+            st.line_chart(cube.daily_series(feature, roles, regions, months))
+
+def render_peer_outliers():
+    """Users whose behaviour profile stands out from their role x region peers."""
+    with st.expander("Peer-group outliers"):
+        method = st.radio("Method", ["robust", "knn"], horizontal=True, key="peer_method",
+                          format_func=lambda m: {"robust": "Median / MAD", "knn": "Nearest peers"}[m])
+        outliers = get_peer_outliers(get_model_context()["inputs_hash"], method)
+        if outliers is None:
+            st.info("No feature cache found. Run generator.py (or feature_cache.py) to enable peer analytics.")
+            return
+        st.caption("Each user's mean and 95th-percentile daily behaviour compared with their role × region peers")
+        st.dataframe(outliers.style.format({"score": "{:.2f}", "robust_z": "{:.1f}", "value": "{:.1f}",
+                                            "peer_median": "{:.1f}"}),
+                     use_container_width=True, hide_index=True)
+        user_id = st.selectbox("Compare a user with their peers", outliers["user_id"], key="peer_user")
+        st.bar_chart(user_profile(open_feature_cache(), user_id))
+
+def render_portfolio_optimizer():
+    """Budget / target-EAL search over every control subset."""
+    st.markdown('<h2 class="section">Optimal Control Portfolio</h2>', unsafe_allow_html=True)
+    st.markdown("""
+                <div class="info">
+                Instead of picking controls by hand, search every combination for the lowest EAL within a budget,
+                or the cheapest combination that reaches a target EAL. All combinations are scored on the same simulated years.
+                </div>
+                """, unsafe_allow_html=True)
+    total_catalogue_cost = sum(meta["cost"] for meta in SOFTWARE_SOLUTIONS.values())
+    in1, in2 = st.columns(2)
+    with in1:
+        budget = st.number_input("Annual budget ($)", min_value=0, max_value=int(total_catalogue_cost),
+                                 value=min(5_000_000, int(total_catalogue_cost)), step=250_000)
+    with in2:
+        target_eal = st.number_input("Target EAL ($, optional)", min_value=0, value=0, step=1_000_000)
+
+    with st.spinner("Scoring all control combinations..."):
+        result = get_portfolio_result(get_model_context()["inputs_hash"])
+
+    frontier = result["frontier"]
+    affordable = [p for p in frontier if p["cost"] <= budget]
+    recommended = affordable[-1] if affordable else None
+    if target_eal > 0:
+        reaching = [p for p in frontier if p["mean_eal"] <= target_eal]
+        recommended = reaching[0] if reaching else None
+
+    left, right = st.columns([3, 2])
+    with left:
+        st.pyplot(plot_frontier(result, recommended))
+        st.caption("Every control combination (gray) and the cost vs. EAL Pareto frontier (blue)")
+    with right:
+        st.markdown("### Recommended Set")
+        if recommended is None:
+            st.info("No combination meets this budget / target.")
+        else:
+            st.metric("Annual Cost", f"${recommended['cost']:,.0f}")
+            st.metric("Mean EAL", f"${recommended['mean_eal']:,.0f}",
+                      delta=f"-${result['baseline_eal'] - recommended['mean_eal']:,.0f} vs. no controls",
+                      delta_color="inverse")
+            st.metric("EAL for a bad year (P95)", f"${recommended['p95']:,.0f}")
+            st.markdown("\n".join(f"- {name}" for name in recommended["controls"]) or "- No controls")
+
 def main():
     if 'simulation_results' not in st.session_state:
         st.session_state.simulation_results = None
@@ -101,7 +231,7 @@ def main():
 
     if not st.session_state.baseline_generated:
         with st.spinner("Generating Baseline"):
-            results = generate_monte_carlo_results(0.0)
+            results = simulate(0.0)
             st.session_state.simulation_results = results
             st.session_state.baseline_generated = True
     
@@ -117,17 +247,26 @@ def main():
                 "No loss distribution image found yet "
                 f"(`{LOSS_DIST_IMG}`). Run the Monte Carlo simulation to generate it."
             )
+    cube = get_model_context()["cube"]
     with col2:
         # st.markdown("#### ")
-        st.markdown("""
+        if cube is not None:
+            top_items = "".join(
+                f"<li>{role.replace('_', ' ')} in {region} ({prob:.2f}%)</li>"
+                for role, region, prob in cube.top_cells(4)
+            )
+        else:
+            top_items = """
+            <li>Contractors in EU (7.55%)</li>
+            <li>IT Admins in NA (7.14%)</li>
+            <li>Contractors in NA (5.41%)</li>
+            <li>Traders in EU (3.23%)</li>"""
+        st.markdown(f"""
         <div class="info">
         <h4>Insights from Dataset</h4>
         <strong>Highest Risk Roles:</strong>
         <ul>
-            <li>Contractors in EU (7.55%)</li>
-            <li>IT Admins in NA (7.14%)</li>
-            <li>Contractors in NA (5.41%)</li>
-            <li>Traders in EU (3.23%)</li>
+            {top_items}
         </ul>
         
         <strong>Risk Factors:</strong>
@@ -140,6 +279,10 @@ def main():
         </div>
         """, unsafe_allow_html=True)
 
+    if cube is not None:
+        render_drilldown(cube)
+    render_peer_outliers()
+
     st.markdown("---")
 
     # Section 2: Select Mitigation Controls
@@ -187,11 +330,18 @@ def main():
     mitigation_weight, total_cost = calculate_weights_and_costs(selections)
 
     st.markdown("---")
-    metric1, metric2 = st.columns(2)
+    metric1, metric2, metric3 = st.columns(3)
     with metric1:
         st.metric("Total Annual Cost", f"${total_cost:,}")
     with metric2:
         st.metric("Mitigation Coverage", f"{mitigation_weight*100:.1f}%")
+    with metric3:
+        dependence_label = st.selectbox(
+            "Incident dependence between roles",
+            list(DEPENDENCE_OPTIONS),
+            help="Correlated incidents (a bad year for the whole firm, collusion) fatten the tail: "
+                 "the mean barely moves but P95 and max losses grow."
+        )
 
     st.markdown("---")
 
@@ -212,7 +362,7 @@ def main():
 
     if run_clicked:
         with st.spinner("Running Monte Carlo simulation..."):
-            results = generate_monte_carlo_results(mitigation_weight)
+            results = simulate(mitigation_weight, DEPENDENCE_OPTIONS[dependence_label])
             st.session_state.simulation_results = results
         st.success("Simulation complete. Figures and values updated below.")
 
@@ -262,5 +412,23 @@ def main():
                 with max_l:
                     st.metric("Max Loss", f"${max_loss:,.0f}")
 
+        tail = results['stats'].get('tail_metrics')
+        if tail:
+            st.markdown("#### Tail Risk")
+            for level in tail['levels']:
+                var_col, tvar_col = st.columns(2)
+                with var_col:
+                    st.metric(f"1-in-{level['return_period']:.0f} year loss (VaR)", f"${level['var']:,.0f}")
+                with tvar_col:
+                    st.metric("Average beyond it (TVaR)", f"${level['tvar']:,.0f}")
+
+    tail = results['stats'].get('tail_metrics')
+    if tail:
+        st.pyplot(plot_tail_metrics(tail))
+        st.caption("Loss-exceedance curve and each role's share of the TVaR (Euler allocation)")
+
+    st.markdown("---")
+    render_portfolio_optimizer()
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,370 @@
+"""
+Execution backends for chunked jobs (Monte Carlo tail runs, data generation).
+
+A job is a task name, one params dict and a number of chunks. A task is a
+plain function task(params, index) -> partial result, and every task seeds
+its random draws from (params seed, chunk index) only, so a chunk gives the
+same result wherever and however often it runs. Backends differ only in
+where the chunks execute; each one yields the partial results in chunk order,
+so merging them gives the same answer on every backend:
+
+  inprocess  the chunks one after the other in this process
+  pool       a local ProcessPoolExecutor (one worker per core by default)
+  socket     a coordinator that hands chunks to workers over TCP
+             (multiprocessing.connection, authenticated with a shared key).
+             Workers connect from any machine that has this source tree and
+             pull one chunk at a time, so faster machines take more chunks.
+
+Socket protocol (pickled dicts, one request and one reply at a time):
+    worker -> coordinator   {"type": "ready"}
+                            {"type": "result", "job", "index", "result"}
+                            {"type": "error", "job", "index", "error"}
+    coordinator -> worker   {"type": "chunk", "job", "task", "params", "index"}
+                            {"type": "wait", "seconds"}   nothing to do yet
+                            {"type": "done"}              shut down
+
+Every chunk handed out is leased to its worker. When the worker's connection
+drops its chunks go straight back to the queue, and a chunk whose lease runs
+past lease_timeout (a hung or partitioned worker) is handed to the next worker
+that asks. A late result of a re-assigned chunk is identical by construction,
+so the first one to arrive wins. A chunk that raises MAX_ATTEMPTS times fails
+the job.
+
+Messages are pickles, so the authkey is what stands between the port and
+code execution: only run workers and coordinators on a trusted network and
+keep the key secret. Without --authkey (or BACKEND_AUTHKEY) the coordinator
+makes up a random key and prints it; there is no built-in default key.
+
+Usage (any command that takes --backend, e.g. tail_metrics.py, generator.py):
+    python3 tail_metrics.py --iterations 10000000 --backend pool
+    python3 tail_metrics.py --iterations 10000000 --backend socket --local-workers 4
+    python3 generator.py --backend pool --workers 4
+
+    # Several machines: start the coordinator, then a worker on each machine
+    export BACKEND_AUTHKEY=$(python3 -c "import secrets; print(secrets.token_hex(16))")
+    python3 tail_metrics.py --backend socket --bind 0.0.0.0:7070
+    python3 backends.py worker --connect coordinator-host:7070     # same BACKEND_AUTHKEY
+"""
+import argparse
+import collections
+import importlib
+import itertools
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+
+BACKENDS = ["inprocess", "pool", "socket"]
+
+# task name -> (module, function); resolved lazily so workers import only what they run
+TASKS = {
+    "tail_metrics": ("tail_metrics", "simulate_chunk"),
+    "generate": ("generator", "generate_chunk"),
+}
+
+DEFAULT_ADDRESS = ("127.0.0.1", 0)     # port 0: pick a free port
+LEASE_TIMEOUT = 300.0                  # seconds before a silent worker's chunk is re-assigned
+MAX_ATTEMPTS = 3                       # failures of one chunk before the job fails
+IDLE_POLL = 0.2                        # seconds an idle worker waits before asking again
+
+
+def run_task(name, params, index):
+    """Run chunk `index` of task `name` in this process."""
+    module, function = TASKS[name]
+    return getattr(importlib.import_module(module), function)(params, index)
+
+
+class InProcessBackend:
+    """Runs every chunk sequentially in the calling process."""
+
+    def imap(self, task, params, n_chunks):
+        for index in range(n_chunks):
+            yield run_task(task, params, index)
+
+    def close(self):
+        pass
+
+
+class ProcessPoolBackend:
+    """
+    Runs chunks on a local process pool.
+
+    Args:
+        workers (int): pool size (default: one per core)
+
+    At most 2 * workers chunks are in flight, so finished partial results do
+    not pile up while an early chunk is still running.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def imap(self, task, params, n_chunks):
+        in_flight = collections.deque()
+        indices = iter(range(n_chunks))
+        for index in itertools.islice(indices, 2 * self.workers):
+            in_flight.append(self._pool.submit(run_task, task, params, index))
+        while in_flight:
+            result = in_flight.popleft().result()
+            for index in itertools.islice(indices, 1):
+                in_flight.append(self._pool.submit(run_task, task, params, index))
+            yield result
+
+    def close(self):
+        self._pool.shutdown()
+
+
+class _Job:
+    """Book-keeping for one imap call on the socket backend."""
+
+    def __init__(self, job_id, task, params, n_chunks):
+        self.id = job_id
+        self.task = task
+        self.params = params
+        self.pending = collections.deque(range(n_chunks))
+        self.leases = {}                  # index -> (worker id, deadline)
+        self.results = {}                 # index -> partial result, until yielded
+        self.done = set()
+        self.attempts = collections.Counter()
+        self.error = None
+
+
+class SocketBackend:
+    """
+    Coordinator that serves chunks to workers connecting over TCP.
+
+    Args:
+        address (tuple): (host, port) to listen on; port 0 picks a free port
+        authkey (str): shared secret the workers must present
+                       (default: a random key, see the authkey attribute)
+        lease_timeout (float): seconds before a chunk held by a silent worker
+                               is handed to another worker
+        local_workers (int): worker processes to start on this machine
+
+    Workers stay connected between jobs (they are told to wait while there is
+    nothing to do), so one backend can run several imap calls in a row.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=None, lease_timeout=LEASE_TIMEOUT,
+                 local_workers=0):
+        self.generated_authkey = not authkey
+        self.authkey = authkey or secrets.token_hex(16)
+        self.lease_timeout = lease_timeout
+        self._listener = Listener(tuple(address), authkey=self.authkey.encode())
+        self.address = self._listener.address
+        self._cond = threading.Condition()
+        self._job = None
+        self._job_ids = itertools.count()
+        self._closed = False
+        self._workers = itertools.count()
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        self._procs = [start_local_worker(self.address, self.authkey) for _ in range(local_workers)]
+
+    def _accept_loop(self):
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except Exception:
+                # Closed listener, or a client that failed the authkey handshake
+                continue
+            threading.Thread(target=self._serve, args=(conn, next(self._workers)), daemon=True).start()
+
+    def _expire_leases(self, job):
+        now = time.monotonic()
+        for index, (_, deadline) in list(job.leases.items()):
+            if deadline < now:
+                del job.leases[index]
+                job.pending.append(index)
+
+    def _release(self, worker):
+        """Put back every chunk leased to a worker whose connection dropped."""
+        job = self._job
+        if job is None:
+            return
+        for index, (holder, _) in list(job.leases.items()):
+            if holder == worker:
+                del job.leases[index]
+                job.pending.appendleft(index)
+        self._cond.notify_all()
+
+    def _record(self, worker, msg):
+        job = self._job
+        if job is None or msg["job"] != job.id:
+            return                        # late reply from a finished job
+        index = msg["index"]
+        if job.leases.get(index, (None,))[0] == worker:
+            del job.leases[index]
+        if index in job.done:
+            return                        # re-assigned chunk, the first result already won
+        if msg["type"] == "result":
+            job.results[index] = msg["result"]
+            job.done.add(index)
+            if index in job.pending:
+                job.pending.remove(index)
+        else:
+            job.attempts[index] += 1
+            if job.attempts[index] >= MAX_ATTEMPTS:
+                job.error = f"chunk {index} of '{job.task}' failed {MAX_ATTEMPTS} times: {msg['error']}"
+            elif index not in job.pending and index not in job.leases:
+                job.pending.append(index)
+        self._cond.notify_all()
+
+    def _assign(self, worker):
+        """Next message for a worker asking for work."""
+        if self._closed:
+            return {"type": "done"}
+        job = self._job
+        if job is None or job.error:
+            return {"type": "wait", "seconds": IDLE_POLL}
+        self._expire_leases(job)
+        if not job.pending:
+            return {"type": "wait", "seconds": IDLE_POLL}
+        index = job.pending.popleft()
+        job.leases[index] = (worker, time.monotonic() + self.lease_timeout)
+        return {"type": "chunk", "job": job.id, "task": job.task, "params": job.params, "index": index}
+
+    def _serve(self, conn, worker):
+        try:
+            while True:
+                msg = conn.recv()
+                with self._cond:
+                    if msg["type"] in ("result", "error"):
+                        self._record(worker, msg)
+                    reply = self._assign(worker)
+                conn.send(reply)
+                if reply["type"] == "done":
+                    break
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self._cond:
+                self._release(worker)
+            conn.close()
+
+    def imap(self, task, params, n_chunks):
+        with self._cond:
+            job = self._job = _Job(next(self._job_ids), task, params, n_chunks)
+        try:
+            for index in range(n_chunks):
+                with self._cond:
+                    # Wake up now and then to re-assign expired leases even if no worker asks
+                    while index not in job.results and job.error is None:
+                        self._cond.wait(timeout=1.0)
+                        self._expire_leases(job)
+                    if job.error is not None:
+                        raise RuntimeError(job.error)
+                    result = job.results.pop(index)
+                yield result
+        finally:
+            with self._cond:
+                self._job = None
+
+    def close(self):
+        """Tell connected workers to exit, stop the local ones and stop listening."""
+        with self._cond:
+            self._closed = True
+        deadline = time.monotonic() + 2 * IDLE_POLL + 1.0
+        for proc in self._procs:
+            try:
+                proc.wait(timeout=max(deadline - time.monotonic(), 0.1))
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        self._listener.close()
+
+
+def start_local_worker(address, authkey):
+    """
+    Start `backends.py worker` in a subprocess, as a remote machine would run it.
+    The key goes through the environment, not the (world-readable) command line.
+    """
+    host, port = address
+    return subprocess.Popen([sys.executable, str(Path(__file__).resolve()), "worker", "--connect", f"{host}:{port}"],
+                            cwd=str(Path(__file__).resolve().parent), env={**os.environ, "BACKEND_AUTHKEY": authkey})
+
+
+def run_worker(address, authkey):
+    """
+    Worker loop: pull chunks from a coordinator until it says done.
+    Returns the number of chunks run.
+    """
+    conn = Client(tuple(address), authkey=authkey.encode())
+    msg, chunks = {"type": "ready"}, 0
+    try:
+        while True:
+            conn.send(msg)
+            reply = conn.recv()
+            if reply["type"] == "done":
+                break
+            if reply["type"] == "wait":
+                time.sleep(reply["seconds"])
+                msg = {"type": "ready"}
+                continue
+            ids = {"job": reply["job"], "index": reply["index"]}
+            try:
+                msg = {"type": "result", "result": run_task(reply["task"], reply["params"], reply["index"]), **ids}
+                chunks += 1
+            except Exception as exc:
+                msg = {"type": "error", "error": repr(exc), **ids}
+    except (EOFError, OSError):
+        pass                              # coordinator went away
+    finally:
+        conn.close()
+    return chunks
+
+
+def parse_address(text):
+    """'host:port' -> (host, port)."""
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def make_backend(kind="inprocess", workers=None, address=DEFAULT_ADDRESS, authkey=None,
+                 local_workers=0, lease_timeout=LEASE_TIMEOUT):
+    """Backend by name: inprocess, pool (workers processes) or socket (coordinator on address)."""
+    if kind == "pool":
+        return ProcessPoolBackend(workers)
+    if kind == "socket":
+        return SocketBackend(address, authkey, lease_timeout, local_workers)
+    return InProcessBackend()
+
+
+def add_backend_arguments(parser):
+    """The --backend options shared by every command that runs chunked jobs."""
+    parser.add_argument("--backend", choices=BACKENDS, default="inprocess")
+    parser.add_argument("--workers", type=int, default=None, help="pool size (default: one per core)")
+    parser.add_argument("--bind", default="127.0.0.1:0", help="socket coordinator address host:port")
+    parser.add_argument("--authkey", default=os.environ.get("BACKEND_AUTHKEY"),
+                        help="socket shared secret (default: $BACKEND_AUTHKEY, else a random key)")
+    parser.add_argument("--local-workers", type=int, default=0, help="socket workers to start on this machine")
+    parser.add_argument("--lease-timeout", type=float, default=LEASE_TIMEOUT)
+
+
+def backend_from_args(args):
+    backend = make_backend(args.backend, args.workers, parse_address(args.bind), args.authkey,
+                           args.local_workers, args.lease_timeout)
+    if isinstance(backend, SocketBackend):
+        host, port = backend.address
+        key = f"BACKEND_AUTHKEY={backend.authkey} " if backend.generated_authkey else ""
+        print(f"Coordinator listening on {host}:{port}; "
+              f"start workers with: {key}python3 backends.py worker --connect {host}:{port}")
+    return backend
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pull chunks from a socket coordinator until it shuts down")
+    parser.add_argument("command", choices=["worker"])
+    parser.add_argument("--connect", required=True, help="coordinator host:port")
+    parser.add_argument("--authkey", default=os.environ.get("BACKEND_AUTHKEY"),
+                        help="the coordinator's shared secret (default: $BACKEND_AUTHKEY)")
+    args = parser.parse_args()
+    if not args.authkey:
+        parser.error("no key: pass --authkey or set BACKEND_AUTHKEY to the key the coordinator printed")
+
+    n = run_worker(parse_address(args.connect), args.authkey)
+    print(f"Worker {os.getpid()} ran {n} chunks")
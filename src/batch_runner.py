@@ -0,0 +1,344 @@
+"""
+Headless batch runner for what-if scenario studies.
+
+A scenario file (JSON, or YAML when PyYAML is installed) lists parameter
+overrides per scenario:
+
+    defaults:
+      iterations: 10000
+      seed: 80
+    scenarios:
+      - name: baseline
+      - name: pam_dlp
+        controls: ["Privileged Access & Session Recording (PAM)", "Insider Risk & DLP"]
+      - name: busy_insiders
+        attempts_mean: 5.0
+        dependence: stress_year
+      - name: traders_as_group_managers
+        role_mapping: {Trader: Group Managers}
+    grid:                       # optional cartesian product, one scenario per combination
+      mitigation_weight: [0.0, 0.2, 0.4]
+      attempts_mean: [2.5, 3.5, 5.0]
+
+Supported overrides: controls (catalogue names or keys, weights summed as in
+the dashboard) or mitigation_weight, attempts_mean, base_vulnerability,
+role_mapping (loss tier per role), dependence (DEPENDENCE_MODELS key),
+iterations and seed.
+
+Scenarios are queued in a local SQLite file next to the study outputs. The
+parent process is the only one touching the queue: it hands pending jobs to a
+ProcessPoolExecutor (one worker per core by default) and records each result
+as it completes, so an interrupted study resumes where it stopped when the
+same command is run again (jobs left 'running' are re-queued; a scenario
+whose spec was edited under the same name is reset and re-run). Each worker
+writes its per-iteration arrays to the result store, tagged with an inputs
+hash that covers the scenario's input overrides, under a name made of the
+study file stem, the scenario name and a hash of its spec (so studies and
+edited specs never overwrite each other's arrays). The study ends with a
+comparison CSV over the scenarios of the current file.
+
+Usage:
+    python3 batch_runner.py scenarios.yaml --workers 8
+    python3 batch_runner.py scenarios.json --retry-failed
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+from monte_carlo import (ATTEMPTS_MEAN, BASE_VULNERABILITY, DEPENDENCE_MODELS, N_ITER, OUTPUT_DIR, ROLE_MAPPING,
+                         ROLES, SEED, inputs_hash, load_loss_dict, run_vectorized_simulation)
+
+OUTPUT_DIR_BATCH = OUTPUT_DIR / "batch"
+
+SCENARIO_KEYS = {"name", "controls", "mitigation_weight", "attempts_mean", "base_vulnerability",
+                 "role_mapping", "dependence", "iterations", "seed"}
+INPUT_OVERRIDES = ["attempts_mean", "base_vulnerability", "role_mapping"]   # change what inputs_hash() covers
+COMPARISON_COLUMNS = ["name", "status", "mitigation_weight", "attempts_mean", "base_vulnerability",
+                      "dependence", "iterations", "seed", "mean_eal", "p5", "median", "p95",
+                      "var_99", "tvar_99", "savings_vs_baseline", "seconds", "result_path"]
+
+
+def load_scenario_file(path):
+    """Parse a JSON/YAML scenario file into a list of scenario dicts (defaults and grid applied)."""
+    path = Path(path)
+    text = path.read_text()
+    if path.suffix in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise SystemExit("PyYAML is not installed; use a .json scenario file or pip install pyyaml")
+        spec = yaml.safe_load(text)
+    else:
+        spec = json.loads(text)
+
+    if isinstance(spec, list):
+        spec = {"scenarios": spec}
+    defaults = spec.get("defaults", {})
+    scenarios = [dict(s) for s in spec.get("scenarios", [])]
+
+    grid = spec.get("grid", {})
+    if grid:
+        keys = list(grid)
+        for values in itertools.product(*(grid[k] for k in keys)):
+            scenario = dict(zip(keys, values))
+            scenario["name"] = "grid_" + "_".join(f"{k}={v}" for k, v in scenario.items())
+            scenarios.append(scenario)
+
+    out, seen = [], set()
+    for i, scenario in enumerate(scenarios):
+        scenario = {**defaults, **scenario}
+        scenario.setdefault("name", f"scenario_{i}")
+        unknown = set(scenario) - SCENARIO_KEYS
+        if unknown:
+            raise ValueError(f"{scenario['name']}: unknown keys {sorted(unknown)}")
+        if scenario["name"] in seen:
+            raise ValueError(f"duplicate scenario name {scenario['name']}")
+        seen.add(scenario["name"])
+        out.append(scenario)
+    return out
+
+
+def validate_scenario(scenario):
+    """Fail fast on overrides a worker could not simulate."""
+    name = scenario["name"]
+    for role, tier in scenario.get("role_mapping", {}).items():
+        if role not in ROLES:
+            raise ValueError(f"{name}: unknown role {role!r}")
+        if tier not in load_loss_dict():
+            raise ValueError(f"{name}: unknown loss tier {tier!r}")
+    dependence = scenario.get("dependence")
+    if dependence is not None and dependence not in DEPENDENCE_MODELS:
+        raise ValueError(f"{name}: unknown dependence model {dependence!r}")
+
+
+def resolve_mitigation_weight(scenario, solutions):
+    """Mitigation weight from `controls` (summed catalogue weights) or `mitigation_weight`."""
+    if "controls" not in scenario:
+        return float(scenario.get("mitigation_weight", 0.0))
+    by_key = {meta["key"]: meta for meta in solutions.values()}
+    weight = 0.0
+    for control in scenario["controls"]:
+        meta = solutions.get(control) or by_key.get(re.sub(r"[^a-z0-9]", "", control.lower()))
+        if meta is None:
+            raise ValueError(f"{scenario['name']}: unknown control {control!r}")
+        weight += meta["weight"]
+    return weight
+
+
+def effective_inputs_hash(scenario):
+    """
+    inputs_hash() of the base model, extended with the scenario's model-input
+    overrides (attempts_mean, base_vulnerability, role_mapping), so runs on
+    different inputs never share a fingerprint. Equal to inputs_hash() when
+    nothing is overridden.
+    """
+    base = inputs_hash()
+    overrides = {k: scenario[k] for k in INPUT_OVERRIDES if k in scenario}
+    if not overrides:
+        return base
+    return hashlib.sha256((base + json.dumps(overrides, sort_keys=True)).encode()).hexdigest()[:16]
+
+
+def spec_hash(scenario):
+    """Short fingerprint of a scenario spec, part of its result file name."""
+    return hashlib.sha256(json.dumps(scenario, sort_keys=True).encode()).hexdigest()[:8]
+
+
+def run_scenario(scenario, mitigation_weight, study="batch"):
+    """
+    Worker entry point: simulate one scenario, store its arrays, return its summary row.
+
+    Args:
+        study (str): study file stem, part of the result file name
+    """
+    import numpy as np
+    from result_store import save_scenario
+    from tail_metrics import tail_metrics
+
+    start = time.perf_counter()
+    iterations = int(scenario.get("iterations", N_ITER))
+    seed = int(scenario.get("seed", SEED))
+    role_mapping = {**ROLE_MAPPING, **scenario.get("role_mapping", {})}
+    results = run_vectorized_simulation(
+        mitigation_weight, iterations, scenario.get("dependence"), seed,
+        attempts_mean=scenario.get("attempts_mean", ATTEMPTS_MEAN),
+        base_vulnerability=scenario.get("base_vulnerability", BASE_VULNERABILITY),
+        role_mapping=role_mapping,
+    )
+    overrides = {k: v for k, v in scenario.items() if k not in ("name", "iterations", "seed")}
+    path = save_scenario(results, seed, effective_inputs_hash(scenario), scenario.get("dependence"),
+                         name=f"batch_{study}_{scenario['name']}_{spec_hash(scenario)}",
+                         extra_meta={"study": study, "scenario": scenario["name"], "overrides": overrides})
+
+    total = results["total_loss"]
+    p5, p50, p95 = np.percentile(total, [5, 50, 95])
+    level_99 = tail_metrics(total, np.column_stack([results["by_role"][r] for r in ROLES]), ROLES,
+                            levels=[0.99], return_periods=[100])["levels"][0]
+    return {
+        "mitigation_weight": mitigation_weight,
+        "attempts_mean": scenario.get("attempts_mean", ATTEMPTS_MEAN),
+        "base_vulnerability": scenario.get("base_vulnerability", BASE_VULNERABILITY),
+        "dependence": scenario.get("dependence") or "independent",
+        "iterations": iterations,
+        "seed": seed,
+        "mean_eal": float(total.mean()),
+        "p5": float(p5),
+        "median": float(p50),
+        "p95": float(p95),
+        "var_99": level_99["var"],
+        "tvar_99": level_99["tvar"],
+        "seconds": time.perf_counter() - start,
+        "result_path": str(path),
+    }
+
+
+class JobQueue:
+    """SQLite-backed scenario queue; only the scheduling process opens it."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                name TEXT PRIMARY KEY,
+                position INTEGER,
+                spec TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                summary TEXT,
+                error TEXT,
+                updated_at REAL
+            )""")
+        self.db.commit()
+
+    def enqueue(self, scenarios):
+        """
+        Add new scenarios; ones already queued (by name) keep their state.
+        A queued scenario whose spec was edited since gets the new spec and is
+        reset to pending. Returns the names of those reset scenarios.
+        """
+        stored = dict(self.db.execute("SELECT name, spec FROM jobs").fetchall())
+        changed = [s["name"] for s in scenarios if s["name"] in stored and json.loads(stored[s["name"]]) != s]
+        with self.db:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO jobs (name, position, spec, updated_at) VALUES (?, ?, ?, ?)",
+                [(s["name"], i, json.dumps(s), time.time()) for i, s in enumerate(scenarios)])
+            self.db.executemany(
+                "UPDATE jobs SET spec = ?, position = ?, status = 'pending', summary = NULL, error = NULL, "
+                "updated_at = ? WHERE name = ?",
+                [(json.dumps(s), i, time.time(), s["name"]) for i, s in enumerate(scenarios) if s["name"] in changed])
+        return changed
+
+    def requeue(self, statuses=("running",)):
+        """Put interrupted (and optionally failed) jobs back to pending."""
+        with self.db:
+            self.db.execute(f"UPDATE jobs SET status = 'pending' WHERE status IN ({','.join('?' * len(statuses))})",
+                            statuses)
+
+    def pending(self):
+        rows = self.db.execute("SELECT spec FROM jobs WHERE status = 'pending' ORDER BY position").fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def mark(self, name, status, summary=None, error=None):
+        with self.db:
+            self.db.execute(
+                "UPDATE jobs SET status = ?, summary = ?, error = ?, updated_at = ?, "
+                "attempts = attempts + (? = 'running') WHERE name = ?",
+                (status, json.dumps(summary) if summary else None, error, time.time(), status, name))
+
+    def counts(self):
+        return dict(self.db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def rows(self):
+        return self.db.execute("SELECT name, status, summary, error FROM jobs ORDER BY position").fetchall()
+
+
+def run_study(scenario_file, workers=None, retry_failed=False, study_dir=OUTPUT_DIR_BATCH):
+    """Queue, run and compare every scenario in scenario_file. Returns the comparison CSV path."""
+    from portfolio import load_software_solutions
+
+    scenarios = load_scenario_file(scenario_file)
+    for scenario in scenarios:
+        validate_scenario(scenario)
+    solutions = load_software_solutions()
+    weights = {s["name"]: resolve_mitigation_weight(s, solutions) for s in scenarios}
+
+    study = Path(scenario_file).stem
+    queue = JobQueue(Path(study_dir) / f"{study}.sqlite")
+    changed = queue.enqueue(scenarios)
+    if changed:
+        print(f"{study}: spec changed since the last run, re-running {', '.join(changed)}")
+    queue.requeue(("running", "failed") if retry_failed else ("running",))
+    jobs = [s for s in queue.pending() if s["name"] in weights]
+    print(f"{study}: {len(jobs)} pending of {len(scenarios)} scenarios")
+
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep at most 2 jobs per worker in flight so an interrupt loses little work
+        remaining, in_flight = list(jobs), {}
+        while remaining or in_flight:
+            while remaining and len(in_flight) < 2 * workers:
+                scenario = remaining.pop(0)
+                queue.mark(scenario["name"], "running")
+                in_flight[pool.submit(run_scenario, scenario, weights[scenario["name"]], study)] = scenario["name"]
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = in_flight.pop(future)
+                try:
+                    summary = future.result()
+                    queue.mark(name, "done", summary=summary)
+                    print(f"  done   {name:<40} EAL ${summary['mean_eal']:>14,.0f} ({summary['seconds']:.1f}s)")
+                except Exception as exc:
+                    queue.mark(name, "failed", error=repr(exc))
+                    print(f"  failed {name:<40} {exc!r}")
+
+    csv_path = write_comparison(queue, Path(study_dir) / f"{study}_comparison.csv", list(weights))
+    print(f"Status: {queue.counts()}  Comparison: {csv_path}")
+    return csv_path
+
+
+def write_comparison(queue, csv_path, names=None):
+    """
+    One row per scenario with its summary metrics and savings vs. the 'baseline' scenario.
+
+    Args:
+        names (list): scenarios to include (default: every queued one). Scenarios
+                      removed from the study file keep their queue rows but are left out.
+    """
+    import csv
+
+    rows = []
+    for name, status, summary, error in queue.rows():
+        if names is not None and name not in names:
+            continue
+        row = {"name": name, "status": status, **(json.loads(summary) if summary else {})}
+        rows.append(row)
+    baseline = next((r for r in rows if r["name"] == "baseline" and "mean_eal" in r), None)
+    for row in rows:
+        if baseline is not None and "mean_eal" in row:
+            row["savings_vs_baseline"] = baseline["mean_eal"] - row["mean_eal"]
+
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COMPARISON_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    return csv_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a file of what-if scenarios across a process pool")
+    parser.add_argument("scenario_file", type=Path, help="JSON or YAML scenario file")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--retry-failed", action="store_true", help="re-run scenarios that failed last time")
+    parser.add_argument("--study-dir", type=Path, default=OUTPUT_DIR_BATCH)
+    args = parser.parse_args()
+
+    run_study(args.scenario_file, args.workers, args.retry_failed, args.study_dir)
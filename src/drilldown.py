@@ -0,0 +1,192 @@
+"""
+Role x region x time drill-down cube for the dashboard.
+
+Built from the feature cache at pipeline time (risk_analysis.py) or on first
+use (load_cube), the cube holds per (role, region, day) aggregates:
+    users            (roles, regions)               headcount
+    malicious_days   (roles, regions, days)         sum of is_malicious
+    hr_flags         (roles, regions, days)         sum of is_hr_flagged
+    feature_sums     (roles, regions, days, feats)  sum of each feature
+plus, for "users with >= 1 incident" (which is not additive over days), the
+count of users per (role, region, month-pattern), where month-pattern is a
+bitmask of the months a user had a malicious day in. Any role/region/month
+selection is then answered exactly from a few small array slices without
+touching the raw activity data.
+"""
+from pathlib import Path
+import numpy as np
+
+from generator import FEATURES
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+OUTPUT_DIR = BASE_DIR / "Outputs"
+CUBE_PATH = OUTPUT_DIR / "risk_analysis" / "drilldown_cube.npz"
+
+USERS_PER_BLOCK = 20000
+
+
+def build_cube(cache, path=CUBE_PATH):
+    """Aggregate a feature_cache.FeatureCache into the cube and save it as .npz."""
+    n_roles, n_regions = len(cache.roles), len(cache.regions)
+    n_days, n_feats = cache.n_days, len(FEATURES)
+    mal_ch = cache.channels.index("is_malicious")
+    hr_ch = cache.channels.index("is_hr_flagged")
+
+    months = sorted({d[:7] for d in cache.days})
+    day_month = np.array([months.index(d[:7]) for d in cache.days])
+    if len(months) > 63:
+        raise ValueError("drill-down cube supports at most 63 months")
+    month_starts = np.flatnonzero(np.r_[True, day_month[1:] != day_month[:-1]])
+
+    users = np.zeros((n_roles, n_regions), dtype=np.int64)
+    malicious_days = np.zeros((n_roles, n_regions, n_days), dtype=np.int64)
+    hr_flags = np.zeros((n_roles, n_regions, n_days), dtype=np.int64)
+    feature_sums = np.zeros((n_roles, n_regions, n_days, n_feats), dtype=np.int64)
+    pattern_groups, pattern_values = [], []
+
+    role_codes = np.asarray(cache.users["role"], dtype=np.int64)
+    region_codes = np.asarray(cache.users["region"], dtype=np.int64)
+    for start in range(0, cache.n_users, USERS_PER_BLOCK):
+        block = np.asarray(cache.matrix[start:start + USERS_PER_BLOCK], dtype=np.int64)
+        group = role_codes[start:start + len(block)] * n_regions + region_codes[start:start + len(block)]
+
+        # Month bitmask per user: bit m set if the user had a malicious day in month m
+        mal_by_month = np.add.reduceat(block[:, :, mal_ch], month_starts, axis=1) > 0
+        pattern = (mal_by_month * (1 << np.arange(len(months), dtype=np.int64))).sum(axis=1)
+        pattern_groups.append(group)
+        pattern_values.append(pattern)
+
+        for g in np.unique(group):
+            r, c = divmod(int(g), n_regions)
+            rows = block[group == g]
+            users[r, c] += len(rows)
+            summed = rows.sum(axis=0)
+            malicious_days[r, c] += summed[:, mal_ch]
+            hr_flags[r, c] += summed[:, hr_ch]
+            feature_sums[r, c] += summed[:, :n_feats]
+
+    # Sparse (group, pattern) -> user count table
+    keys = np.concatenate(pattern_groups) * (1 << len(months)) + np.concatenate(pattern_values)
+    keys, counts = np.unique(keys, return_counts=True)
+    pattern_group, pattern_mask = np.divmod(keys, 1 << len(months))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(
+        path,
+        roles=np.array(cache.roles), regions=np.array(cache.regions),
+        days=np.array(cache.days), months=np.array(months), day_month=day_month,
+        features=np.array(FEATURES),
+        users=users, malicious_days=malicious_days, hr_flags=hr_flags, feature_sums=feature_sums,
+        pattern_group=pattern_group, pattern_mask=pattern_mask, pattern_count=counts,
+    )
+    return DrilldownCube(path)
+
+
+class DrilldownCube:
+    """Loaded cube with the slice queries the dashboard needs."""
+
+    def __init__(self, path=CUBE_PATH):
+        with np.load(path) as data:
+            self.roles = list(data["roles"])
+            self.regions = list(data["regions"])
+            self.days = list(data["days"])
+            self.months = list(data["months"])
+            self.features = list(data["features"])
+            self.day_month = data["day_month"]
+            self.users = data["users"]
+            self.malicious_days = data["malicious_days"]
+            self.hr_flags = data["hr_flags"]
+            self.feature_sums = data["feature_sums"]
+            self.pattern_group = data["pattern_group"]
+            self.pattern_mask = data["pattern_mask"]
+            self.pattern_count = data["pattern_count"]
+
+    def _index(self, labels, selected):
+        if not selected:
+            return np.arange(len(labels))
+        return np.array([labels.index(s) for s in selected])
+
+    def _day_mask(self, months):
+        return np.isin(self.day_month, self._index(self.months, months))
+
+    def _month_bits(self, months):
+        return int(sum(1 << int(m) for m in self._index(self.months, months)))
+
+    def incident_users(self, months=None):
+        """(roles, regions) users with >= 1 malicious day in the selected months."""
+        bits = self._month_bits(months)
+        hit = (self.pattern_mask & bits) != 0
+        out = np.bincount(self.pattern_group[hit], weights=self.pattern_count[hit],
+                          minlength=self.users.size)
+        return out.reshape(self.users.shape)
+
+    def probability_matrix(self, months=None):
+        """Share of users with >= 1 malicious day, role x region (percent)."""
+        import pandas as pd
+
+        prob = np.divide(self.incident_users(months), self.users,
+                         out=np.zeros(self.users.shape), where=self.users > 0)
+        return pd.DataFrame(prob * 100, index=self.roles, columns=self.regions)
+
+    def feature_matrix(self, feature, months=None):
+        """Mean daily count of `feature` per user, role x region."""
+        import pandas as pd
+
+        f = self.features.index(feature)
+        day_mask = self._day_mask(months)
+        sums = self.feature_sums[:, :, day_mask, f].sum(axis=2)
+        user_days = self.users * day_mask.sum()
+        mean = np.divide(sums, user_days, out=np.zeros(sums.shape), where=user_days > 0)
+        return pd.DataFrame(mean, index=self.roles, columns=self.regions)
+
+    def summary(self, roles=None, regions=None, months=None):
+        """Headline numbers for a role/region/month selection."""
+        r = self._index(self.roles, roles)
+        g = self._index(self.regions, regions)
+        day_mask = self._day_mask(months)
+        cells = np.ix_(r, g)
+        users = int(self.users[cells].sum())
+        incident_users = int(self.incident_users(months)[cells].sum())
+        return {
+            "users": users,
+            "incident_users": incident_users,
+            "annual_probability": incident_users / users if users else 0.0,
+            "malicious_days": int(self.malicious_days[cells][:, :, day_mask].sum()),
+            "hr_flags": int(self.hr_flags[cells][:, :, day_mask].sum()),
+        }
+
+    def daily_series(self, feature, roles=None, regions=None, months=None):
+        """Per-day mean of `feature` per user for the selection, indexed by day."""
+        import pandas as pd
+
+        r = self._index(self.roles, roles)
+        g = self._index(self.regions, regions)
+        day_mask = self._day_mask(months)
+        cells = np.ix_(r, g)
+        users = self.users[cells].sum()
+        sums = self.feature_sums[cells][:, :, day_mask, self.features.index(feature)].sum(axis=(0, 1))
+        days = pd.to_datetime(np.array(self.days)[day_mask])
+        return pd.Series(sums / max(users, 1), index=days, name=feature)
+
+    def top_cells(self, k=4, months=None):
+        """The k role/region cells with the highest incident probability."""
+        prob = self.probability_matrix(months).stack()
+        prob = prob[prob > 0].sort_values(ascending=False).head(k)
+        return [(role, region, float(p)) for (role, region), p in prob.items()]
+
+
+def load_cube(path=CUBE_PATH):
+    """
+    Load the cube, building it from the feature cache first when it does not
+    exist yet or is older than the cache. None when neither is available.
+    """
+    from feature_cache import CACHE_DIR, open_feature_cache
+
+    path, meta = Path(path), CACHE_DIR / "meta.json"
+    if path.exists() and (not meta.exists() or path.stat().st_mtime >= meta.stat().st_mtime):
+        return DrilldownCube(path)
+    cache = open_feature_cache()
+    if cache is None:
+        return DrilldownCube(path) if path.exists() else None
+    return build_cube(cache, path)
@@ -0,0 +1,340 @@
+"""
+Raw event log expansion and the event -> daily feature aggregator.
+
+The generator emits daily counts per user. Production telemetry arrives as
+individual events instead, so this module works in both directions:
+
+  expand_events()     turns the feature cache counts into timestamped event
+                      records (logons, file reads, USB mounts, emails, cloud
+                      uploads, deletes, HTTP visits), plus benign background
+                      events (in-hours logons, ordinary file reads, internal
+                      emails, ordinary browsing) that carry no feature signal.
+  aggregate_events()  rolls events back into the nine daily features.
+
+Events are columnar (struct of arrays), one uncompressed .npz per user block:
+    user   int32   row in the feature cache user index
+    ts     int64   UTC epoch seconds
+    type   uint8   index into EVENT_TYPES
+    flags  uint8   bit flags, meaning depends on the type (see below)
+
+Aggregation never sorts. Each event gets a (user, local day, feature) cell
+from two lookup tables on type/flags and one division of its local
+timestamp, and all cells are counted with a single np.bincount, so the
+input order does not matter and throughput is bound by memory bandwidth.
+`after_hours_logons` is decided per event in the region's local time
+(REGION_UTC_OFFSET_HOURS, fixed offsets, no daylight saving): a successful
+logon counts when it falls outside WORK_HOURS. The local day, not the UTC
+day, is the bucket, so a 23:00 APAC logon lands on the right day.
+
+aggregate(expand(cache)) reproduces the cached features exactly, which the
+benchmark checks.
+
+Usage:
+    python3 event_log.py --expand --noise 1.0
+    python3 event_log.py --benchmark
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+import numpy as np
+
+from generator import FEATURES, REGIONS
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+OUTPUT_DIR = BASE_DIR / "Outputs"
+EVENT_LOG_DIR = OUTPUT_DIR / "event_log"
+
+EVENT_TYPES = ["logon", "file_read", "usb_mount", "email", "cloud_upload", "file_delete", "http_visit"]
+LOGON, FILE_READ, USB_MOUNT, EMAIL, CLOUD_UPLOAD, FILE_DELETE, HTTP_VISIT = range(len(EVENT_TYPES))
+
+# Flag bits per event type
+FAILED = 1        # logon
+SENSITIVE = 1     # file_read
+EXTERNAL = 1      # email
+ATTACHMENT = 2    # email
+COMPETITOR = 1    # http_visit
+N_FLAG_VALUES = 4   # flags use the low two bits
+
+REGION_UTC_OFFSET_HOURS = {"NA": -5, "EU": 1, "APAC": 8}
+WORK_HOURS = (8, 18)   # local 8am-6pm; logons outside are after-hours
+
+# Mean benign events per user and day (Poisson), scaled by --noise
+BACKGROUND_EVENTS = {
+    "in_hours_logons": 2.0,
+    "file_reads": 25.0,
+    "internal_emails": 8.0,
+    "http_visits": 30.0,
+}
+USERS_PER_CHUNK = 200
+EVENT_SEED = 80
+DAY_SECONDS = 86400
+
+
+def _feature_tables():
+    """
+    (primary, secondary) feature index per type * N_FLAG_VALUES + flags, -1 for none.
+    A successful logon maps to after_hours_logons and is filtered by local time.
+    """
+    primary = np.full(len(EVENT_TYPES) * N_FLAG_VALUES, -1, dtype=np.int64)
+    secondary = primary.copy()
+    f = FEATURES.index
+
+    def code(etype, flags=0):
+        return etype * N_FLAG_VALUES + flags
+
+    primary[code(LOGON)] = f("after_hours_logons")
+    primary[code(LOGON, FAILED)] = f("failed_logins")
+    primary[code(FILE_READ, SENSITIVE)] = f("sensitive_file_reads")
+    primary[code(USB_MOUNT)] = f("usb_device_mounts")
+    primary[code(EMAIL, EXTERNAL)] = f("external_emails_sent")
+    primary[code(EMAIL, ATTACHMENT)] = f("emails_with_attachments")
+    primary[code(EMAIL, EXTERNAL | ATTACHMENT)] = f("external_emails_sent")
+    secondary[code(EMAIL, EXTERNAL | ATTACHMENT)] = f("emails_with_attachments")
+    primary[code(CLOUD_UPLOAD)] = f("cloud_upload_events")
+    primary[code(FILE_DELETE)] = f("files_deleted")
+    primary[code(HTTP_VISIT, COMPETITOR)] = f("http_competitor_visits")
+    return primary, secondary
+
+
+PRIMARY_FEATURE, SECONDARY_FEATURE = _feature_tables()
+
+
+def region_offsets(regions=REGIONS):
+    """UTC offset in seconds per region code."""
+    return np.array([REGION_UTC_OFFSET_HOURS[r] * 3600 for r in regions], dtype=np.int64)
+
+
+def day_epochs(days):
+    """UTC epoch seconds of midnight for each 'YYYY-MM-DD' day."""
+    return np.array(days, dtype="datetime64[D]").astype("datetime64[s]").astype(np.int64)
+
+
+def _local_seconds(rng, n, window):
+    """n seconds-of-day in local time: within work hours, outside them, or anywhere."""
+    start, end = WORK_HOURS[0] * 3600, WORK_HOURS[1] * 3600
+    if window == "work":
+        return rng.integers(start, end, size=n)
+    if window == "after":
+        # Uniform over [0, start) U [end, 24h)
+        sec = rng.integers(0, DAY_SECONDS - (end - start), size=n)
+        return np.where(sec < start, sec, sec + (end - start))
+    return rng.integers(0, DAY_SECONDS, size=n)
+
+
+def expand_events(counts, user_start, user_region, days, rng, noise=1.0):
+    """
+    Expand daily counts of a block of users into event columns.
+
+    Args:
+        counts (array): (users, days, 9) daily feature counts in FEATURES order
+        user_start (int): cache row of the first user in the block
+        user_region (array): (users,) region codes of the block
+        days (list): 'YYYY-MM-DD' label of each day column
+        noise (float): multiplier on BACKGROUND_EVENTS (0 = signal events only)
+
+    Returns a dict of event columns (user, ts, type, flags).
+    """
+    n_users, n_days, _ = counts.shape
+    counts = counts.reshape(n_users * n_days, -1).astype(np.int64)
+    f = FEATURES.index
+    parts = []
+
+    def emit(per_cell, etype, window, flags=0):
+        cells = np.repeat(np.arange(len(per_cell)), per_cell)
+        flags = np.broadcast_to(np.asarray(flags, dtype=np.uint8), cells.shape)
+        parts.append((cells, _local_seconds(rng, len(cells), window), etype, flags))
+
+    def background(name):
+        return rng.poisson(BACKGROUND_EVENTS[name] * max(noise, 0.0), size=len(counts))
+
+    emit(counts[:, f("after_hours_logons")], LOGON, "after")
+    emit(background("in_hours_logons"), LOGON, "work")
+    emit(counts[:, f("failed_logins")], LOGON, "any", FAILED)
+    emit(counts[:, f("sensitive_file_reads")], FILE_READ, "any", SENSITIVE)
+    emit(background("file_reads"), FILE_READ, "any")
+    emit(counts[:, f("usb_device_mounts")], USB_MOUNT, "any")
+
+    # One email can be both external and carry an attachment: max(ext, att)
+    # emails per day, the first `ext` external and the last `att` with attachments
+    ext, att = counts[:, f("external_emails_sent")], counts[:, f("emails_with_attachments")]
+    n_emails = np.maximum(ext, att)
+    cells = np.repeat(np.arange(len(counts)), n_emails)
+    rank = np.arange(len(cells)) - np.repeat(np.cumsum(n_emails) - n_emails, n_emails)
+    flags = (rank < ext[cells]) * EXTERNAL | (rank >= n_emails[cells] - att[cells]) * ATTACHMENT
+    emit(n_emails, EMAIL, "any", flags.astype(np.uint8))
+    emit(background("internal_emails"), EMAIL, "any")
+
+    emit(counts[:, f("cloud_upload_events")], CLOUD_UPLOAD, "any")
+    emit(counts[:, f("files_deleted")], FILE_DELETE, "any")
+    emit(counts[:, f("http_competitor_visits")], HTTP_VISIT, "any", COMPETITOR)
+    emit(background("http_visits"), HTTP_VISIT, "any")
+
+    cells = np.concatenate([p[0] for p in parts])
+    local = np.concatenate([p[1] for p in parts])
+    user = cells // n_days
+    offset = region_offsets()[user_region[user]]
+    return {
+        "user": (user_start + user).astype(np.int32),
+        "ts": day_epochs(days)[cells % n_days] + local - offset,
+        "type": np.concatenate([np.full(len(p[0]), p[2], dtype=np.uint8) for p in parts]),
+        "flags": np.concatenate([p[3] for p in parts]),
+    }
+
+
+def aggregate_events(events, user_region, first_day, n_days, user_start=0, n_users=None, out=None):
+    """
+    Roll events into daily features with one np.bincount, no sorting.
+
+    Args:
+        events (dict): user, ts, type, flags columns
+        user_region (array): region code per user (indexed by events['user'])
+        first_day (str): local day of column 0, 'YYYY-MM-DD'
+        n_days (int): number of day columns; events outside are dropped
+        user_start, n_users: user rows covered by `out` (default: all of user_region)
+        out (array): (n_users, n_days, 9) int64 counts to add into
+
+    Returns the (n_users, n_days, 9) counts.
+    """
+    n_users = len(user_region) - user_start if n_users is None else n_users
+    n_feats = len(FEATURES)
+    if out is None:
+        out = np.zeros((n_users, n_days, n_feats), dtype=np.int64)
+
+    user = events["user"].astype(np.int64)
+    local = events["ts"] + region_offsets()[user_region][user]
+    local_day = local // DAY_SECONDS
+    sec = local - local_day * DAY_SECONDS
+    day = local_day - day_epochs([first_day])[0] // DAY_SECONDS
+    code = (events["type"] << 2) | events["flags"]      # type * N_FLAG_VALUES + flags, stays uint8
+
+    # Successful logons only count after hours in local time
+    feature = PRIMARY_FEATURE[code]
+    in_hours = (sec >= WORK_HOURS[0] * 3600) & (sec < WORK_HOURS[1] * 3600)
+    feature[(code == LOGON * N_FLAG_VALUES) & in_hours] = -1
+
+    row = user - user_start
+    valid = (day >= 0) & (day < n_days) & (row >= 0) & (row < n_users)
+    cell = (row * n_days + day) * n_feats
+    counted = valid & (feature >= 0)
+    keys = cell[counted] + feature[counted]
+    second = SECONDARY_FEATURE[code]
+    both = valid & (second >= 0)
+    if both.any():
+        keys = np.concatenate([keys, cell[both] + second[both]])
+    out += np.bincount(keys, minlength=out.size).reshape(out.shape)
+    return out
+
+
+def write_event_log(cache, out_dir=EVENT_LOG_DIR, noise=1.0, users_per_chunk=USERS_PER_CHUNK, seed=EVENT_SEED):
+    """
+    Expand a feature_cache.FeatureCache into chunked event files.
+
+    Each chunk covers a contiguous block of users and is drawn from its own
+    seeded stream, so chunks can be regenerated independently.
+    Returns the total number of events written.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for old in out_dir.glob("events_*.npz"):
+        old.unlink()
+    user_region = np.asarray(cache.users["region"], dtype=np.int64)
+
+    total, chunks = 0, []
+    for i, start in enumerate(range(0, cache.n_users, users_per_chunk)):
+        stop = min(start + users_per_chunk, cache.n_users)
+        rng = np.random.default_rng([seed, i])
+        events = expand_events(cache.features(slice(start, stop)), start, user_region[start:stop],
+                               cache.days, rng, noise)
+        name = f"events_{i:05d}.npz"
+        np.savez(out_dir / name, **events)
+        chunks.append({"file": name, "user_start": start, "user_stop": stop, "events": len(events["ts"])})
+        total += len(events["ts"])
+
+    meta = {
+        "event_types": EVENT_TYPES,
+        "regions": cache.regions,
+        "region_utc_offset_hours": REGION_UTC_OFFSET_HOURS,
+        "work_hours": list(WORK_HOURS),
+        "days": cache.days,
+        "n_users": cache.n_users,
+        "noise": noise,
+        "events": total,
+        "chunks": chunks,
+    }
+    with open(out_dir / "meta.json", "w") as f:
+        json.dump(meta, f, indent=2)
+    np.save(out_dir / "user_region.npy", user_region)
+    return total
+
+
+def read_event_log(log_dir=EVENT_LOG_DIR):
+    """(meta, user_region, iterator of (chunk meta, event columns))."""
+    log_dir = Path(log_dir)
+    with open(log_dir / "meta.json") as f:
+        meta = json.load(f)
+    user_region = np.load(log_dir / "user_region.npy")
+
+    def chunks():
+        for chunk in meta["chunks"]:
+            with np.load(log_dir / chunk["file"]) as data:
+                yield chunk, {k: data[k] for k in ("user", "ts", "type", "flags")}
+
+    return meta, user_region, chunks()
+
+
+def aggregate_event_log(log_dir=EVENT_LOG_DIR):
+    """
+    Daily features for a whole event log, one user block at a time.
+    Returns (counts (users, days, 9), events read, seconds spent reading, seconds aggregating).
+    """
+    meta, user_region, chunks = read_event_log(log_dir)
+    counts = np.zeros((meta["n_users"], len(meta["days"]), len(FEATURES)), dtype=np.int64)
+    n_events, read_s, agg_s = 0, 0.0, 0.0
+    t0 = time.perf_counter()
+    for chunk, events in chunks:
+        t1 = time.perf_counter()
+        start, stop = chunk["user_start"], chunk["user_stop"]
+        aggregate_events(events, user_region, meta["days"][0], len(meta["days"]),
+                         start, stop - start, out=counts[start:stop])
+        t2 = time.perf_counter()
+        read_s += t1 - t0
+        agg_s += t2 - t1
+        n_events += len(events["ts"])
+        t0 = time.perf_counter()
+    return counts, n_events, read_s, agg_s
+
+
+if __name__ == "__main__":
+    from feature_cache import open_feature_cache
+
+    parser = argparse.ArgumentParser(description="Expand daily counts into raw events and benchmark aggregation")
+    parser.add_argument("--expand", action="store_true", help="write the event log from the feature cache")
+    parser.add_argument("--benchmark", action="store_true", help="aggregate the event log and check it against the cache")
+    parser.add_argument("--noise", type=float, default=1.0, help="multiplier on the benign background events")
+    parser.add_argument("--users-per-chunk", type=int, default=USERS_PER_CHUNK)
+    parser.add_argument("--log-dir", type=Path, default=EVENT_LOG_DIR)
+    parser.add_argument("--seed", type=int, default=EVENT_SEED)
+    args = parser.parse_args()
+
+    cache = open_feature_cache()
+    if cache is None:
+        raise SystemExit("Feature cache missing or stale, run generator.py (or feature_cache.py) first")
+    if not (args.expand or args.benchmark):
+        args.expand = args.benchmark = True
+
+    if args.expand:
+        start = time.perf_counter()
+        total = write_event_log(cache, args.log_dir, args.noise, args.users_per_chunk, args.seed)
+        elapsed = time.perf_counter() - start
+        print(f"Expanded {cache.n_users:,} users x {cache.n_days} days into {total:,} events "
+              f"in {elapsed:.1f}s ({total / elapsed:,.0f} events/s) -> {args.log_dir}")
+
+    if args.benchmark:
+        counts, n_events, read_s, agg_s = aggregate_event_log(args.log_dir)
+        matches = np.array_equal(counts, np.asarray(cache.features(), dtype=np.int64))
+        print(f"Aggregated {n_events:,} events: read {read_s:.2f}s, aggregate {agg_s:.2f}s "
+              f"({n_events / agg_s:,.0f} events/s, {n_events / (read_s + agg_s):,.0f} events/s end to end)")
+        print(f"Daily features {'match' if matches else 'DO NOT match'} the feature cache")
+        if not matches:
+            raise SystemExit(1)
@@ -0,0 +1,184 @@
+"""
+Memory-mapped feature matrix cache.
+
+The activity CSV is parsed once into a contiguous uint16 array of shape
+(users, days, channels) where the channels are the nine behavioural features
+followed by the `is_malicious` and `is_hr_flagged` labels. A small structured
+user index (user_id, role/region codes, psychometrics) sits next to it.
+
+Consumers open the cache with np.memmap in read-only mode, so slicing a user
+or a day window is a zero-copy view and several worker processes reading the
+same file share the OS page cache instead of each holding a parsed DataFrame.
+
+Layout of Outputs/feature_cache/:
+    features.u16   raw C-ordered uint16 matrix
+    users.npy      structured user index (np.load(..., mmap_mode="r"))
+    meta.json      shape, channel/role/region names, days, source fingerprint
+"""
+import json
+from pathlib import Path
+import numpy as np
+
+from generator import FEATURES, REGIONS, ROLES
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+OUTPUT_DIR = BASE_DIR / "Outputs"
+DATASET_PATH = OUTPUT_DIR / "Dataset/billybank_activity.csv"
+CACHE_DIR = OUTPUT_DIR / "feature_cache"
+
+CHANNELS = FEATURES + ["is_malicious", "is_hr_flagged"]
+CHUNK_SIZE = 200000
+
+USER_DTYPE = np.dtype([
+    ("user_id", "U16"),
+    ("role", np.uint8),
+    ("region", np.uint8),
+    ("conscientiousness", np.float32),
+    ("neuroticism", np.float32),
+])
+
+
+def _fingerprint(csv_path):
+    stat = Path(csv_path).stat()
+    return {"source": str(csv_path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def build_feature_cache(csv_path=DATASET_PATH, cache_dir=CACHE_DIR, chunk_size=CHUNK_SIZE):
+    """
+    Materialise the cache from the activity CSV in two chunked passes:
+    the first collects the user roster and the day axis, the second writes
+    every row straight into its (user, day) cell of the memmap.
+    """
+    import pandas as pd
+
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # Roles added through generator --role-config get codes after the built-in ones
+    roles = list(ROLES)
+    role_code = {r: i for i, r in enumerate(roles)}
+    region_code = {r: i for i, r in enumerate(REGIONS)}
+
+    user_pos, user_rows, days = {}, [], set()
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size, keep_default_na=False,
+                             usecols=["user_id", "role", "region", "day", "conscientiousness", "neuroticism"]):
+        days.update(chunk["day"].unique())
+        first = chunk.drop_duplicates("user_id")
+        for row in first.itertuples(index=False):
+            if row.user_id not in user_pos:
+                if row.role not in role_code:
+                    role_code[row.role] = len(roles)
+                    roles.append(row.role)
+                user_pos[row.user_id] = len(user_rows)
+                user_rows.append((row.user_id, role_code[row.role], region_code[row.region],
+                                  row.conscientiousness, row.neuroticism))
+
+    days = sorted(days)
+    day_pos = {d: i for i, d in enumerate(days)}
+    users = np.array(user_rows, dtype=USER_DTYPE)
+    shape = (len(users), len(days), len(CHANNELS))
+
+    matrix = np.memmap(cache_dir / "features.u16", dtype=np.uint16, mode="w+", shape=shape)
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size, keep_default_na=False,
+                             usecols=["user_id", "day"] + CHANNELS):
+        u = chunk["user_id"].map(user_pos).to_numpy()
+        d = chunk["day"].map(day_pos).to_numpy()
+        matrix[u, d] = np.clip(chunk[CHANNELS].to_numpy(), 0, np.iinfo(np.uint16).max)
+    matrix.flush()
+    del matrix
+
+    np.save(cache_dir / "users.npy", users)
+    meta = {
+        "shape": list(shape),
+        "dtype": "uint16",
+        "channels": CHANNELS,
+        "roles": roles,
+        "regions": REGIONS,
+        "days": days,
+        **_fingerprint(csv_path),
+    }
+    with open(cache_dir / "meta.json", "w") as f:
+        json.dump(meta, f, indent=2)
+    return FeatureCache(cache_dir)
+
+
+class FeatureCache:
+    """
+    Read-only view of a built cache.
+
+    `matrix` is the (users, days, channels) memmap. Basic slicing on it
+    (a user range, a day window) returns views; no data is read until used.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        cache_dir = Path(cache_dir)
+        with open(cache_dir / "meta.json") as f:
+            self.meta = json.load(f)
+        self.matrix = np.memmap(cache_dir / "features.u16", dtype=np.uint16, mode="r",
+                                shape=tuple(self.meta["shape"]))
+        self.users = np.load(cache_dir / "users.npy", mmap_mode="r")
+        self.channels = self.meta["channels"]
+        self.roles = self.meta["roles"]
+        self.regions = self.meta["regions"]
+        self.days = self.meta["days"]
+
+    @property
+    def n_users(self):
+        return self.matrix.shape[0]
+
+    @property
+    def n_days(self):
+        return self.matrix.shape[1]
+
+    def channel(self, name):
+        return self.matrix[:, :, self.channels.index(name)]
+
+    def features(self, users=slice(None), days=slice(None)):
+        """The nine behavioural features for a user/day selection."""
+        return self.matrix[users, days, :len(FEATURES)]
+
+    def labels(self, users=slice(None), days=slice(None)):
+        return self.matrix[users, days, self.channels.index("is_malicious")]
+
+    def user_indices(self, role=None, region=None):
+        mask = np.ones(self.n_users, dtype=bool)
+        if role is not None:
+            mask &= self.users["role"] == self.roles.index(role)
+        if region is not None:
+            mask &= self.users["region"] == self.regions.index(region)
+        return np.flatnonzero(mask)
+
+    def is_fresh(self, csv_path=DATASET_PATH):
+        """True if the cache was built from the current version of csv_path."""
+        try:
+            current = _fingerprint(csv_path)
+        except FileNotFoundError:
+            return True
+        return all(self.meta.get(k) == v for k, v in current.items())
+
+    def incident_table(self):
+        """
+        One row per user with role, region and had_incident (>= 1 malicious day),
+        the same table risk_analysis.py and monte_carlo.py build with groupby.
+        """
+        import pandas as pd
+
+        had_incident = (self.labels() > 0).any(axis=1).astype(int)
+        return pd.DataFrame({
+            "user_id": self.users["user_id"],
+            "role": np.array(self.roles)[self.users["role"]],
+            "region": np.array(self.regions)[self.users["region"]],
+            "had_incident": had_incident,
+        })
+
+
+def open_feature_cache(cache_dir=CACHE_DIR, csv_path=DATASET_PATH):
+    """Open the cache if it exists and matches csv_path, otherwise return None."""
+    if not (Path(cache_dir) / "meta.json").exists():
+        return None
+    cache = FeatureCache(cache_dir)
+    return cache if cache.is_fresh(csv_path) else None
+
+
+if __name__ == "__main__":
+    cache = build_feature_cache()
+    print(f"Feature cache {cache.matrix.shape} written to {CACHE_DIR}")
@@ -1,14 +1,13 @@
-import random
-import uuid
+import argparse
+import asyncio
+import csv
+import json
+import time
+from functools import lru_cache
 import numpy as np
-import pandas as pd
 from datetime import datetime, timedelta
 from pathlib import Path
 
-# seed for reproducability
-random.seed(1337)
-np.random.seed(1337)
-
 # Organization: how many users per role, regions, days
 NUM_USERS_BY_ROLE = {
     "C_Level":         9,
@@ -22,6 +21,19 @@ NUM_USERS_BY_ROLE = {
 REGIONS = ["NA", "EU", "APAC"]
 DAYS_TO_SIMULATE = 240   # Assuming 240 working days in a year
 
+# The nine daily behavioural features, in the column order of the output dataset
+FEATURES = [
+    "after_hours_logons",
+    "sensitive_file_reads",
+    "usb_device_mounts",
+    "external_emails_sent",
+    "emails_with_attachments",
+    "cloud_upload_events",
+    "failed_logins",
+    "files_deleted",
+    "http_competitor_visits",
+]
+
 # Role baselines behavior per day
 # These are "typical" counts when the day is not malicious.
 ROLE_BEHAVIOR_BASE = {
@@ -201,257 +213,580 @@ ROLE_OPPORTUNITY_WEIGHTS = {
     },
 }
 
-# All of our numbers should not be negative
-def nonnegative_int(x: float) -> int:
-    return max(int(round(x)), 0)
+# Per-user psychometric scores, (mean, std) per role:
+#   - conscientiousness (rule-following)
+#   - neuroticism (stress reactivity)
+# Scores are clipped to 0-100.
+ROLE_PSYCHOMETRICS = {
+    # Very high discipline, very calm - low base risk but high opportunity
+    "C_Level":        {"conscientiousness": (80, 5),  "neuroticism": (40, 6)},
+    # Traders are average in rule following, but highly stress sensitive
+    "Trader":         {"conscientiousness": (60, 8),  "neuroticism": (60, 10)},
+    # Admins are rule driven and calm under pressure - low base risk, but high opportunity
+    "IT_Admin":       {"conscientiousness": (70, 6),  "neuroticism": (45, 8)},
+    # Balanced with medium discipline, medium stress - moderate risk
+    "Analyst":        {"conscientiousness": (62, 7),  "neuroticism": (55, 9)},
+    # High deviations some very careful, some careless. Highest risk
+    "Contractor":     {"conscientiousness": (50, 10), "neuroticism": (52, 10)},
+    # Very disciplined, emotionally steady - low risk, but high data sensitivity
+    "Exec_Assistant": {"conscientiousness": (75, 5),  "neuroticism": (50, 7)},
+}
+DEFAULT_PSYCHOMETRICS = {"conscientiousness": (60, 10), "neuroticism": (55, 10)}
+
+# Chance that an HR event occurs. C_level has the lowest while contractors
+# being temporary staff might encounter more HR event
+HR_FLAG_RATE = {
+    "C_Level":        0.0001,
+    "Trader":         0.001,
+    "IT_Admin":       0.0015,
+    "Analyst":        0.001,
+    "Contractor":     0.002,
+    "Exec_Assistant": 0.0005,
+}
+
+# Base daily probabilities set for realistic annual rates. C_level would have the lowest
+# probability, while Contractor or trader will have the highest risk.
+BASE_DAILY_PROB = {
+    "C_Level":        0.00005,
+    "Trader":         0.00010,
+    "IT_Admin":       0.00015,  # highest risk
+    "Analyst":        0.00008,
+    "Contractor":     0.00020,  # highest risk - temporary staff
+    "Exec_Assistant": 0.00010,
+}
+
+# If malicious day, then reflect it in the daily behaviour by spiking the features.
+# Spiked values are for features in ROLE_OPPORTUNITY_WEIGHTS for that particular role.
+# (low, high) counts are added, both inclusive.
+MALICIOUS_SPIKES = {
+    "C_Level": {
+        "sensitive_file_reads": (100, 200),
+        "external_emails_sent": (30, 50),
+        "cloud_upload_events": (5, 10),
+        "after_hours_logons": (5, 10),
+    },
+    "Trader": {
+        "cloud_upload_events": (3, 6),
+        "sensitive_file_reads": (20, 40),
+        "after_hours_logons": (2, 4),
+    },
+    "IT_Admin": {
+        "after_hours_logons": (3, 6),
+        "sensitive_file_reads": (40, 80),
+        "usb_device_mounts": (1, 3),
+        "files_deleted": (20, 50),
+    },
+    "Analyst": {
+        "external_emails_sent": (5, 10),
+        "emails_with_attachments": (5, 10),
+        "sensitive_file_reads": (15, 30),
+    },
+    "Contractor": {
+        "usb_device_mounts": (2, 5),
+        "sensitive_file_reads": (30, 60),
+        "cloud_upload_events": (1, 3),
+    },
+    "Exec_Assistant": {
+        "external_emails_sent": (8, 15),
+        "emails_with_attachments": (8, 15),
+        "sensitive_file_reads": (10, 20),
+    },
+}
+
+# Multi-day campaigns. A malicious day is the last day of a campaign that ramps
+# up over the preceding weeks: reconnaissance reads, then staging (collecting,
+# archiving, cleaning up), then the exfiltration days themselves. Phase lengths
+# in days are drawn per campaign; phases that would start before day 0 are cut.
+CAMPAIGN_PHASES = ["recon", "staging", "exfil"]
+CAMPAIGN_PHASE_DAYS = {
+    "recon": (10, 20),
+    "staging": (3, 7),
+    "exfil": (1, 3),
+}
+
+# Role-specific (low, high) counts added per day in the recon and staging
+# phases. Exfil days use MALICIOUS_SPIKES and are labelled is_malicious.
+CAMPAIGN_PROFILES = {
+    "C_Level": {
+        "recon":   {"sensitive_file_reads": (10, 25), "after_hours_logons": (1, 2)},
+        "staging": {"sensitive_file_reads": (20, 40), "emails_with_attachments": (5, 12)},
+    },
+    "Trader": {
+        "recon":   {"sensitive_file_reads": (5, 12), "after_hours_logons": (0, 2)},
+        "staging": {"files_deleted": (2, 5), "emails_with_attachments": (2, 5)},
+    },
+    "IT_Admin": {
+        "recon":   {"sensitive_file_reads": (5, 12), "failed_logins": (1, 3), "after_hours_logons": (1, 2)},
+        "staging": {"sensitive_file_reads": (10, 25), "files_deleted": (5, 15)},
+    },
+    "Analyst": {
+        "recon":   {"sensitive_file_reads": (4, 10), "after_hours_logons": (0, 2)},
+        "staging": {"emails_with_attachments": (2, 5), "files_deleted": (1, 4)},
+    },
+    "Contractor": {
+        "recon":   {"sensitive_file_reads": (4, 10), "failed_logins": (1, 2)},
+        "staging": {"sensitive_file_reads": (8, 15), "files_deleted": (2, 6)},
+    },
+    "Exec_Assistant": {
+        "recon":   {"sensitive_file_reads": (3, 8), "after_hours_logons": (0, 1)},
+        "staging": {"emails_with_attachments": (3, 6), "files_deleted": (1, 3)},
+    },
+}
+
+# Daily probability terms (see decide_malicious)
+STRESS_TERM = 0.000003      # per stress factor
+OPPORTUNITY_TERM = 0.00001  # 0.001% per 'opp' unit
+MAX_DAILY_PROB = 0.0005     # hard cap at 0.05% per day
+GENERATOR_SEED = 1337      # seed for reproducability
+USER_CHUNK_SIZE = 250       # users simulated per batch of (users, days, features) draws
 
 
-def generate_psychometrics(role: str):
+class RoleTable:
     """
-    Assign per-user psychometric scores:
-      - conscientiousness (rule-following)
-      - neuroticism (stress reactivity)
+    The role tables above as arrays indexed by role code (position in `roles`),
+    so a whole roster or a (users, days) block is looked up with one fancy index.
+
+    Attributes:
+        roles (list): role names, the role code is the index
+        headcount (roles,): users per role
+        mu, sigma, opp_weights (roles, features): behaviour baseline, spread and opportunity weights
+        psych_mean, psych_std (roles, 2): conscientiousness and neuroticism (mean, std)
+        hr_rate, base_prob (roles,): daily HR flag chance and base malicious probability
+        spike_low, spike_high (roles, features): inclusive spike range, 0/0 where a feature is not spiked
+        campaign_low, campaign_high (roles, 2, features): the same for the recon and staging phases
+        config (dict): the role overrides the table was built from (JSON-ready),
+            so a remote worker can rebuild the same table
     """
-    if role == "C_Level":
-        # Very high discipline, very calm - low base risk but high opportunity
-        conscientiousness = np.random.normal(80, 5)
-        neuroticism       = np.random.normal(40, 6)
-    elif role == "Trader":
-        # Traders are average in rule following, but highly stress sensitive
-        conscientiousness = np.random.normal(60, 8)
-        neuroticism       = np.random.normal(60, 10)
-    elif role == "IT_Admin":
-        # Admins are rule driven and calm under pressure - low base risk, but high opportunity
-        conscientiousness = np.random.normal(70, 6)
-        neuroticism       = np.random.normal(45, 8)
-    elif role == "Analyst":
-        # Balanced with medium discipline, medium stress - moderate risk 
-        conscientiousness = np.random.normal(62, 7)
-        neuroticism       = np.random.normal(55, 9)
-    elif role == "Contractor":
-        # High deviations some very careful, some careless. Highest risk
-        conscientiousness = np.random.normal(50, 10)
-        neuroticism       = np.random.normal(52, 10)
-    elif role == "Exec_Assistant":
-        # Very disciplined, emotionally steady - low risk, but high data sensitivity
-        conscientiousness = np.random.normal(75, 5)
-        neuroticism       = np.random.normal(50, 7)
-    else:
-        conscientiousness = np.random.normal(60, 10)
-        neuroticism       = np.random.normal(55, 10)
 
-    conscientiousness = min(max(conscientiousness, 0), 100)
-    neuroticism       = min(max(neuroticism, 0), 100)
-    return conscientiousness, neuroticism
+    def __init__(self, headcount, behavior_base, behavior_std, opportunity_weights,
+                 psychometrics, hr_flag_rate, base_daily_prob, spikes, campaign):
+        self.roles = list(headcount)
+        self.index = {role: i for i, role in enumerate(self.roles)}
+        self.headcount = np.array([headcount[r] for r in self.roles], dtype=np.int64)
+        self.mu = np.array([[behavior_base[r][f] for f in FEATURES] for r in self.roles], dtype=float)
+        self.sigma = np.array([[behavior_std[r].get(f, 0.0) for f in FEATURES] for r in self.roles], dtype=float)
+        self.opp_weights = np.array([[opportunity_weights.get(r, {}).get(f, 0.0) for f in FEATURES]
+                                     for r in self.roles], dtype=float)
+        psych = [psychometrics.get(r, DEFAULT_PSYCHOMETRICS) for r in self.roles]
+        self.psych_mean = np.array([[p["conscientiousness"][0], p["neuroticism"][0]] for p in psych], dtype=float)
+        self.psych_std = np.array([[p["conscientiousness"][1], p["neuroticism"][1]] for p in psych], dtype=float)
+        self.hr_rate = np.array([hr_flag_rate[r] for r in self.roles], dtype=float)
+        self.base_prob = np.array([base_daily_prob[r] for r in self.roles], dtype=float)
+        ranges = [[spikes.get(r, {}).get(f, (0, 0)) for f in FEATURES] for r in self.roles]
+        self.spike_low = np.array([[lo for lo, _ in row] for row in ranges], dtype=np.int64)
+        self.spike_high = np.array([[hi for _, hi in row] for row in ranges], dtype=np.int64)
+        ranges = [[[campaign.get(r, {}).get(p, {}).get(f, (0, 0)) for f in FEATURES] for p in CAMPAIGN_PHASES[:2]]
+                  for r in self.roles]
+        self.campaign_low = np.array([[[lo for lo, _ in row] for row in phases] for phases in ranges], dtype=np.int64)
+        self.campaign_high = np.array([[[hi for _, hi in row] for row in phases] for phases in ranges], dtype=np.int64)
+
+
+def build_role_table(role_config=None):
+    """
+    RoleTable from the module tables, with optional per-role overrides.
+
+    Args:
+        role_config (dict): {role: {key: value}} where key is one of headcount,
+            behavior_base, behavior_std, opportunity_weights, psychometrics,
+            hr_flag_rate, base_daily_prob, spikes, campaign. Dict values are merged per
+            feature into the existing role; an unknown role adds a new role and
+            must give headcount, behavior_base (every feature), behavior_std,
+            hr_flag_rate and base_daily_prob. Traits missing from psychometrics
+            use DEFAULT_PSYCHOMETRICS.
+
+    Raises ValueError on an incomplete or unknown entry.
+    """
+    tables = {
+        "headcount": dict(NUM_USERS_BY_ROLE),
+        "behavior_base": {r: dict(v) for r, v in ROLE_BEHAVIOR_BASE.items()},
+        "behavior_std": {r: dict(v) for r, v in ROLE_BEHAVIOR_STD.items()},
+        "opportunity_weights": {r: dict(v) for r, v in ROLE_OPPORTUNITY_WEIGHTS.items()},
+        "psychometrics": {r: dict(v) for r, v in ROLE_PSYCHOMETRICS.items()},
+        "hr_flag_rate": dict(HR_FLAG_RATE),
+        "base_daily_prob": dict(BASE_DAILY_PROB),
+        "spikes": {r: dict(v) for r, v in MALICIOUS_SPIKES.items()},
+        "campaign": {r: {p: dict(s) for p, s in v.items()} for r, v in CAMPAIGN_PROFILES.items()},
+    }
+    for role, overrides in (role_config or {}).items():
+        for key, value in overrides.items():
+            if key not in tables:
+                raise ValueError(f"unknown role parameter '{key}' for role '{role}'")
+            if isinstance(value, dict):
+                if key in ("psychometrics", "spikes"):
+                    value = {k: tuple(v) for k, v in value.items()}   # JSON gives lists
+                if key == "campaign":
+                    current = tables[key].setdefault(role, {})
+                    for phase, ranges in value.items():
+                        current.setdefault(phase, {}).update({k: tuple(v) for k, v in ranges.items()})
+                    continue
+                tables[key].setdefault(role, {}).update(value)
+            else:
+                tables[key][role] = value
+    missing = [(r, k) for r in tables["headcount"]
+               for k in ("behavior_base", "behavior_std", "hr_flag_rate", "base_daily_prob")
+               if r not in tables[k]]
+    if missing:
+        raise ValueError("role config is missing " + ", ".join(f"{k} for {r}" for r, k in missing))
+    unknown = {f for r in tables["headcount"] for f in tables["behavior_base"][r] if f not in FEATURES}
+    if unknown:
+        raise ValueError(f"unknown features in role config: {sorted(unknown)}")
+    incomplete = [(r, [f for f in FEATURES if f not in tables["behavior_base"][r]]) for r in tables["headcount"]]
+    incomplete = [(r, fs) for r, fs in incomplete if fs]
+    if incomplete:
+        raise ValueError("behavior_base must give every feature; missing "
+                         + "; ".join(f"{', '.join(fs)} for {r}" for r, fs in incomplete))
+    # Partial psychometrics fall back to the default (mean, std) per trait
+    for role in tables["headcount"]:
+        psych = {**DEFAULT_PSYCHOMETRICS, **tables["psychometrics"].get(role, {})}
+        if set(psych) != set(DEFAULT_PSYCHOMETRICS):
+            raise ValueError(f"unknown psychometrics for {role}: {sorted(set(psych) - set(DEFAULT_PSYCHOMETRICS))}")
+        tables["psychometrics"][role] = psych
+    phases = {p for v in tables["campaign"].values() for p in v} - set(CAMPAIGN_PHASES[:2])
+    if phases:
+        raise ValueError(f"campaign profiles only cover {CAMPAIGN_PHASES[:2]}, got {sorted(phases)}")
+    table = RoleTable(**tables)
+    table.config = role_config or {}
+    return table
+
+
+def load_role_config(path):
+    """Role overrides from a JSON file (see build_role_table for the format)."""
+    with open(path) as f:
+        return json.load(f)
+
+
+# Role x feature matrices of the tables above so a whole batch of rows can be
+# scored at once (used by the streaming ingest service).
+ROLE_TABLE = build_role_table()
+ROLES = ROLE_TABLE.roles
+ROLE_INDEX = ROLE_TABLE.index
+_MU = ROLE_TABLE.mu
+_SIGMA = ROLE_TABLE.sigma
+_OPP_WEIGHTS = ROLE_TABLE.opp_weights
+
+
+def opportunity_scores(role_codes, X, table=ROLE_TABLE):
+    """
+    Role-weighted 'opportunity' from a batch of daily behaviour rows.
+    Only rare deviations count: for each weighted feature, the excess of its
+    z-score over 2 sigma (~97.5th percentile,
+    https://www.geeksforgeeks.org/maths/68-95-99-rule/), times the role weight,
+    summed and capped at 5 to keep the value realistic.
 
+    Args:
+        role_codes: (n,) integer array of indices into table.roles
+        X: (n, 9) array of daily counts in FEATURES order
 
-# Chance that an HR event occurs. C_level has the lowest while contractors 
-# being temporary staff might encounter more HR event
-def hr_flag_chance(role: str) -> float:
-    return {
-        "C_Level":        0.0001,
-        "Trader":         0.001,   
-        "IT_Admin":       0.0015,
-        "Analyst":        0.001,
-        "Contractor":     0.002,
-        "Exec_Assistant": 0.0005,
-    }[role]
+    Returns the (n,) array of capped opportunity scores.
+    """
+    mu = table.mu[role_codes]
+    sigma = table.sigma[role_codes]
+    z = np.divide(X - mu, sigma, out=np.zeros(X.shape), where=sigma > 0)
+    spike = np.maximum(z - 2.0, 0.0)
+    return np.minimum((table.opp_weights[role_codes] * spike).sum(axis=1), 5.0)
 
 
-def opportunity_score(pre_row: dict) -> float:
+def generate_roster(rng, table=ROLE_TABLE):
     """
-    Role-weighted 'opportunity' from daily behavior.
-    pre_row would be the behaviour generated for the day.
-    Only count rare deviations (more than 2sigma) which is > ~97.5th percentile. (https://www.geeksforgeeks.org/maths/68-95-99-rule/)
+    Assign every user a role, region and psychometric scores in one draw.
+
+    Returns a dict of (users,) arrays: user_id, role_code, region_code,
+    conscientiousness, neuroticism.
     """
-    role    = pre_row["role"]
-    mu      = ROLE_BEHAVIOR_BASE[role]
-    sigma   = ROLE_BEHAVIOR_STD[role]
-    weights = ROLE_OPPORTUNITY_WEIGHTS[role]
-
-    score = 0.0
-    for feat, w in weights.items():
-        x = pre_row[feat]             # Actual behaviour for the day
-        s = sigma.get(feat, 0.0)      # Standard deviation for this behaviour
-        if s <= 0:
-            continue
-        z = (x - mu[feat]) / s        # How many features from the ROLE_OPPORTUNITY_WEIGHTS is above mu
-        spike = max(0.0, z - 2.0)     # only count the ones above 2sigma - spike
-        if spike > 0:
-            score += w * spike        # calculate oppertunity as sum of spike x weight for each feature 
-    return min(score, 5.0)            # cap to 5 to keep the value realistic.
-
-
-def decide_and_inject_malicious(row: dict,
-                                conscientiousness: float,
-                                neuroticism: float,
-                                is_hr_flagged: int):
+    role_code = np.repeat(np.arange(len(table.roles)), table.headcount)
+    n = len(role_code)
+    psych = np.clip(rng.normal(table.psych_mean[role_code], table.psych_std[role_code]), 0, 100)
+
+    # Seeded ids (uuid4 would differ on every run); redraw the rare collision
+    ids = rng.integers(0, 2**32, size=n, dtype=np.uint64)
+    while len(np.unique(ids)) < n:
+        _, first = np.unique(ids, return_index=True)
+        dup = np.setdiff1d(np.arange(n), first)
+        ids[dup] = rng.integers(0, 2**32, size=len(dup), dtype=np.uint64)
+
+    return {
+        "user_id": np.array([f"BB-{i:08x}" for i in ids]),
+        "role_code": role_code,
+        "region_code": rng.integers(0, len(REGIONS), size=n),
+        "conscientiousness": psych[:, 0],
+        "neuroticism": psych[:, 1],
+    }
+
+
+def decide_malicious(role_code, X, conscientiousness, neuroticism, is_hr_flagged, rng, table=ROLE_TABLE):
     """
     Based on stress factor (HR flag and phsycometric), base defined probability 
     and oppertunity score based on the day's value, calculate probability that
-    the day is malicious for the given user. 
+    each day is malicious and spike the features of the malicious days in place.
+
+    Formula: P(malicious) = base_role_prob + stress_factor × 0.000003 + opportunity_term
+    where opportunity_term = 0.00001 × opportunity_scores(pre)
 
-    Formula: P(malicious) = base_role_prob + stress_factor × 0.0003 + opportunity_term
-    where opportunity_term = 0.0001 × opportunity_score(pre)
-    
     Daily base probabilities are set extremely low (0.005% to 0.02% per day)
     to achieve annual rates in the 0.8-3% range when compounded over 240 days.
-    0.0003 is multiplies to oppertunity_term to keep the values realistic and produce
-    only some malicious days mirroring actual insider threat behaviour in industry
-    
+    The hard cap at 0.05% per day mirrors actual insider threat behaviour in industry,
+    where having oppertunity does not always mean a malicious day.
+
+    Args:
+        role_code, conscientiousness, neuroticism, is_hr_flagged: (n,) arrays, one per user-day
+        X: (n, features) integer counts, modified in place on malicious days
+
+    Returns the (n,) boolean malicious mask.
+    """
+    # Human/HR stress
+    stress_factor = (neuroticism > 65).astype(int) + is_hr_flagged + (conscientiousness < 50)
+    opp = opportunity_scores(role_code, X, table)      # usually 0, occasionally >0 on some days
+    prob = table.base_prob[role_code] + STRESS_TERM * stress_factor + OPPORTUNITY_TERM * opp
+    prob = np.clip(prob, 0.0, MAX_DAILY_PROB)
+
+    malicious = rng.random(len(prob)) < prob
+    rows = np.flatnonzero(malicious)
+    if len(rows):
+        codes = role_code[rows]
+        low, high = table.spike_low[codes], table.spike_high[codes]
+        X[rows] += np.where(high > 0, rng.integers(low, high + 1), 0)
+    return malicious
+
+
+def inject_campaigns(role_code, malicious, X, rng, table=ROLE_TABLE):
     """
-    # Human/HR stress 
-    stress_factor = 0
-    if neuroticism > 65:
-        stress_factor += 1
-    if is_hr_flagged:
-        stress_factor += 1
-    if conscientiousness < 50:
-        stress_factor += 1
-
-    # Base daily probabilities set for realistic annual rates. C_level would have the lowest
-    # probability, while Contractor or trader will have the highest risk.
-
-    base_role_prob = {
-        "C_Level":        0.00005,  
-        "Trader":         0.00010,  
-        "IT_Admin":       0.00015,  # highest risk
-        "Analyst":        0.00008,  
-        "Contractor":     0.00020,  # highest risk - temporary staff
-        "Exec_Assistant": 0.00010,  
-    }[row["role"]]
-
-    opp = opportunity_score(row)      # usually 0, occasionally >0 on some days
-    # 0.001% per 'opp' unit (very small contribution as having oppertunity does not always mean malicious day)
-    opp_term = 0.00001 * opp          
-
-    prob = base_role_prob + 0.000003 * stress_factor + opp_term
-    # hard cap at 0.05% per day. Insider threat probabilities are pretty low in real life.
-    prob = max(0.0, min(prob, 0.0005))  
-
-    # random probability if today's day looks malicious
-    malicious_today = (random.random() < prob)
-    if not malicious_today:
-        return False, row
-
-    # If malicious day, then reflect it in the daily behaviour by spiking the features.
-    # Spiked values are for features in ROLE_OPPORTUNITY_WEIGHTS for that particular role
-    role = row["role"]
-    if role == "C_Level":
-        row["sensitive_file_reads"]   += random.randint(100, 200)
-        row["external_emails_sent"]   += random.randint(30, 50)
-        row["cloud_upload_events"]    += random.randint(5, 10)
-        row["after_hours_logons"]     += random.randint(5, 10)
-    elif role == "Trader":
-        row["cloud_upload_events"]    += random.randint(3, 6)
-        row["sensitive_file_reads"]   += random.randint(20, 40)
-        row["after_hours_logons"]     += random.randint(2, 4)
-    elif role == "IT_Admin":
-        row["after_hours_logons"]     += random.randint(3, 6)
-        row["sensitive_file_reads"]   += random.randint(40, 80)
-        row["usb_device_mounts"]      += random.randint(1, 3)
-        row["files_deleted"]          += random.randint(20, 50)
-    elif role == "Analyst":
-        row["external_emails_sent"]   += random.randint(5, 10)
-        row["emails_with_attachments"]+= random.randint(5, 10)
-        row["sensitive_file_reads"]   += random.randint(15, 30)
-    elif role == "Contractor":
-        row["usb_device_mounts"]      += random.randint(2, 5)
-        row["sensitive_file_reads"]   += random.randint(30, 60)
-        row["cloud_upload_events"]    += random.randint(1, 3)
-    elif role == "Exec_Assistant":
-        row["external_emails_sent"]   += random.randint(8, 15)
-        row["emails_with_attachments"]+= random.randint(8, 15)
-        row["sensitive_file_reads"]   += random.randint(10, 20)
-
-    return True, row
-
-
-# Build the dataset
-users = []
-for role, count in NUM_USERS_BY_ROLE.items():
-    for _ in range(count):
-        uid = "BB-" + uuid.uuid4().hex[:8]
-        region = random.choice(REGIONS)
-        conscientiousness, neuroticism = generate_psychometrics(role)
-        users.append({
-            "user_id": uid,
-            "role": role,
-            "region": region,
-            "conscientiousness": conscientiousness,
-            "neuroticism": neuroticism
-        })
-
-
-# Simulate day by day activity and compute is_malicious
-rows = []
-start_date = datetime(2025, 9, 1)
-
-for u in users:
-    for day_offset in range(DAYS_TO_SIMULATE):
-        day = start_date + timedelta(days=day_offset)
-        base = ROLE_BEHAVIOR_BASE[u["role"]]
-        std = ROLE_BEHAVIOR_STD[u["role"]]
-
-        # Sample behavior around role means using the STDs
-        after_hours_logons      = nonnegative_int(np.random.normal(base["after_hours_logons"],      std["after_hours_logons"]))
-        sensitive_file_reads    = nonnegative_int(np.random.normal(base["sensitive_file_reads"],    std["sensitive_file_reads"]))
-        usb_device_mounts       = nonnegative_int(np.random.normal(base["usb_device_mounts"],       std["usb_device_mounts"]))
-        external_emails_sent    = nonnegative_int(np.random.normal(base["external_emails_sent"],    std["external_emails_sent"]))
-        emails_with_attachments = nonnegative_int(np.random.normal(base["emails_with_attachments"], std["emails_with_attachments"]))
-        cloud_upload_events     = nonnegative_int(np.random.normal(base["cloud_upload_events"],     std["cloud_upload_events"]))
-        failed_logins           = nonnegative_int(np.random.normal(base["failed_logins"],           std["failed_logins"]))
-        files_deleted           = nonnegative_int(np.random.normal(base["files_deleted"],           std["files_deleted"]))
-        http_competitor_visits  = nonnegative_int(np.random.normal(base["http_competitor_visits"],  std["http_competitor_visits"]))
-
-        # HR stressor
-        is_hr_flagged = 1 if random.random() < hr_flag_chance(u["role"]) else 0
-
-        # Assemble the "pre-injection" row (this is what opp score reads)
-        row = {
-            "user_id": u["user_id"],
-            "role": u["role"],
-            "region": u["region"],
-            "day": day.strftime("%Y-%m-%d"),
-
-            "after_hours_logons": after_hours_logons,
-            "sensitive_file_reads": sensitive_file_reads,
-            "usb_device_mounts": usb_device_mounts,
-            "external_emails_sent": external_emails_sent,
-            "emails_with_attachments": emails_with_attachments,
-            "cloud_upload_events": cloud_upload_events,
-            "failed_logins": failed_logins,
-            "files_deleted": files_deleted,
-            "http_competitor_visits": http_competitor_visits,
-
-            "is_hr_flagged": is_hr_flagged,
-            "conscientiousness": u["conscientiousness"],
-            "neuroticism": u["neuroticism"],
-        }
-
-        # Decide maliciousness using base + stress + opportunity
-        is_mal, row = decide_and_inject_malicious(
-            row,
-            conscientiousness=u["conscientiousness"],
-            neuroticism=u["neuroticism"],
-            is_hr_flagged=is_hr_flagged
-        )
-
-        row["is_malicious"] = int(is_mal)
-        rows.append(row)
-
-df = pd.DataFrame(rows)
+    Turn every malicious day into the last day of a multi-day campaign.
 
-BASE_DIR = Path(__file__).resolve().parent.parent   # moves from src/ → project root
-OUTPUT_DIR = BASE_DIR / "Outputs"
-OUTPUT_DIR.mkdir(exist_ok=True)
+    Walking back from the malicious day, the campaign has exfil days (spiked
+    with MALICIOUS_SPIKES and labelled malicious), then staging days, then
+    recon days, with lengths drawn from CAMPAIGN_PHASE_DAYS and per-day counts
+    from the role's campaign profile. Overlapping campaigns add up.
 
-OUTPUT_DIR_DATASET = OUTPUT_DIR / "Dataset"
-OUTPUT_DIR_DATASET.mkdir(exist_ok=True)  
+    Args:
+        role_code (array): (users,) role codes
+        malicious (array): (users, days) bool, updated in place with the extra exfil days
+        X (array): (users, days, features) integer counts, updated in place
+
+    Returns the (users, days) campaign phase: 0 none, then 1 + index into CAMPAIGN_PHASES
+    (the latest phase wins where campaigns overlap).
+    """
+    phase = np.zeros(malicious.shape, dtype=np.int8)
+    user, last = np.nonzero(malicious)
+    if len(user) == 0:
+        return phase
+    lengths = np.column_stack([rng.integers(lo, hi + 1, size=len(user))
+                               for lo, hi in (CAMPAIGN_PHASE_DAYS[p] for p in CAMPAIGN_PHASES)])
+
+    # Phases end back to back at the malicious day: exfil, then staging, then recon
+    end = last + 1
+    for p in reversed(range(len(CAMPAIGN_PHASES))):
+        start = end - lengths[:, p]
+        n = lengths[:, p]
+        campaign = np.repeat(np.arange(len(user)), n)
+        day = np.repeat(start, n) + np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        keep = day >= 0
+        u, d, r = user[campaign[keep]], day[keep], role_code[user[campaign[keep]]]
+        np.maximum.at(phase, (u, d), p + 1)
+
+        if CAMPAIGN_PHASES[p] == "exfil":
+            # decide_malicious already spiked the malicious day itself
+            extra = ~malicious[u, d]
+            u, d, r = u[extra], d[extra], r[extra]
+            low, high = table.spike_low[r], table.spike_high[r]
+            malicious[u, d] = True
+        else:
+            low, high = table.campaign_low[r, p], table.campaign_high[r, p]
+        np.add.at(X, (u, d), np.where(high > 0, rng.integers(low, high + 1), 0))
+        end = start
+    return phase
+
+
+def chunk_rng(seed, index):
+    """Generator for user chunk `index`: its own SeedSequence child, independent of the other chunks."""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(index,)))
+
+
+@lru_cache(maxsize=4)
+def _cached_roster(seed, config_json):
+    table = build_role_table(json.loads(config_json))
+    return table, generate_roster(np.random.default_rng(seed), table)
+
+
+def chunk_roster(params):
+    """(RoleTable, roster) of a generation job, rebuilt from its params and cached per process."""
+    return _cached_roster(params["seed"], json.dumps(params["role_config"], sort_keys=True))
+
+
+def generate_chunk(params, index):
+    """
+    Simulate user chunk `index` of a generation job (an execution backend task).
+
+    Args:
+        params (dict): seed, role_config, days, chunk_users, campaigns
 
+    The roster comes from the job seed and every chunk draws from chunk_rng(seed,
+    index), so a chunk gives the same rows on any process or machine.
+    """
+    import pandas as pd
+
+    table, roster = chunk_roster(params)
+    days, campaigns = params["days"], params["campaigns"]
+    rng = chunk_rng(params["seed"], index)
+    n_features = len(FEATURES)
+    start_date = datetime(2025, 9, 1)
+    day_labels = np.array([(start_date + timedelta(days=d)).strftime("%Y-%m-%d") for d in range(days)])
+
+    users = slice(index * params["chunk_users"], (index + 1) * params["chunk_users"])
+    role = roster["role_code"][users]
+    n = len(role)
+
+    # Sample behavior around role means using the STDs; all of our numbers should not be negative
+    X = rng.normal(table.mu[role][:, None, :], table.sigma[role][:, None, :], size=(n, days, n_features))
+    X = np.maximum(np.rint(X), 0).astype(np.int64).reshape(n * days, n_features)
+
+    # HR stressor
+    role_day = np.repeat(role, days)
+    is_hr_flagged = (rng.random(n * days) < table.hr_rate[role_day]).astype(int)
+    conscientiousness = np.repeat(roster["conscientiousness"][users], days)
+    neuroticism = np.repeat(roster["neuroticism"][users], days)
+
+    # Decide maliciousness using base + stress + opportunity
+    malicious = decide_malicious(role_day, X, conscientiousness, neuroticism, is_hr_flagged, rng, table)
+    malicious = malicious.reshape(n, days)
+    if campaigns:
+        phase = inject_campaigns(role, malicious, X.reshape(n, days, n_features), rng, table)
+    else:
+        phase = malicious.astype(np.int8) * (CAMPAIGN_PHASES.index("exfil") + 1)
+
+    frame = {
+        "user_id": np.repeat(roster["user_id"][users], days),
+        "role": np.array(table.roles)[role_day],
+        "region": np.array(REGIONS)[np.repeat(roster["region_code"][users], days)],
+        "day": np.tile(day_labels, n),
+    }
+    frame.update({f: X[:, j] for j, f in enumerate(FEATURES)})
+    frame.update({
+        "is_hr_flagged": is_hr_flagged,
+        "conscientiousness": conscientiousness,
+        "neuroticism": neuroticism,
+        "is_malicious": malicious.ravel().astype(int),
+        "campaign_phase": phase.ravel(),
+    })
+    return pd.DataFrame(frame)
+
+
+def build_dataset(seed=GENERATOR_SEED, table=ROLE_TABLE, days=DAYS_TO_SIMULATE, chunk_users=USER_CHUNK_SIZE,
+                  campaigns=True, backend=None):
+    """
+    Build the roster and simulate `days` days of activity per user.
+    Returns the activity DataFrame (one row per user per day, user-major).
 
+    Users are simulated in chunks (generate_chunk): each chunk draws its
+    (users, days, features) behaviour, HR flags and malicious days as single
+    array operations. With campaigns=False every malicious day is an isolated
+    single-day spike.
 
-output_file = OUTPUT_DIR_DATASET / 'billybank_activity.csv'
+    Args:
+        backend: backends.py execution backend to run the chunks on
+                 (default: in this process). The result does not depend on it.
+    """
+    import pandas as pd
+
+    params = {"seed": seed, "role_config": table.config, "days": days,
+              "chunk_users": chunk_users, "campaigns": campaigns}
+    n_users = int(table.headcount.sum())
+    n_chunks = -(-n_users // chunk_users)
+    if backend is None:
+        frames = [generate_chunk(params, i) for i in range(n_chunks)]
+    else:
+        frames = list(backend.imap("generate", params, n_chunks))
+    return pd.concat(frames, ignore_index=True)
 
-# Save to CSV
-df.to_csv(output_file, index=False)
+
+BASE_DIR = Path(__file__).resolve().parent.parent   # moves from src/ → project root
+OUTPUT_DIR = BASE_DIR / "Outputs"
+OUTPUT_DIR_DATASET = OUTPUT_DIR / "Dataset"
+DATASET_PATH = OUTPUT_DIR_DATASET / 'billybank_activity.csv'
+
+
+async def replay_dataset(csv_path=DATASET_PATH, host="127.0.0.1", port=8765, rate=5000.0, limit=None):
+    """
+    Replay an activity CSV into the streaming ingest service (stream_ingest.py)
+    as newline-delimited JSON over a local TCP socket.
+
+    Args:
+        rate (float): target events per second. 0 replays as fast as the
+                      receiver accepts them.
+        limit (int): stop after this many records (None = whole file)
+
+    Every record is stamped with `emitted_at` (epoch seconds) so the ingest
+    side can report end-to-end latency. writer.drain() blocks whenever the
+    ingest service stops reading, so a slow consumer throttles the replay
+    instead of filling memory.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    sent = 0
+    start = time.perf_counter()
+    with open(csv_path, newline="") as f:
+        for record in csv.DictReader(f):
+            if limit is not None and sent >= limit:
+                break
+            record["emitted_at"] = time.time()
+            writer.write((json.dumps(record) + "\n").encode())
+            sent += 1
+            # Pace in small bursts rather than sleeping per record
+            if rate > 0 and sent % 100 == 0:
+                ahead = sent / rate - (time.perf_counter() - start)
+                if ahead > 0:
+                    await asyncio.sleep(ahead)
+                await writer.drain()
+    await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+    elapsed = time.perf_counter() - start
+    print(f"Replayed {sent:,} records in {elapsed:.2f}s ({sent / max(elapsed, 1e-9):,.0f} events/s)")
+
+
+if __name__ == "__main__":
+    from backends import add_backend_arguments, backend_from_args
+
+    parser = argparse.ArgumentParser(description="Generate the BillyBank activity dataset or replay it into the ingest service")
+    parser.add_argument("--replay", action="store_true", help="replay an existing dataset instead of generating one")
+    parser.add_argument("--input", default=str(DATASET_PATH), help="dataset to replay")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rate", type=float, default=5000.0, help="replay rate in events/s (0 = unthrottled)")
+    parser.add_argument("--limit", type=int, default=None, help="maximum number of records to replay")
+    parser.add_argument("--role-config", default=None, help="JSON file of role overrides or additional roles")
+    parser.add_argument("--seed", type=int, default=GENERATOR_SEED)
+    parser.add_argument("--output", default=str(DATASET_PATH), help="dataset CSV to write")
+    parser.add_argument("--no-campaigns", action="store_true", help="single-day malicious spikes instead of multi-day campaigns")
+    parser.add_argument("--events", action="store_true", help="also expand the daily counts into a raw event log (event_log.py)")
+    add_backend_arguments(parser)
+    args = parser.parse_args()
+    if args.events and Path(args.output) != DATASET_PATH:
+        parser.error("--events builds the event log from the feature cache, which is only built for the "
+                     f"default --output ({DATASET_PATH})")
+
+    if args.replay:
+        asyncio.run(replay_dataset(args.input, args.host, args.port, args.rate, args.limit))
+    else:
+        table = build_role_table(load_role_config(args.role_config)) if args.role_config else ROLE_TABLE
+        backend = backend_from_args(args)
+        start = time.perf_counter()
+        try:
+            df = build_dataset(args.seed, table, campaigns=not args.no_campaigns, backend=backend)
+        finally:
+            backend.close()
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        # Save to CSV
+        df.to_csv(output, index=False)
+        print(f"Generated {len(df):,} rows for {df['user_id'].nunique():,} users "
+              f"in {time.perf_counter() - start:.1f}s -> {output}")
+
+        # Materialise the memory-mapped feature matrix for the later stages. Only the
+        # default dataset gets one: the cache and event log have a single, fixed location.
+        if output == DATASET_PATH:
+            from feature_cache import build_feature_cache
+            cache = build_feature_cache(DATASET_PATH)
+
+            if args.events:
+                from event_log import EVENT_LOG_DIR, write_event_log
+                total = write_event_log(cache)
+                print(f"Expanded into {total:,} raw events -> {EVENT_LOG_DIR}")
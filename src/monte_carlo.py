@@ -1,8 +1,12 @@
-import pandas as pd
+# pandas, matplotlib and the dataset are loaded on first use, not on import:
+# the dashboard and the CLI stages import this module on every (re)run.
 import numpy as np
-import matplotlib.pyplot as plt
+import hashlib
 import json
+from functools import lru_cache
 from pathlib import Path
+from result_store import save_scenario, scenario_name
+from tail_metrics import tail_metrics
 
 BASE_DIR = Path(__file__).resolve().parent.parent   
 OUTPUT_DIR = BASE_DIR / "Outputs"
@@ -10,10 +14,11 @@ OUTPUT_DIR.mkdir(exist_ok=True)
 
 OUTPUT_DIR_MONTE = OUTPUT_DIR / "monte_carlo_results"
 OUTPUT_DIR_MONTE.mkdir(exist_ok=True)  
-
-
-
-plt.style.use('seaborn-v0_8-darkgrid')
+RESULTS_JSON = OUTPUT_DIR_MONTE / 'monte_carlo_results.json'
+# Read at call time, so tests can point the loaders at a generated dataset
+DATASET_PATH = OUTPUT_DIR / "Dataset/billybank_activity.csv"
+FEATURE_CACHE_DIR = OUTPUT_DIR / "feature_cache"
+LOSS_RANGES_PATH = BASE_DIR / "Docs/employee_loss_ranges.csv"
 
 
 ROLES = ["C_Level", "Analyst", "Trader", "IT_Admin", "Exec_Assistant", "Contractor"]
@@ -31,6 +36,7 @@ BASE_VULNERABILITY = 0.75  # 75% baseline success rate
 ATTEMPTS_MEAN = 3.5  # Average attempts per insider per year (Poisson distribution)
 
 N_ITER = 10000
+SEED = 80
 
 # Mapping from dataset roles to loss data csv roles
 ROLE_MAPPING = {
@@ -42,25 +48,49 @@ ROLE_MAPPING = {
     'Contractor': 'Contractors / Temporary Staff'
 }
 
-df = pd.read_csv(OUTPUT_DIR / "Dataset/billybank_activity.csv", keep_default_na=False)
-df['region'] = df['region'].replace({np.nan: "NA"})
 
-user_had_incident = df.groupby(['user_id', 'role'])['is_malicious'].agg([
-    ('had_incident', lambda x: int(x.sum() > 0))
-]).reset_index()
+@lru_cache(maxsize=None)
+def load_user_had_incident():
+    """One row per user with had_incident (>= 1 malicious day). Loaded once per process."""
+    # Prefer the memory-mapped feature cache (feature_cache.py) over re-parsing the CSV
+    from feature_cache import open_feature_cache
 
-# Probability of Action. If no had_incident (for exampe C_level), fill value as 0
-role_poa = user_had_incident.groupby('role')['had_incident'].mean().reindex(ROLES, fill_value=0.0)  
+    feature_cache = open_feature_cache(FEATURE_CACHE_DIR, DATASET_PATH)
+    if feature_cache is not None:
+        return feature_cache.incident_table()
 
-loss_ranges = pd.read_csv(BASE_DIR / 'Docs/employee_loss_ranges.csv')
-loss_dict = {}
-for _, row in loss_ranges.iterrows():
-    loss_dict[row['Level']] = {
-        'min': row['Min Loss (USD)'],
-        'max': row['Max Loss (USD)']
-    }
+    import pandas as pd
+
+    df = pd.read_csv(DATASET_PATH, keep_default_na=False)
+    df['region'] = df['region'].replace({np.nan: "NA"})
+
+    return df.groupby(['user_id', 'role'])['is_malicious'].agg([
+        ('had_incident', lambda x: int(x.sum() > 0))
+    ]).reset_index()
+
+
+@lru_cache(maxsize=None)
+def load_role_poa():
+    """Probability of Action per role, as a Series in ROLES order."""
+    # If no had_incident (for exampe C_level), fill value as 0
+    return load_user_had_incident().groupby('role')['had_incident'].mean().reindex(ROLES, fill_value=0.0)
+
+
+@lru_cache(maxsize=None)
+def load_loss_dict():
+    """{loss level: {'min', 'max'}} from the loss range table."""
+    import pandas as pd
+
+    loss_ranges = pd.read_csv(LOSS_RANGES_PATH)
+    loss_dict = {}
+    for _, row in loss_ranges.iterrows():
+        loss_dict[row['Level']] = {
+            'min': row['Min Loss (USD)'],
+            'max': row['Max Loss (USD)']
+        }
+    return loss_dict
 
-def run_monte_carlo_simulation(mitigation_weight=0.0, n_iterations=N_ITER):
+def run_monte_carlo_simulation(mitigation_weight=0.0, n_iterations=N_ITER, seed=SEED):
     """
     Monte Carlo using FAIR Framework with mitigation weight
     
@@ -80,6 +110,8 @@ def run_monte_carlo_simulation(mitigation_weight=0.0, n_iterations=N_ITER):
     """
     # Calculate effective vulnerability after mitigation. effective vulnerability = base_vulnerability (75%) with no mitigation
     effective_vulnerability = BASE_VULNERABILITY * (1 - mitigation_weight)
+    role_poa = load_role_poa()
+    loss_dict = load_loss_dict()
     
     results = {
         'total_loss': [],
@@ -91,7 +123,7 @@ def run_monte_carlo_simulation(mitigation_weight=0.0, n_iterations=N_ITER):
     
     # Setting a fixed seed of 80 for reproducability. This although makes the simulation deterministic 
     # on every run with the same mitigation weight.
-    np.random.seed(80)
+    np.random.seed(seed)
     
     for iteration in range(n_iterations):
         total_loss = 0
@@ -154,12 +186,251 @@ def run_monte_carlo_simulation(mitigation_weight=0.0, n_iterations=N_ITER):
     return results
 
 
-def generate_monte_carlo_results(mitigation_weight=0.0):
-    # Run simulation with mitigation
-    results_with_mitigation = run_monte_carlo_simulation(mitigation_weight)
-    
-    # Run baseline simulation (no mitigation) for comparison
-    results_baseline = run_monte_carlo_simulation(0.0)
+def input_files_fingerprint():
+    """
+    [path, size, mtime] of each file the cached loaders read (dataset, feature
+    cache metadata, loss ranges), as feature_cache.meta records its source.
+    """
+    fingerprint = []
+    for path in (DATASET_PATH, FEATURE_CACHE_DIR / "meta.json", LOSS_RANGES_PATH):
+        try:
+            stat = Path(path).stat()
+            fingerprint.append([str(path), stat.st_size, stat.st_mtime])
+        except FileNotFoundError:
+            fingerprint.append([str(path), None, None])
+    return fingerprint
+
+
+_loaded_fingerprint = None
+
+
+def refresh_inputs():
+    """
+    Clear the cached loaders when an input file changed since they were
+    filled, so a long-running process (sim_api.py) picks up a regenerated
+    dataset instead of answering from the old one.
+    """
+    global _loaded_fingerprint
+    current = input_files_fingerprint()
+    if current != _loaded_fingerprint:
+        load_user_had_incident.cache_clear()
+        load_role_poa.cache_clear()
+        load_loss_dict.cache_clear()
+        _loaded_fingerprint = current
+
+
+def inputs_hash():
+    """
+    Short fingerprint of every model input a run depends on (role PoA,
+    headcounts, vulnerability, attempt rate and loss ranges). Stored with
+    each scenario so results from different inputs are never compared.
+    Reloads the inputs first if their files changed (refresh_inputs).
+    """
+    refresh_inputs()
+    role_poa = load_role_poa()
+    inputs = {
+        'roles': ROLES,
+        'role_poa': [round(float(role_poa[r]), 12) for r in ROLES],
+        'headcount': ROLE_HEADCOUNT,
+        'base_vulnerability': BASE_VULNERABILITY,
+        'attempts_mean': ATTEMPTS_MEAN,
+        'role_mapping': ROLE_MAPPING,
+        'loss_ranges': {k: [float(v['min']), float(v['max'])] for k, v in load_loss_dict().items()},
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def role_loss_bounds(role_mapping=ROLE_MAPPING, roles=ROLES):
+    """Per-role (min_loss, max_loss) arrays in `roles` order, from the loss range table."""
+    loss_dict = load_loss_dict()
+    min_loss = np.array([loss_dict[role_mapping[r]]['min'] for r in roles], dtype=float)
+    max_loss = np.array([loss_dict[role_mapping[r]]['max'] for r in roles], dtype=float)
+    return min_loss, max_loss
+
+
+def simulate_compound_losses(size, poa, rng, headcount=None, attempts_mean=ATTEMPTS_MEAN,
+                             vulnerability=BASE_VULNERABILITY, min_loss=None, max_loss=None,
+                             return_attacks=False):
+    """
+    Vectorised version of the per-iteration loop in run_monte_carlo_simulation.
+
+    Args:
+        size (tuple): output shape, last axis = roles, e.g. (n_iterations, n_roles)
+                      or (n_param_sets, n_iterations, n_roles)
+        poa, headcount, attempts_mean, vulnerability, min_loss, max_loss:
+                      scalars or arrays broadcastable to `size`
+        rng: np.random.Generator
+        return_attacks (bool): also return the flat cell index and loss of
+                      every successful attack
+
+    Same FAIR steps as the loop engine, all cells at once:
+      1. insiders  ~ Binomial(headcount, poa)
+      2. attempts  ~ Poisson(ATTEMPTS_MEAN * insiders)   (sum of iid Poissons)
+      3. incidents ~ Binomial(attempts, vulnerability)
+      4. one clipped lognormal loss per incident, summed back per cell with bincount
+
+    Returns (incidents, losses) arrays of shape `size`.
+    """
+    if headcount is None:
+        headcount = np.array([ROLE_HEADCOUNT[r] for r in ROLES])
+    if min_loss is None or max_loss is None:
+        min_loss, max_loss = role_loss_bounds()
+
+    insiders = rng.binomial(headcount, poa, size=size)
+    attempts = rng.poisson(attempts_mean * insiders)
+    incidents = rng.binomial(attempts, vulnerability)
+
+    cell = np.repeat(np.arange(incidents.size), incidents.ravel())
+    lo = np.broadcast_to(min_loss, size).ravel()[cell]
+    hi = np.broadcast_to(max_loss, size).ravel()[cell]
+    # Same lognormal parameterisation as run_monte_carlo_simulation
+    log_mean = (np.log(lo) + np.log(hi)) / 2
+    log_std = (np.log(hi) - np.log(lo)) / 4
+    attack_losses = np.clip(rng.lognormal(log_mean, log_std), lo, hi)
+
+    losses = np.bincount(cell, weights=attack_losses, minlength=incidents.size).reshape(size)
+    if return_attacks:
+        return incidents, losses, cell, attack_losses
+    return incidents, losses
+
+
+# Optional dependence between roles. Each role's PoA in an iteration is scaled
+# by an intensity multiplier M_r with mean 1 and variance `dispersion`
+# (Gamma marginals). The multipliers are coupled through a Gaussian or
+# t-copula with an equicorrelation `correlation` (a firm-wide "stress year")
+# plus optional pairwise overrides (e.g. collusion between two roles).
+DEPENDENCE_MODELS = {
+    "independent": None,
+    "stress_year": {"copula": "gaussian", "correlation": 0.5, "dispersion": 0.5},
+    "collusion": {"copula": "gaussian", "correlation": 0.2, "dispersion": 0.5,
+                  "pairs": {("Trader", "IT_Admin"): 0.8}},
+    "heavy_tail": {"copula": "t", "df": 3, "correlation": 0.5, "dispersion": 0.5},
+}
+
+
+def correlation_matrix(correlation=0.0, pairs=None, roles=ROLES):
+    """Equicorrelation matrix with pairwise overrides, repaired to be positive definite."""
+    corr = np.full((len(roles), len(roles)), correlation, dtype=float)
+    for (a, b), rho in (pairs or {}).items():
+        i, j = roles.index(a), roles.index(b)
+        corr[i, j] = corr[j, i] = rho
+    np.fill_diagonal(corr, 1.0)
+    eigval, eigvec = np.linalg.eigh(corr)
+    if eigval.min() <= 1e-10:
+        corr = eigvec @ np.diag(np.maximum(eigval, 1e-6)) @ eigvec.T
+        d = np.sqrt(np.diag(corr))
+        corr = corr / np.outer(d, d)
+    return corr
+
+
+def sample_intensity_multipliers(n_iterations, dependence, rng, roles=ROLES):
+    """
+    (n_iterations, roles) mean-one intensity multipliers drawn from the copula.
+    All iterations are drawn in one matrix product with the Cholesky factor.
+    """
+    from scipy.stats import gamma, norm, t
+
+    chol = np.linalg.cholesky(correlation_matrix(dependence.get("correlation", 0.0),
+                                                 dependence.get("pairs"), roles))
+    z = rng.standard_normal((n_iterations, len(roles))) @ chol.T
+    if dependence.get("copula", "gaussian") == "t":
+        df = dependence.get("df", 4)
+        # Same chi-square mixing variable across roles gives joint tail dependence
+        z = z / np.sqrt(rng.chisquare(df, size=(n_iterations, 1)) / df)
+        u = t.cdf(z, df)
+    else:
+        u = norm.cdf(z)
+    theta = dependence.get("dispersion", 0.5)
+    return gamma.ppf(np.clip(u, 1e-12, 1 - 1e-12), a=1.0 / theta, scale=theta)
+
+
+def run_vectorized_simulation(mitigation_weight=0.0, n_iterations=N_ITER, dependence=None, seed=SEED,
+                              attempts_mean=ATTEMPTS_MEAN, base_vulnerability=BASE_VULNERABILITY,
+                              role_mapping=None, engine="numpy"):
+    """
+    Same output structure as run_monte_carlo_simulation, computed with
+    simulate_compound_losses in one pass. `dependence` is None (independent
+    roles), a DEPENDENCE_MODELS key or a dependence dict. attempts_mean,
+    base_vulnerability and role_mapping (loss tier per role, merged over
+    ROLE_MAPPING) override the model constants for what-if scenarios.
+    engine="numba" samples with the compiled kernel in numba_engine.py
+    (NumPy when Numba is not installed).
+    """
+    if isinstance(dependence, str):
+        dependence = DEPENDENCE_MODELS[dependence]
+    effective_vulnerability = base_vulnerability * (1 - mitigation_weight)
+    min_loss, max_loss = role_loss_bounds({**ROLE_MAPPING, **(role_mapping or {})})
+    rng = np.random.default_rng(seed)
+
+    poa = load_role_poa().values
+    if dependence is not None:
+        poa = np.clip(poa * sample_intensity_multipliers(n_iterations, dependence, rng), 0.0, 1.0)
+
+    if engine == "numba":
+        from numba_engine import simulate_compound_losses_jit
+
+        incidents, losses = simulate_compound_losses_jit(n_iterations, poa, rng, attempts_mean=attempts_mean,
+                                                         vulnerability=effective_vulnerability,
+                                                         min_loss=min_loss, max_loss=max_loss)
+    else:
+        incidents, losses = simulate_compound_losses((n_iterations, len(ROLES)), poa, rng,
+                                                     attempts_mean=attempts_mean,
+                                                     vulnerability=effective_vulnerability,
+                                                     min_loss=min_loss, max_loss=max_loss)
+    return {
+        'total_loss': losses.sum(axis=1),
+        'by_role': {role: losses[:, i] for i, role in enumerate(ROLES)},
+        'incidents_by_role': {role: incidents[:, i] for i, role in enumerate(ROLES)},
+        'mitigation_weight': mitigation_weight,
+        'effective_vulnerability': effective_vulnerability
+    }
+
+
+def generate_monte_carlo_results(mitigation_weight=0.0, dependence=None, store_results=False, make_figures=True,
+                                 n_iterations=N_ITER, seed=SEED, engine=None):
+    """
+    Args:
+        mitigation_weight (float): 0.0 to 1.0 reduction in vulnerability
+        dependence: None for independent roles (original loop engine), or a
+                    DEPENDENCE_MODELS key / dict to correlate role incident
+                    intensities (vectorised engine, same seed for baseline and
+                    mitigated runs)
+        store_results (bool): also write the per-iteration arrays of both runs
+                    to the result store (result_store.py)
+        make_figures (bool): build the two report figures (imports matplotlib)
+        n_iterations (int), seed (int): simulated years and seed of both runs
+        engine (str): None for the defaults above, or "numpy" / "numba" to
+                    run both simulations on that vectorised engine
+
+    Returns {'stats': summary statistics (the monte_carlo_results.json
+    content), 'results' / 'baseline': per-iteration arrays of the two runs}
+    plus the figures when requested. Writes nothing to Outputs/ unless
+    store_results is set; the JSON is written by the CLI (write_results_json).
+    """
+    if engine is not None:
+        dependence = None if dependence == "independent" else dependence
+        results_with_mitigation = run_vectorized_simulation(mitigation_weight, n_iterations, dependence, seed,
+                                                            engine=engine)
+        results_baseline = run_vectorized_simulation(0.0, n_iterations, dependence, seed, engine=engine)
+    elif dependence is None or dependence == "independent":
+        # Run simulation with mitigation
+        results_with_mitigation = run_monte_carlo_simulation(mitigation_weight, n_iterations, seed)
+
+        # Run baseline simulation (no mitigation) for comparison
+        results_baseline = run_monte_carlo_simulation(0.0, n_iterations, seed)
+    else:
+        results_with_mitigation = run_vectorized_simulation(mitigation_weight, n_iterations, dependence, seed)
+        results_baseline = run_vectorized_simulation(0.0, n_iterations, dependence, seed)
+
+    # Custom dependence dicts have no stable name, so only presets are stored
+    if store_results and (dependence is None or isinstance(dependence, str)):
+        h = inputs_hash()
+        for results in (results_with_mitigation, results_baseline):
+            name = None
+            if engine is not None:
+                # Keep vectorised-engine runs apart from the default engine's files
+                name = scenario_name(results['mitigation_weight'], seed, h, dependence, n_iterations) + f"_{engine}"
+            save_scenario(results, seed, h, dependence, name=name, extra_meta={'engine': engine} if engine else None)
     
     total_losses = np.array(results_with_mitigation['total_loss'])
     mean_loss = total_losses.mean()
@@ -172,14 +443,10 @@ def generate_monte_carlo_results(mitigation_weight=0.0):
     savings_pct = (savings / baseline_mean * 100) if baseline_mean > 0 else 0
     
     role_data = {}
-    role_baseline_means = {}
     
     for role in ROLES:
         role_mean_loss = np.array(results_with_mitigation['by_role'][role]).mean()
         role_mean_incidents = np.array(results_with_mitigation['incidents_by_role'][role]).mean()
-        role_baseline_mean = np.array(results_baseline['by_role'][role]).mean()
-        
-        role_baseline_means[role] = role_baseline_mean
         
         role_data[role] = {
             'mean_loss': float(role_mean_loss),
@@ -190,6 +457,9 @@ def generate_monte_carlo_results(mitigation_weight=0.0):
             'max': float(np.array(results_with_mitigation['by_role'][role]).max())
         }
     
+    # VaR / TVaR at 1-in-20, 1-in-100, 1-in-200 years with the per-role TVaR split
+    role_matrix = np.column_stack([np.asarray(results_with_mitigation['by_role'][role], dtype=float) for role in ROLES])
+    tail = tail_metrics(total_losses, role_matrix, ROLES)
 
     output_data = {
         'total_company_loss': {
@@ -201,6 +471,8 @@ def generate_monte_carlo_results(mitigation_weight=0.0):
             'min': float(total_losses.min())
         },
         'loss_by_role': role_data,
+        'tail_metrics': tail,
+        'dependence': dependence if isinstance(dependence, str) or dependence is None else 'custom',
         'comparison': {
             'baseline_mean_eal': float(baseline_mean),
             'with_mitigation_mean_eal': float(mean_loss),
@@ -209,50 +481,69 @@ def generate_monte_carlo_results(mitigation_weight=0.0):
         }
     }
     
-    json_path = OUTPUT_DIR_MONTE / 'monte_carlo_results.json'
-    with open(json_path, 'w') as f:
-        json.dump(output_data, f, indent=2)
-    
+    output = {'stats': output_data, 'results': results_with_mitigation, 'baseline': results_baseline}
+    if make_figures:
+        output['fig_distribution'] = plot_loss_distribution(results_with_mitigation, output_data)
+        output['fig_comparison'] = plot_mitigation_comparison(results_baseline, output_data, mitigation_weight)
+    return output
+
+
+# Get the visualisations
+# There are 2 visualisations that this script should produce. We used ChatGpt to help 
+# us produce code for the general visualisation and then edited it to get the style 
+# we wanted it to be in.
+
+# Prompt to ChatGPT:
+# Write Python code (using matplotlib) to produce two visualizations from my Monte-Carlo simulation output:
+# Loss Distribution Plot - For each role, plot a histogram of annual losses (in millions), using weights so bars represent percentages. 
+# Use distinct colors, labeled axes, a title, a legend, and a stats textbox showing mean, P5, median, and P95 of total losses.
+# Mitigation Comparison Bar Chart — For each role, plot two bars: baseline mean loss vs. mitigation mean loss. 
+# Put baseline behind with transparency, mitigation in front with solid colors.Add annotations for savings per role, 
+# axis labels, title containing mitigation effectiveness and total savings, and a small stats box showing
+# baseline vulnerability, new vulnerability, and risk reduction.
+# Assume I provide:
+# results_with_mitigation (dict with losses by role)
+# results_baseline
+# ROLE
+# baseline_mean, mean_loss, savings, savings_pct
+
 
-    # Get the visualisations
-    # There are 2 visualisations that this script should produce. We used ChatGpt to help 
-    # us produce code for the general visualisation and then edited it to get the style 
-    # we wanted it to be in.
-
-    # Prompt to ChatGPT:
-    # Write Python code (using matplotlib) to produce two visualizations from my Monte-Carlo simulation output:
-    # Loss Distribution Plot - For each role, plot a histogram of annual losses (in millions), using weights so bars represent percentages. 
-    # Use distinct colors, labeled axes, a title, a legend, and a stats textbox showing mean, P5, median, and P95 of total losses.
-    # Mitigation Comparison Bar Chart — For each role, plot two bars: baseline mean loss vs. mitigation mean loss. 
-    # Put baseline behind with transparency, mitigation in front with solid colors.Add annotations for savings per role, 
-    # axis labels, title containing mitigation effectiveness and total savings, and a small stats box showing
-    # baseline vulnerability, new vulnerability, and risk reduction.
-    # Assume I provide:
-    # results_with_mitigation (dict with losses by role)
-    # results_baseline
-    # ROLE
-    # baseline_mean, mean_loss, savings, savings_pct
+def _pyplot():
+    """matplotlib.pyplot with the report style, imported on first use."""
+    import matplotlib.pyplot as plt
 
+    plt.style.use('seaborn-v0_8-darkgrid')
+    return plt
+
+
+ROLE_COLORS = {
+    'C_Level': '#8B0000',
+    'Trader': '#4682B4',
+    'IT_Admin': '#228B22',
+    'Analyst': '#FF8C00',
+    'Exec_Assistant': '#9370DB',
+    'Contractor': '#DC143C'
+}
+
+
+def plot_loss_distribution(results_with_mitigation, stats):
+    """Overlapping per-role histogram of annual losses, with the EAL and P5-P95 range."""
+    plt = _pyplot()
+    role_colors = ROLE_COLORS
+    mean_loss = stats['total_company_loss']['mean_eal']
+    p5 = stats['total_company_loss']['p5']
+    p95 = stats['total_company_loss']['p95']
 
     # Overlapping loss distribution by role.
     fig, ax = plt.subplots(1, 1, figsize=(12, 7))
     
-    role_colors = {
-        'C_Level': '#8B0000',
-        'Trader': '#4682B4',
-        'IT_Admin': '#228B22',
-        'Analyst': '#FF8C00',
-        'Exec_Assistant': '#9370DB',
-        'Contractor': '#DC143C'
-    }
-    
     for role in ROLES:
         role_losses = np.array(results_with_mitigation['by_role'][role]) / 1e6
         
         if role_losses.max() > 0:
             role_losses_nonzero = role_losses[role_losses > 0]
             if len(role_losses_nonzero) > 0:
-                weights = np.ones_like(role_losses_nonzero) / N_ITER * 100
+                weights = np.ones_like(role_losses_nonzero) / len(role_losses) * 100
                 
                 ax.hist(role_losses_nonzero, bins=50, alpha=0.6, label=role, 
                        edgecolor='black', color=role_colors[role], linewidth=0.8,
@@ -276,8 +567,20 @@ def generate_monte_carlo_results(mitigation_weight=0.0):
     plot_path = OUTPUT_DIR_MONTE / 'monte_carlo_loss_distribution.jpg'
     #plt.savefig(plot_path, dpi=300, bbox_inches='tight', format='jpg')
     #plt.close()
-    fig_distribution = fig
-    
+    return fig
+
+
+def plot_mitigation_comparison(results_baseline, stats, mitigation_weight):
+    """Per-role mean loss without vs. with the selected controls."""
+    plt = _pyplot()
+    role_colors = ROLE_COLORS
+    role_data = stats['loss_by_role']
+    role_baseline_means = {role: np.mean(results_baseline['by_role'][role]) for role in ROLES}
+    baseline_mean = stats['comparison']['baseline_mean_eal']
+    mean_loss = stats['comparison']['with_mitigation_mean_eal']
+    savings = stats['comparison']['total_savings']
+    savings_pct = stats['comparison']['savings_percentage']
+
     # Bar chart for comparison against no mitigation
     fig, ax = plt.subplots(1, 1, figsize=(14, 8))
     
@@ -332,17 +635,20 @@ def generate_monte_carlo_results(mitigation_weight=0.0):
     comparison_path = OUTPUT_DIR_MONTE / 'mitigation_comparison.jpg'
     #plt.savefig(comparison_path, dpi=300, bbox_inches='tight', format='jpg')
     #plt.close()
-    fig_comparison = fig
-    return {
-        'stats': output_data,
-        'fig_distribution': fig_distribution,
-        'fig_comparison': fig_comparison
-    }   
-    
+    return fig
+
+
+def write_results_json(stats, json_path=RESULTS_JSON):
+    """Write the 'stats' of generate_monte_carlo_results, the summary the dashboard header reads."""
+    with open(json_path, 'w') as f:
+        json.dump(stats, f, indent=2)
+    return json_path
+
 
 if __name__ == "__main__":
     # Example: Run with no mitigation
-    generate_monte_carlo_results(mitigation_weight=0.0)
+    output = generate_monte_carlo_results(mitigation_weight=0.0, store_results=True, make_figures=False)
+    write_results_json(output['stats'])
     
     # Example: Run with 60% mitigation
     # generate_monte_carlo_results(mitigation_weight=0.6)
\ No newline at end of file
@@ -0,0 +1,153 @@
+"""
+Multi-year loss paths for capital planning.
+
+Extends the one-year FAIR simulation to (iterations x years x roles) paths:
+  - headcount evolves per path: each year Binomial(headcount, attrition) staff
+    leave and Binomial(leavers, rehire) of them are replaced
+  - controls phase in: the mitigation weight ramps linearly to its target over
+    `ramp_years`, so early years carry more of the unmitigated risk
+  - yearly losses are accumulated into a nominal and a discounted (present
+    value, end-of-year convention) cumulative loss per path
+
+Iterations are processed in chunks so peak memory depends on the chunk size,
+not the number of paths. Each year of a chunk is one simulate_compound_losses
+call over (chunk, roles) with that year's headcount and vulnerability.
+
+Usage:
+    python3 multi_year.py --years 10 --mitigation-weight 0.5 --ramp-years 3
+"""
+import argparse
+import json
+import numpy as np
+
+from monte_carlo import (BASE_VULNERABILITY, N_ITER, OUTPUT_DIR_MONTE, ROLE_HEADCOUNT, ROLES,
+                         load_role_poa, simulate_compound_losses)
+
+YEARS = 5
+CHUNK_SIZE = 2000
+DISCOUNT_RATE = 0.05
+MULTI_YEAR_SEED = 80
+
+# Annual voluntary + involuntary attrition by role
+ATTRITION_RATE = {
+    "C_Level": 0.08,
+    "Analyst": 0.15,
+    "Trader": 0.18,
+    "IT_Admin": 0.12,
+    "Exec_Assistant": 0.12,
+    "Contractor": 0.35,
+}
+REHIRE_RATE = 0.95   # share of leavers replaced each year
+
+
+def mitigation_schedule(target_weight, years, ramp_years=1):
+    """Mitigation weight per year, reaching target_weight after ramp_years."""
+    ramp = np.minimum(np.arange(1, years + 1) / max(ramp_years, 1), 1.0)
+    return target_weight * ramp
+
+
+def simulate_paths(years=YEARS, n_iterations=N_ITER, mitigation_weight=0.0, ramp_years=1,
+                   discount_rate=DISCOUNT_RATE, rehire_rate=REHIRE_RATE, seed=MULTI_YEAR_SEED,
+                   chunk_size=CHUNK_SIZE):
+    """
+    Simulate n_iterations paths of `years` years.
+
+    Returns:
+        yearly_loss (iterations, years): total loss per path and year
+        role_year_mean (years, roles): mean loss per role and year
+        headcount_mean (years, roles): mean headcount per role and year
+        schedule (years,): mitigation weight applied each year
+    """
+    rng = np.random.default_rng(seed)
+    schedule = mitigation_schedule(mitigation_weight, years, ramp_years)
+    vulnerability = BASE_VULNERABILITY * (1 - schedule)
+    attrition = np.array([ATTRITION_RATE[r] for r in ROLES])
+    start_headcount = np.array([ROLE_HEADCOUNT[r] for r in ROLES])
+    poa = load_role_poa().values
+
+    yearly_loss = np.empty((n_iterations, years))
+    role_year_sum = np.zeros((years, len(ROLES)))
+    headcount_sum = np.zeros((years, len(ROLES)))
+
+    for start in range(0, n_iterations, chunk_size):
+        n = min(chunk_size, n_iterations - start)
+        headcount = np.broadcast_to(start_headcount, (n, len(ROLES))).copy()
+        for t in range(years):
+            headcount_sum[t] += headcount.sum(axis=0)
+            _, losses = simulate_compound_losses((n, len(ROLES)), poa, rng, headcount=headcount,
+                                                 vulnerability=vulnerability[t])
+            yearly_loss[start:start + n, t] = losses.sum(axis=1)
+            role_year_sum[t] += losses.sum(axis=0)
+
+            leavers = rng.binomial(headcount, attrition)
+            headcount = headcount - leavers + rng.binomial(leavers, rehire_rate)
+
+    discount = (1 + discount_rate) ** -np.arange(1, years + 1)
+    return {
+        "yearly_loss": yearly_loss,
+        "cumulative_loss": yearly_loss.sum(axis=1),
+        "cumulative_pv": yearly_loss @ discount,
+        "role_year_mean": role_year_sum / n_iterations,
+        "headcount_mean": headcount_sum / n_iterations,
+        "schedule": schedule,
+        "discount": discount,
+    }
+
+
+def summarize(paths, discount_rate=DISCOUNT_RATE):
+    yearly = paths["yearly_loss"]
+    p5, p50, p95 = np.percentile(yearly, [5, 50, 95], axis=0)
+
+    def distribution(x):
+        q = np.percentile(x, [5, 50, 95, 99])
+        return {"mean": float(x.mean()), "p5": float(q[0]), "median": float(q[1]),
+                "p95": float(q[2]), "p99": float(q[3]), "max": float(x.max())}
+
+    return {
+        "years": yearly.shape[1],
+        "iterations": yearly.shape[0],
+        "discount_rate": discount_rate,
+        "eal_by_year": [
+            {
+                "year": t + 1,
+                "mitigation_weight": float(paths["schedule"][t]),
+                "mean_eal": float(yearly[:, t].mean()),
+                "discounted_mean_eal": float(yearly[:, t].mean() * paths["discount"][t]),
+                "p5": float(p5[t]),
+                "median": float(p50[t]),
+                "p95": float(p95[t]),
+                "loss_by_role": {r: float(paths["role_year_mean"][t, i]) for i, r in enumerate(ROLES)},
+                "headcount_by_role": {r: float(paths["headcount_mean"][t, i]) for i, r in enumerate(ROLES)},
+            }
+            for t in range(yearly.shape[1])
+        ],
+        "cumulative_loss": distribution(paths["cumulative_loss"]),
+        "cumulative_present_value": distribution(paths["cumulative_pv"]),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-year insider loss paths")
+    parser.add_argument("--years", type=int, default=YEARS)
+    parser.add_argument("--iterations", type=int, default=N_ITER)
+    parser.add_argument("--mitigation-weight", type=float, default=0.0)
+    parser.add_argument("--ramp-years", type=int, default=1, help="years for controls to reach full effect")
+    parser.add_argument("--discount-rate", type=float, default=DISCOUNT_RATE)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--seed", type=int, default=MULTI_YEAR_SEED)
+    args = parser.parse_args()
+
+    paths = simulate_paths(args.years, args.iterations, args.mitigation_weight, args.ramp_years,
+                           args.discount_rate, seed=args.seed, chunk_size=args.chunk_size)
+    report = summarize(paths, args.discount_rate)
+
+    json_path = OUTPUT_DIR_MONTE / "multi_year_results.json"
+    with open(json_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for year in report["eal_by_year"]:
+        print(f"Year {year['year']:>2}: mitigation {year['mitigation_weight']*100:4.0f}%  "
+              f"EAL ${year['mean_eal']:>14,.0f}  P95 ${year['p95']:>14,.0f}")
+    c = report["cumulative_present_value"]
+    print(f"Cumulative PV: mean ${c['mean']:,.0f}, P95 ${c['p95']:,.0f}, P99 ${c['p99']:,.0f}")
+    print(f"Saved to {json_path}")
@@ -0,0 +1,172 @@
+"""
+Numba-compiled compound frequency-severity sampler.
+
+The per-iteration chain of run_monte_carlo_simulation is ragged: a binomial
+number of insiders, a Poisson number of attempts, a binomial number of
+successful attacks and then one lognormal loss per attack. The NumPy engine
+(simulate_compound_losses) flattens that with np.repeat and bincount, which
+allocates one temporary per step and per attack. This kernel walks the same
+steps per (iteration, role) cell in compiled code instead and keeps only the
+running loss sum, so the only arrays are the two outputs:
+  1. insiders  ~ Binomial(headcount, poa)
+  2. attempts  ~ Poisson(attempts_mean * insiders)
+  3. incidents ~ Binomial(attempts, vulnerability)
+  4. sum of `incidents` clipped lognormal losses
+
+Iterations are split into blocks of KERNEL_BLOCK that run in parallel
+(numba.prange). Each block seeds Numba's per-thread generator from its own
+seed, drawn from the caller's rng, so results depend on the seed only and not
+on the number of threads. Draws differ from the NumPy engine (different
+generator), the distributions are the same: parity_check compares them.
+
+Numba is optional. Without it, simulate_compound_losses_jit falls back to the
+NumPy engine with the same arguments.
+
+Usage:
+    python3 numba_engine.py --check
+    python3 numba_engine.py --benchmark --iterations 1000000
+"""
+import argparse
+import time
+import numpy as np
+
+from monte_carlo import (ATTEMPTS_MEAN, BASE_VULNERABILITY, N_ITER, ROLE_HEADCOUNT, ROLES, SEED, load_role_poa,
+                         role_loss_bounds, run_monte_carlo_simulation, run_vectorized_simulation,
+                         simulate_compound_losses)
+
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+KERNEL_BLOCK = 1024         # iterations per parallel block (and per seed)
+PARITY_ITERATIONS = 20_000  # the loop engine runs at ~10k iterations/s
+PARITY_MIN_P = 0.001        # KS p-value below which the engines are reported as different
+PARITY_MAX_Z = 4.0          # |difference of means| in standard errors
+
+
+if HAVE_NUMBA:
+    @njit(parallel=True, cache=True)
+    def _compound_kernel(poa, headcount, attempts_mean, vulnerability, log_mean, log_std, lo, hi,
+                         block_seeds, incidents, losses):
+        n, n_roles = losses.shape
+        for b in prange(len(block_seeds)):
+            np.random.seed(block_seeds[b])        # seeds this thread's generator only
+            for i in range(b * KERNEL_BLOCK, min((b + 1) * KERNEL_BLOCK, n)):
+                for r in range(n_roles):
+                    insiders = np.random.binomial(headcount[r], poa[i, r])
+                    attempts = np.random.poisson(attempts_mean * insiders) if insiders > 0 else 0
+                    k = np.random.binomial(attempts, vulnerability) if attempts > 0 else 0
+                    total = 0.0
+                    for _ in range(k):
+                        total += min(max(np.random.lognormal(log_mean[r], log_std[r]), lo[r]), hi[r])
+                    incidents[i, r] = k
+                    losses[i, r] = total
+
+
+def simulate_compound_losses_jit(n_iterations, poa, rng, headcount=None, attempts_mean=ATTEMPTS_MEAN,
+                                 vulnerability=BASE_VULNERABILITY, min_loss=None, max_loss=None):
+    """
+    Drop-in for simulate_compound_losses((n_iterations, roles), ...) on the
+    Numba kernel. Returns (incidents, losses), both (n_iterations, roles).
+
+    Args:
+        poa: (roles,) or (n_iterations, roles), e.g. with dependence multipliers applied
+        rng: np.random.Generator; only the per-block seeds are drawn from it
+        headcount, min_loss, max_loss: (roles,) arrays, defaults as in monte_carlo
+        attempts_mean, vulnerability: scalars
+    """
+    if headcount is None:
+        headcount = np.array([ROLE_HEADCOUNT[r] for r in ROLES])
+    if min_loss is None or max_loss is None:
+        min_loss, max_loss = role_loss_bounds()
+    headcount = np.asarray(headcount, dtype=np.int64)
+    size = (n_iterations, len(headcount))
+    if not HAVE_NUMBA:
+        return simulate_compound_losses(size, poa, rng, headcount, attempts_mean, vulnerability, min_loss, max_loss)
+
+    lo, hi = np.asarray(min_loss, dtype=np.float64), np.asarray(max_loss, dtype=np.float64)
+    # Same lognormal parameterisation as run_monte_carlo_simulation
+    log_mean = (np.log(lo) + np.log(hi)) / 2
+    log_std = (np.log(hi) - np.log(lo)) / 4
+    block_seeds = rng.integers(0, 2**32, size=-(-n_iterations // KERNEL_BLOCK), dtype=np.uint32)
+
+    incidents = np.empty(size, dtype=np.int64)
+    losses = np.empty(size, dtype=np.float64)
+    _compound_kernel(np.broadcast_to(np.asarray(poa, dtype=np.float64), size), headcount, float(attempts_mean),
+                     float(vulnerability), log_mean, log_std, lo, hi, block_seeds, incidents, losses)
+    return incidents, losses
+
+
+def parity_check(n_iterations=PARITY_ITERATIONS, mitigation_weight=0.0, seed=SEED):
+    """
+    Compare the Numba engine with the loop engine (run_monte_carlo_simulation).
+
+    Per role: mean incidents and mean loss of both engines with the difference
+    in standard errors (z), and the two-sample KS p-value of the annual losses;
+    the last row is the company total. Returns (table DataFrame, passed) where
+    passed means every |z| <= PARITY_MAX_Z and every p >= PARITY_MIN_P.
+    """
+    import pandas as pd
+    from scipy.stats import ks_2samp
+
+    loop = run_monte_carlo_simulation(mitigation_weight, n_iterations, seed)
+    jit = run_vectorized_simulation(mitigation_weight, n_iterations, seed=seed, engine="numba")
+
+    def z(a, b):
+        a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+        se = np.sqrt(a.var() / len(a) + b.var() / len(b))
+        return (b.mean() - a.mean()) / se if se > 0 else 0.0
+
+    rows = []
+    for role in ROLES + ["Total"]:
+        a = loop['total_loss'] if role == "Total" else loop['by_role'][role]
+        b = jit['total_loss'] if role == "Total" else jit['by_role'][role]
+        row = {"role": role, "loop_mean_loss": np.mean(a), "numba_mean_loss": np.mean(b), "loss_z": z(a, b),
+               "ks_p": ks_2samp(a, b).pvalue if np.any(a) or np.any(b) else 1.0}
+        if role != "Total":
+            ia, ib = loop['incidents_by_role'][role], jit['incidents_by_role'][role]
+            row.update({"loop_incidents": np.mean(ia), "numba_incidents": np.mean(ib), "incident_z": z(ia, ib)})
+        rows.append(row)
+    table = pd.DataFrame(rows).set_index("role")
+    passed = bool((table[["loss_z", "incident_z"]].abs().fillna(0) <= PARITY_MAX_Z).all().all()
+                  and (table["ks_p"] >= PARITY_MIN_P).all())
+    return table, passed
+
+
+def benchmark(n_iterations, seed=SEED):
+    """(NumPy engine seconds, Numba engine seconds) for one independent run; compilation excluded."""
+    poa = load_role_poa().values
+    min_loss, max_loss = role_loss_bounds()
+    simulate_compound_losses_jit(KERNEL_BLOCK, poa, np.random.default_rng(seed), min_loss=min_loss, max_loss=max_loss)
+    t0 = time.perf_counter()
+    simulate_compound_losses((n_iterations, len(ROLES)), poa, np.random.default_rng(seed),
+                             min_loss=min_loss, max_loss=max_loss)
+    t1 = time.perf_counter()
+    simulate_compound_losses_jit(n_iterations, poa, np.random.default_rng(seed), min_loss=min_loss, max_loss=max_loss)
+    return t1 - t0, time.perf_counter() - t1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check or time the Numba compound-loss sampler")
+    parser.add_argument("--check", action="store_true", help="compare its distributions with the loop engine")
+    parser.add_argument("--benchmark", action="store_true", help="time it against the NumPy engine")
+    parser.add_argument("--iterations", type=int, default=None)
+    parser.add_argument("--mitigation-weight", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if not HAVE_NUMBA:
+        print("Numba is not installed (pip install numba); engine='numba' falls back to NumPy")
+    if args.benchmark:
+        n = args.iterations or 100 * N_ITER
+        numpy_s, numba_s = benchmark(n)
+        print(f"{n:,} iterations: NumPy {numpy_s:.2f}s, Numba {numba_s:.2f}s ({numpy_s / numba_s:.1f}x)")
+    if args.check or not args.benchmark:
+        import pandas as pd
+
+        pd.set_option("display.width", 200)
+        table, passed = parity_check(args.iterations or PARITY_ITERATIONS, args.mitigation_weight)
+        print(table.to_string(float_format=lambda x: f"{x:,.3f}"))
+        print("Parity check passed" if passed else "Parity check FAILED")
+        raise SystemExit(0 if passed else 1)
@@ -0,0 +1,264 @@
+"""
+Peer-group outlier detection over per-user behaviour profiles.
+
+The opportunity score and the ingest z-spikes compare a user with the fixed
+role constants in generator.py. This stage compares each user with their
+actual peers instead:
+  1. Profile: for every user, the mean and the 95th percentile of each of
+     the nine daily features over a day window, computed in one vectorized
+     pass over the feature cache (np.partition per user block, no sorting
+     of whole series).
+  2. Peer group: role x region. Users of a cell with fewer than MIN_PEERS
+     users (e.g. C_Level in one region) are compared with every user of
+     their role instead.
+  3. Outlier score, one of two methods:
+       robust  per group median and MAD of every profile column; the score is
+               the RMS of the positive robust z-scores (only being *above*
+               peers is a risk signal), capped at Z_CAP
+       knn     mean distance to the k nearest peers in the group after robust
+               scaling (scikit-learn NearestNeighbors, tree based)
+     Both are linear in the number of users apart from the kNN tree
+     queries (n log n), so 200k users take seconds.
+
+Usage:
+    python3 peer_analytics.py --top 50
+    python3 peer_analytics.py --method knn --neighbors 10
+    python3 peer_analytics.py --benchmark --users 200000
+"""
+import argparse
+import time
+from pathlib import Path
+import numpy as np
+
+from generator import FEATURES
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+OUTPUT_DIR = BASE_DIR / "Outputs"
+OUTPUT_DIR_PEERS = OUTPUT_DIR / "peer_analytics"
+OUTLIERS_CSV = OUTPUT_DIR_PEERS / "peer_outliers.csv"
+
+PROFILE_STATS = ["mean", "p95"]
+PROFILE_COLUMNS = [f"{f}_{s}" for s in PROFILE_STATS for f in FEATURES]
+PROFILE_QUANTILE = 0.95
+MIN_PEERS = 10
+MAD_SCALE = 1.4826       # MAD -> std for normal data
+MIN_SCALE = 1.0          # one count: integer profiles often have a MAD of 0
+Z_CAP = 10.0
+KNN_NEIGHBORS = 10
+TOP_OUTLIERS = 50
+USERS_PER_BLOCK = 5000
+
+
+def profile_block(block, quantile=PROFILE_QUANTILE):
+    """
+    (users, 2 * features) profile of a (users, days, features) block:
+    per-feature mean, then the per-feature `quantile` (an order statistic).
+    """
+    block = np.asarray(block)
+    k = min(int(np.ceil(quantile * block.shape[1])) - 1, block.shape[1] - 1)
+    upper = np.partition(block, k, axis=1)[:, k, :]
+    return np.hstack([block.mean(axis=1), upper]).astype(np.float64)
+
+
+def build_profiles(matrix, days=slice(None), users_per_block=USERS_PER_BLOCK):
+    """
+    Profiles for every user of a (users, days, >= 9) array or memmap.
+
+    Args:
+        days: day window, e.g. slice(-90, None) for the last 90 days
+    """
+    n_users = matrix.shape[0]
+    profiles = np.empty((n_users, len(PROFILE_COLUMNS)))
+    for start in range(0, n_users, users_per_block):
+        block = matrix[start:start + users_per_block, days, :len(FEATURES)]
+        profiles[start:start + len(block)] = profile_block(block)
+    return profiles
+
+
+def peer_groups(role_codes, region_codes, n_roles, n_regions, min_peers=MIN_PEERS):
+    """
+    Peer group id per user: role * n_regions + region, or a role-wide id
+    (n_roles * n_regions + role, after all role x region ids) when the user's
+    role x region group has fewer than min_peers members. See peer_reference
+    for who a role-wide user is compared with.
+    """
+    role_codes = np.asarray(role_codes, dtype=np.int64)
+    group = role_codes * n_regions + np.asarray(region_codes, dtype=np.int64)
+    size = np.bincount(group)
+    small = size[group] < min_peers
+    return np.where(small, n_roles * n_regions + role_codes, group)
+
+
+def peer_reference(groups, role_codes, n_cells):
+    """
+    {group id: indices of the users its statistics come from}. A role x
+    region group is compared with its own members, a role-wide group
+    (id >= n_cells) with every user of the role, whatever their region.
+    """
+    role_codes = np.asarray(role_codes)
+    order, slices = _group_slices(groups)
+    return {g: np.flatnonzero(role_codes == g - n_cells) if g >= n_cells else order[sl] for g, sl in slices}
+
+
+def _group_slices(groups):
+    """(order, [(group id, slice into order)]) with users sorted by group."""
+    order = np.argsort(groups, kind="stable")
+    ids, starts, counts = np.unique(groups[order], return_index=True, return_counts=True)
+    return order, [(g, slice(s, s + c)) for g, s, c in zip(ids, starts, counts)]
+
+
+def robust_scale(profiles, groups, reference=None):
+    """
+    Per-user robust z-scores (x - peer median) / (1.4826 * peer MAD), column by
+    column, with the peers of each group from `reference` (peer_reference;
+    default: the group's own members).
+    """
+    order, slices = _group_slices(groups)
+    z = np.empty_like(profiles)
+    for g, sl in slices:
+        members = order[sl]
+        peers = profiles[reference[g] if reference is not None else members]
+        median = np.median(peers, axis=0)
+        mad = np.median(np.abs(peers - median), axis=0)
+        z[members] = (profiles[members] - median) / np.maximum(MAD_SCALE * mad, MIN_SCALE)
+    return z
+
+
+def robust_scores(profiles, groups, reference=None):
+    """(scores, robust z) with score = RMS of the positive z-scores, capped at Z_CAP."""
+    z = robust_scale(profiles, groups, reference)
+    positive = np.clip(z, 0.0, Z_CAP)
+    return np.sqrt((positive ** 2).mean(axis=1)), z
+
+
+def knn_scores(profiles, groups, n_neighbors=KNN_NEIGHBORS, reference=None):
+    """(scores, robust z) with score = mean distance to the n_neighbors nearest peers."""
+    from sklearn.neighbors import NearestNeighbors
+
+    z = np.clip(robust_scale(profiles, groups, reference), -Z_CAP, Z_CAP)
+    order, slices = _group_slices(groups)
+    scores = np.zeros(len(profiles))
+    for g, sl in slices:
+        members = order[sl]
+        peers = reference[g] if reference is not None else members
+        k = min(n_neighbors + 1, len(peers))
+        if k < 2:
+            continue
+        # Every scored user is among their peers, their own nearest neighbour at distance 0; drop that column
+        distances, _ = NearestNeighbors(n_neighbors=k).fit(z[peers]).kneighbors(z[members])
+        scores[members] = distances[:, 1:].mean(axis=1) / np.sqrt(z.shape[1])
+    return scores, z
+
+
+def peer_outliers(cache, method="robust", days=slice(None), n_neighbors=KNN_NEIGHBORS, top=TOP_OUTLIERS):
+    """
+    Top peer-group outliers of a feature_cache.FeatureCache as a DataFrame:
+    user, role, region, peer group size, score, the profile column that
+    deviates most and its value next to the peer median.
+    """
+    import pandas as pd
+
+    profiles = build_profiles(cache.matrix, days)
+    role_codes = np.asarray(cache.users["role"], dtype=np.int64)
+    region_codes = np.asarray(cache.users["region"], dtype=np.int64)
+    n_cells = len(cache.roles) * len(cache.regions)
+    groups = peer_groups(role_codes, region_codes, len(cache.roles), len(cache.regions))
+    reference = peer_reference(groups, role_codes, n_cells)
+    if method == "knn":
+        scores, z = knn_scores(profiles, groups, n_neighbors, reference)
+    else:
+        scores, z = robust_scores(profiles, groups, reference)
+
+    top_users = np.argsort(scores)[::-1][:top]
+    driver = z[top_users].argmax(axis=1)
+    # Peer count and median of the peers each user was actually scored against
+    group_size = np.array([len(reference[g]) for g in groups[top_users]])
+    medians = np.array([np.median(profiles[reference[g]], axis=0) for g in groups[top_users]])
+
+    return pd.DataFrame({
+        "user_id": cache.users["user_id"][top_users],
+        "role": np.array(cache.roles)[role_codes[top_users]],
+        "region": np.array(cache.regions)[region_codes[top_users]],
+        "peer_group": np.where(groups[top_users] >= n_cells, "role", "role x region"),
+        "peers": group_size,
+        "score": scores[top_users],
+        "top_deviation": np.array(PROFILE_COLUMNS)[driver],
+        "robust_z": z[top_users, driver],
+        "value": profiles[top_users, driver],
+        "peer_median": medians[np.arange(len(top_users)), driver],
+    })
+
+
+def user_profile(cache, user_id, days=slice(None)):
+    """One user's profile next to their peer-group median, indexed by profile column."""
+    import pandas as pd
+
+    row = int(np.flatnonzero(cache.users["user_id"] == user_id)[0])
+    role_codes = np.asarray(cache.users["role"], dtype=np.int64)
+    groups = peer_groups(role_codes, cache.users["region"], len(cache.roles), len(cache.regions))
+    peers = peer_reference(groups, role_codes, len(cache.roles) * len(cache.regions))[groups[row]]
+    profiles = build_profiles(cache.matrix[peers], days)
+    return pd.DataFrame({
+        "user": profiles[np.flatnonzero(peers == row)[0]],
+        "peer_median": np.median(profiles, axis=0),
+    }, index=PROFILE_COLUMNS)
+
+
+def benchmark(n_users, n_days=240, method="robust", n_roles=6, n_regions=3, seed=80):
+    """(profile seconds, scoring seconds) for synthetic Poisson activity of n_users users."""
+    from generator import ROLE_TABLE
+
+    rng = np.random.default_rng(seed)
+    roles = rng.integers(0, n_roles, size=n_users)
+    regions = rng.integers(0, n_regions, size=n_users)
+    profiles = np.empty((n_users, len(PROFILE_COLUMNS)))
+    profile_s = 0.0
+    for start in range(0, n_users, USERS_PER_BLOCK):
+        r = roles[start:start + USERS_PER_BLOCK]
+        block = rng.poisson(np.maximum(ROLE_TABLE.mu[r % len(ROLE_TABLE.roles)], 0.01)[:, None, :],
+                            size=(len(r), n_days, len(FEATURES))).astype(np.uint16)
+        t0 = time.perf_counter()
+        profiles[start:start + len(r)] = profile_block(block)
+        profile_s += time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    groups = peer_groups(roles, regions, n_roles, n_regions)
+    reference = peer_reference(groups, roles, n_roles * n_regions)
+    if method == "knn":
+        knn_scores(profiles, groups, reference=reference)
+    else:
+        robust_scores(profiles, groups, reference)
+    return profile_s, time.perf_counter() - t0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank users by how far their behaviour profile is from their peers")
+    parser.add_argument("--method", choices=["robust", "knn"], default="robust")
+    parser.add_argument("--neighbors", type=int, default=KNN_NEIGHBORS)
+    parser.add_argument("--window-days", type=int, default=None, help="profile the last N days only")
+    parser.add_argument("--top", type=int, default=TOP_OUTLIERS)
+    parser.add_argument("--benchmark", action="store_true", help="time synthetic users instead")
+    parser.add_argument("--users", type=int, default=200_000)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        profile_s, score_s = benchmark(args.users, method=args.method)
+        print(f"{args.users:,} users: profiles {profile_s:.1f}s, {args.method} scores {score_s:.1f}s")
+        raise SystemExit(0)
+
+    from feature_cache import open_feature_cache
+
+    cache = open_feature_cache()
+    if cache is None:
+        raise SystemExit("Feature cache missing or stale, run generator.py (or feature_cache.py) first")
+
+    days = slice(-args.window_days, None) if args.window_days else slice(None)
+    start = time.perf_counter()
+    outliers = peer_outliers(cache, args.method, days, args.neighbors, args.top)
+    elapsed = time.perf_counter() - start
+
+    OUTPUT_DIR_PEERS.mkdir(parents=True, exist_ok=True)
+    outliers.to_csv(OUTLIERS_CSV, index=False)
+    print(f"Scored {cache.n_users:,} users against their peers in {elapsed:.2f}s ({args.method})")
+    print(outliers.head(10).to_string(index=False))
+    print(f"Saved top {len(outliers)} to {OUTLIERS_CSV}")
@@ -0,0 +1,121 @@
+"""
+Nested uncertainty on role_poa.
+
+role_poa is a point estimate from one synthetic year; with 9 C-Level users and
+no incidents it is exactly 0, so that role never contributes loss. This stage
+draws plausible PoA values per role and runs the Monte Carlo once per draw:
+
+  - bootstrap: resample users with replacement within each role. Resampling n
+    binary had_incident flags with k ones and counting the ones is exactly
+    Binomial(n, k / n), so every replicate for every role comes from one
+    rng.binomial call instead of materialising n resampled users.
+    (Roles with k = 0 stay at 0, as a plain bootstrap must.)
+  - beta: Beta(k + a, n - k + b) posterior on the incident rate, Jeffreys prior
+    a = b = 0.5 by default. Gives zero-incident roles a small non-zero rate.
+
+The outer (PoA) draws are simulated in chunks of shape (draws, iterations,
+roles) with simulate_compound_losses. The report gives credible intervals on
+mean EAL, P95 and per-role EAL across draws.
+
+Usage:
+    python3 poa_uncertainty.py --method beta --draws 1000 --iterations 2000
+"""
+import argparse
+import json
+import numpy as np
+
+from monte_carlo import (BASE_VULNERABILITY, OUTPUT_DIR_MONTE, ROLE_HEADCOUNT, ROLES,
+                         load_user_had_incident, simulate_compound_losses)
+
+DRAWS = 1000
+INNER_ITERATIONS = 2000
+DRAWS_PER_CHUNK = 50
+UNCERTAINTY_SEED = 80
+CREDIBLE_LEVELS = [2.5, 50, 97.5]
+
+
+def incident_counts():
+    """(k, n) arrays per role: users with >= 1 incident and users observed."""
+    counts = load_user_had_incident().groupby('role')['had_incident'].agg(['sum', 'count']).reindex(ROLES)
+    counts = counts.fillna(0).astype(int)
+    return counts['sum'].to_numpy(), counts['count'].to_numpy()
+
+
+def sample_poa(n_draws, rng, method="bootstrap", prior=(0.5, 0.5)):
+    """(n_draws, roles) PoA replicates."""
+    k, n = incident_counts()
+    if method == "bootstrap":
+        p_hat = np.divide(k, n, out=np.zeros(len(k)), where=n > 0)
+        return rng.binomial(n, p_hat, size=(n_draws, len(k))) / np.maximum(n, 1)
+    if method == "beta":
+        a, b = prior
+        return rng.beta(k + a, n - k + b, size=(n_draws, len(k)))
+    raise ValueError(f"Unknown method: {method}")
+
+
+def run_poa_uncertainty(n_draws=DRAWS, n_iterations=INNER_ITERATIONS, method="bootstrap",
+                        mitigation_weight=0.0, seed=UNCERTAINTY_SEED, chunk=DRAWS_PER_CHUNK):
+    """
+    Returns per-draw summaries: mean_eal (draws,), p95 (draws,), role_eal (draws, roles)
+    and the poa draws themselves.
+    """
+    rng = np.random.default_rng(seed)
+    poa = sample_poa(n_draws, rng, method)
+    headcount = np.array([ROLE_HEADCOUNT[r] for r in ROLES])
+    vulnerability = BASE_VULNERABILITY * (1 - mitigation_weight)
+
+    mean_eal = np.empty(n_draws)
+    p95 = np.empty(n_draws)
+    role_eal = np.empty((n_draws, len(ROLES)))
+    for start in range(0, n_draws, chunk):
+        block = poa[start:start + chunk]
+        _, losses = simulate_compound_losses((len(block), n_iterations, len(ROLES)), block[:, None, :], rng,
+                                             headcount=headcount, vulnerability=vulnerability)
+        total = losses.sum(axis=2)
+        mean_eal[start:start + len(block)] = total.mean(axis=1)
+        p95[start:start + len(block)] = np.percentile(total, 95, axis=1)
+        role_eal[start:start + len(block)] = losses.mean(axis=1)
+
+    return {"poa": poa, "mean_eal": mean_eal, "p95": p95, "role_eal": role_eal}
+
+
+def summarize(draws, method, mitigation_weight, n_iterations):
+    def interval(x):
+        lo, mid, hi = np.percentile(x, CREDIBLE_LEVELS)
+        return {"mean": float(np.mean(x)), "lower": float(lo), "median": float(mid), "upper": float(hi)}
+
+    return {
+        "method": method,
+        "mitigation_weight": mitigation_weight,
+        "draws": int(len(draws["mean_eal"])),
+        "iterations_per_draw": n_iterations,
+        "credible_level": CREDIBLE_LEVELS[2] - CREDIBLE_LEVELS[0],
+        "mean_eal": interval(draws["mean_eal"]),
+        "p95": interval(draws["p95"]),
+        "loss_by_role": {role: interval(draws["role_eal"][:, i]) for i, role in enumerate(ROLES)},
+        "poa_by_role": {role: interval(draws["poa"][:, i]) for i, role in enumerate(ROLES)},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Propagate role_poa uncertainty into the EAL")
+    parser.add_argument("--method", choices=["bootstrap", "beta"], default="bootstrap")
+    parser.add_argument("--draws", type=int, default=DRAWS)
+    parser.add_argument("--iterations", type=int, default=INNER_ITERATIONS)
+    parser.add_argument("--mitigation-weight", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=UNCERTAINTY_SEED)
+    args = parser.parse_args()
+
+    draws = run_poa_uncertainty(args.draws, args.iterations, args.method, args.mitigation_weight, args.seed)
+    report = summarize(draws, args.method, args.mitigation_weight, args.iterations)
+
+    json_path = OUTPUT_DIR_MONTE / f"poa_uncertainty_{args.method}.json"
+    with open(json_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    m = report["mean_eal"]
+    print(f"Mean EAL ({args.method}, {report['credible_level']:.0f}% interval): "
+          f"${m['median']:,.0f} [${m['lower']:,.0f} - ${m['upper']:,.0f}]")
+    for role, r in report["loss_by_role"].items():
+        print(f"  {role:<15} ${r['median']:>14,.0f} [${r['lower']:,.0f} - ${r['upper']:,.0f}]")
+    print(f"Saved to {json_path}")
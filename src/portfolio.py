@@ -0,0 +1,175 @@
+"""
+Control-portfolio search.
+
+Evaluates every subset of the controls in insider_threat_solutions_weights.csv
+and returns the cost vs. EAL Pareto frontier, the best set for a budget and
+the cheapest set reaching a target EAL.
+
+Running generate_monte_carlo_results (two full simulations) for each of the
+2^9 = 512 subsets would take minutes. Instead CommonRandomDraws samples the
+attacks once at the unmitigated vulnerability and tags each successful attack
+with a uniform draw u. Under mitigation weight w an attack still succeeds if
+u < (1 - w), which thins Binomial(attempts, V) to exactly
+Binomial(attempts, V * (1 - w)). Every candidate is therefore scored on the
+same draws (no simulation noise between candidates), and with the attacks
+sorted by u, the EAL for any w is a single searchsorted into a cumulative sum.
+"""
+import csv
+import re
+from pathlib import Path
+import numpy as np
+
+from monte_carlo import N_ITER, ROLES, load_role_poa, simulate_compound_losses
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SOLUTIONS_CSV = BASE_DIR / "Docs/insider_threat_solutions_weights.csv"
+
+PORTFOLIO_SEED = 80
+
+
+def load_software_solutions(csv_path=SOLUTIONS_CSV):
+    software_solutions = {}
+    with open(csv_path, newline="") as file:
+        reader = csv.reader(file)
+        next(reader) # Skip header row
+        for row in reader:
+            name = row[1].strip()
+            weight = float(row[2]) / 100.0
+            cost = int(row[3])
+            key = re.sub(r"[^a-z0-9]", "", name.lower())
+            software_solutions[name] = {
+                "key": key,
+                "cost": cost,
+                "weight": weight
+            }
+
+    return software_solutions
+
+
+class CommonRandomDraws:
+    """
+    One shared pool of successful attacks at the unmitigated vulnerability,
+    reused to evaluate any mitigation weight.
+    """
+
+    def __init__(self, n_iterations=N_ITER, seed=PORTFOLIO_SEED, poa=None):
+        rng = np.random.default_rng(seed)
+        poa = load_role_poa().values if poa is None else poa
+        _, _, cell, losses = simulate_compound_losses((n_iterations, len(ROLES)), poa, rng,
+                                                      return_attacks=True)
+        self.n_iterations = n_iterations
+        self.iteration = cell // len(ROLES)
+        self.role = cell % len(ROLES)
+        self.loss = losses
+        self.u = rng.random(len(losses))
+
+        order = np.argsort(self.u)
+        self._u_sorted = self.u[order]
+        self._cum_loss = np.r_[0.0, np.cumsum(self.loss[order])]
+
+    def eal(self, mitigation_weight):
+        """Mean annual loss for one weight or an array of weights."""
+        keep = np.searchsorted(self._u_sorted, 1.0 - np.asarray(mitigation_weight), side="left")
+        return self._cum_loss[keep] / self.n_iterations
+
+    def annual_losses(self, mitigation_weight):
+        """Per-iteration total loss for one weight (for percentiles of a chosen set)."""
+        survived = self.u < 1.0 - mitigation_weight
+        return np.bincount(self.iteration[survived], weights=self.loss[survived],
+                           minlength=self.n_iterations)
+
+
+def enumerate_portfolios(solutions):
+    """
+    All 2^n control subsets as a boolean matrix plus their cost and
+    combined mitigation weight (additive, as in calculate_weights_and_costs).
+    """
+    names = list(solutions)
+    n = len(names)
+    masks = ((np.arange(2 ** n)[:, None] >> np.arange(n)) & 1).astype(bool)
+    costs = masks @ np.array([solutions[k]["cost"] for k in names], dtype=float)
+    weights = masks @ np.array([solutions[k]["weight"] for k in names])
+    return names, masks, costs, weights
+
+
+def pareto_frontier(costs, eals):
+    """Indices of subsets no other subset beats on both cost and EAL, cheapest first."""
+    order = np.lexsort((eals, costs))
+    frontier, best = [], np.inf
+    for i in order:
+        if eals[i] < best - 1e-9:
+            frontier.append(i)
+            best = eals[i]
+    return np.array(frontier, dtype=int)
+
+
+def optimize_portfolio(solutions=None, draws=None, budget=None, target_eal=None):
+    """
+    Score every control subset with common random numbers.
+
+    Returns a dict with all subsets, the Pareto frontier and, when requested,
+    the best set within `budget` and the cheapest set reaching `target_eal`.
+    """
+    solutions = solutions if solutions is not None else load_software_solutions()
+    draws = draws if draws is not None else CommonRandomDraws()
+    names, masks, costs, weights = enumerate_portfolios(solutions)
+    eals = draws.eal(weights)
+    frontier = pareto_frontier(costs, eals)
+
+    def describe(i):
+        annual = draws.annual_losses(weights[i])
+        return {
+            "controls": [names[j] for j in np.flatnonzero(masks[i])],
+            "cost": float(costs[i]),
+            "mitigation_weight": float(weights[i]),
+            "mean_eal": float(eals[i]),
+            "p95": float(np.percentile(annual, 95)),
+        }
+
+    result = {
+        "names": names,
+        "masks": masks,
+        "costs": costs,
+        "weights": weights,
+        "eals": eals,
+        "frontier": [describe(i) for i in frontier],
+        "frontier_index": frontier,
+        "baseline_eal": float(draws.eal(0.0)),
+    }
+    if budget is not None:
+        affordable = frontier[costs[frontier] <= budget]
+        result["best_for_budget"] = describe(affordable[-1]) if len(affordable) else None
+    if target_eal is not None:
+        reaching = frontier[eals[frontier] <= target_eal]
+        result["cheapest_for_target"] = describe(reaching[0]) if len(reaching) else None
+    return result
+
+
+def plot_frontier(result, recommended=None):
+    """Cost vs. EAL scatter of every subset with the Pareto frontier highlighted."""
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(1, 1, figsize=(10, 6))
+    ax.scatter(result["costs"] / 1e6, result["eals"] / 1e6, s=12, alpha=0.35,
+               color="gray", label="All control sets")
+    idx = result["frontier_index"]
+    ax.plot(result["costs"][idx] / 1e6, result["eals"][idx] / 1e6, "-o", color="#1e3a8a",
+            markersize=5, linewidth=2, label="Pareto frontier")
+    if recommended is not None:
+        ax.scatter([recommended["cost"] / 1e6], [recommended["mean_eal"] / 1e6], s=180,
+                   marker="*", color="#DC143C", zorder=5, label="Recommended")
+    ax.set_xlabel("Annual Control Cost ($ Millions)", fontsize=12, fontweight="bold")
+    ax.set_ylabel("Mean Expected Annual Loss ($ Millions)", fontsize=12, fontweight="bold")
+    ax.set_title("Control Portfolio: Cost vs. EAL", fontsize=14, fontweight="bold")
+    ax.grid(True, alpha=0.3, linestyle="--", linewidth=0.5)
+    ax.legend(fontsize=10)
+    plt.tight_layout()
+    return fig
+
+
+if __name__ == "__main__":
+    result = optimize_portfolio(budget=5_000_000)
+    print(f"Baseline EAL: ${result['baseline_eal']:,.0f}")
+    for point in result["frontier"]:
+        print(f"${point['cost']:>12,.0f}  EAL ${point['mean_eal']:>14,.0f}  {', '.join(point['controls'])}")
+    print("Best within $5M:", result["best_for_budget"])
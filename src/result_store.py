@@ -0,0 +1,213 @@
+"""
+Per-iteration Monte Carlo result store.
+
+monte_carlo_results.json only keeps summary statistics. This module writes
+the per-iteration arrays of a run to one .npz file per scenario:
+    losses     (iterations, roles)  float64  loss per role and iteration
+    incidents  (iterations, roles)  int32    successful attacks per role
+    total      (iterations,)        float64  company loss per iteration
+    roles      (roles,)                      column labels
+    meta       JSON string: mitigation_weight, seed, inputs_hash, dependence,
+               iterations, effective_vulnerability, created_at
+
+Files are written uncompressed (np.savez), so every member is stored
+contiguously inside the zip and can be memory-mapped straight from disk:
+opening a scenario reads only the .npy header, and a quantile query pages in
+just the column it touches. Pass compress=True to trade that for a smaller
+file (members are then decompressed into memory on load).
+
+Scenario files are named from their metadata, so re-running the same inputs
+overwrites the same file instead of piling up duplicates.
+
+Usage:
+    python3 result_store.py --list
+    python3 result_store.py --quantiles 0.5 0.95 0.99 --role Trader
+    python3 result_store.py --exceedance 100000000 200000000
+"""
+import argparse
+import json
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+OUTPUT_DIR = BASE_DIR / "Outputs"
+RESULT_STORE_DIR = OUTPUT_DIR / "monte_carlo_results" / "result_store"
+
+
+def scenario_name(mitigation_weight, seed, inputs_hash, dependence=None, iterations=None):
+    """File stem for a scenario, e.g. mw0.600_independent_n10000_s80_1a2b3c4d."""
+    size = f"_n{iterations}" if iterations else ""
+    return f"mw{mitigation_weight:.3f}_{dependence or 'independent'}{size}_s{seed}_{inputs_hash[:8]}"
+
+
+def save_scenario(results, seed, inputs_hash, dependence=None, store_dir=RESULT_STORE_DIR,
+                  name=None, compress=False, extra_meta=None):
+    """
+    Persist the per-iteration arrays of one simulation run.
+
+    Args:
+        results (dict): output of run_monte_carlo_simulation / run_vectorized_simulation
+        seed (int): seed the run was drawn with
+        inputs_hash (str): monte_carlo.inputs_hash() of the model inputs used
+        dependence (str): DEPENDENCE_MODELS key, or None for independent roles
+        extra_meta (dict): additional JSON-serialisable metadata, e.g. scenario overrides
+
+    Returns the path of the written file.
+    """
+    roles = list(results['by_role'])
+    losses = np.column_stack([np.asarray(results['by_role'][r], dtype=np.float64) for r in roles])
+    incidents = np.column_stack([np.asarray(results['incidents_by_role'][r], dtype=np.int32) for r in roles])
+    meta = {
+        'mitigation_weight': float(results['mitigation_weight']),
+        'effective_vulnerability': float(results['effective_vulnerability']),
+        'seed': int(seed),
+        'inputs_hash': inputs_hash,
+        'dependence': dependence or 'independent',
+        'iterations': int(losses.shape[0]),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        **(extra_meta or {}),
+    }
+    name = name or scenario_name(meta['mitigation_weight'], seed, inputs_hash, dependence, meta['iterations'])
+
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    path = store_dir / f"{name}.npz"
+    save = np.savez_compressed if compress else np.savez
+    save(path, losses=losses, incidents=incidents,
+         total=np.asarray(results['total_loss'], dtype=np.float64),
+         roles=np.array(roles), meta=np.array(json.dumps(meta)))
+    return path
+
+
+def _memmap_member(path, member):
+    """Memory-map one .npy member of an uncompressed .npz, or None if it is compressed."""
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo(f"{member}.npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with open(path, "rb") as f:
+        # Local file header: 30 fixed bytes, then the file name and extra field
+        f.seek(info.header_offset + 26)
+        name_len, extra_len = np.frombuffer(f.read(4), dtype="<u2")
+        f.seek(info.header_offset + 30 + int(name_len) + int(extra_len))
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    if dtype.hasobject:
+        return None
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape,
+                     order="F" if fortran_order else "C", offset=offset)
+
+
+class StoredScenario:
+    """One stored run. Array members are memory-mapped when the file allows it."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.name = self.path.stem
+        with np.load(self.path) as data:
+            self.roles = list(data["roles"])
+            self.meta = json.loads(str(data["meta"]))
+        self._arrays = {}
+
+    def _array(self, member):
+        if member not in self._arrays:
+            arr = _memmap_member(self.path, member)
+            if arr is None:
+                with np.load(self.path) as data:
+                    arr = data[member]
+            self._arrays[member] = arr
+        return self._arrays[member]
+
+    @property
+    def losses(self):
+        return self._array("losses")
+
+    @property
+    def incidents(self):
+        return self._array("incidents")
+
+    @property
+    def total(self):
+        return self._array("total")
+
+    def series(self, role=None):
+        """Per-iteration loss for one role, or the company total when role is None."""
+        if role is None:
+            return self.total
+        return self.losses[:, self.roles.index(role)]
+
+    def quantiles(self, qs, role=None):
+        """Loss at each probability in qs (0-1)."""
+        return np.quantile(self.series(role), qs)
+
+    def exceedance(self, thresholds, role=None):
+        """P(annual loss > t) for each threshold t."""
+        x = np.sort(self.series(role))
+        above = len(x) - np.searchsorted(x, np.asarray(thresholds, dtype=float), side="right")
+        return above / len(x)
+
+
+def list_scenarios(store_dir=RESULT_STORE_DIR):
+    """Metadata of every stored scenario as a DataFrame indexed by scenario name."""
+    import pandas as pd
+
+    rows = []
+    for path in sorted(Path(store_dir).glob("*.npz")):
+        scenario = StoredScenario(path)
+        rows.append({"scenario": scenario.name, **scenario.meta})
+    return pd.DataFrame(rows).set_index("scenario") if rows else pd.DataFrame()
+
+
+def load_scenarios(store_dir=RESULT_STORE_DIR, **filters):
+    """
+    Open stored scenarios, optionally filtered on metadata,
+    e.g. load_scenarios(inputs_hash=h, dependence="independent").
+    """
+    scenarios = [StoredScenario(p) for p in sorted(Path(store_dir).glob("*.npz"))]
+    return [s for s in scenarios if all(s.meta.get(k) == v for k, v in filters.items())]
+
+
+def query_quantiles(qs, role=None, scenarios=None, **filters):
+    """Scenario x quantile table of losses, without re-simulating."""
+    import pandas as pd
+
+    scenarios = scenarios if scenarios is not None else load_scenarios(**filters)
+    return pd.DataFrame([s.quantiles(qs, role) for s in scenarios],
+                        index=[s.name for s in scenarios], columns=[f"q{q:g}" for q in qs])
+
+
+def query_exceedance(thresholds, role=None, scenarios=None, **filters):
+    """Scenario x threshold table of exceedance probabilities P(loss > threshold)."""
+    import pandas as pd
+
+    scenarios = scenarios if scenarios is not None else load_scenarios(**filters)
+    return pd.DataFrame([s.exceedance(thresholds, role) for s in scenarios],
+                        index=[s.name for s in scenarios], columns=[f">{t:,.0f}" for t in thresholds])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query stored Monte Carlo runs")
+    parser.add_argument("--list", action="store_true", help="list stored scenarios")
+    parser.add_argument("--quantiles", type=float, nargs="+", help="probabilities in (0, 1)")
+    parser.add_argument("--exceedance", type=float, nargs="+", help="loss thresholds in USD")
+    parser.add_argument("--role", default=None, help="query one role instead of the company total")
+    parser.add_argument("--store", type=Path, default=RESULT_STORE_DIR)
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    pd.set_option("display.width", 200)
+    pd.set_option("display.max_columns", None)
+    if args.list or not (args.quantiles or args.exceedance):
+        print(list_scenarios(args.store))
+    scenarios = load_scenarios(args.store)
+    if args.quantiles:
+        print(query_quantiles(args.quantiles, args.role, scenarios))
+    if args.exceedance:
+        print(query_exceedance(args.exceedance, args.role, scenarios))
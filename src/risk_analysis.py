@@ -1,8 +1,8 @@
+import argparse
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
+from feature_cache import build_feature_cache, open_feature_cache
 
 BASE_DIR = Path(__file__).resolve().parent.parent   # moves from src/ → project root
 OUTPUT_DIR = BASE_DIR / "Outputs"
@@ -26,65 +26,101 @@ ROLE_HEADCOUNT = {
 N_ITER = 10000
 RANDOM_STATE = 42
 
-# Load data
-df = pd.read_csv(OUTPUT_DIR / "Dataset/billybank_activity.csv", keep_default_na=False)
-df['region'] = df['region'].replace({np.nan: "NA"})
-
-# Calculate annual probability = (# users with ≥1 malicious day) / (total users)
-user_had_incident = df.groupby(['user_id', 'role', 'region'])['is_malicious'].agg([
-    ('had_incident', lambda x: int(x.sum() > 0))
-]).reset_index()
-
-# Calculate probability by role
-role_annual = (
-    user_had_incident.groupby('role')['had_incident']
-    .mean()  # Proportion of users who had ≥1 incident
-    .reindex(ROLES)
-)
-
-# Role × Region breakdown
-role_region_annual = (
-    user_had_incident.groupby(['role', 'region'])['had_incident']
-    .mean()
-    .unstack()
-    .reindex(index=ROLES, columns=REGIONS_ORDER, fill_value=0.0)
-)
-
-# Heatmap for risk analysis
-# Build the heatmap using references from
-# https://www.geeksforgeeks.org/python/display-the-pandas-dataframe-in-heatmap-style/ 
-
-plt.figure(figsize=(10, 6))
-sns.heatmap(
-    role_region_annual * 100,
-    annot=True, 
-    fmt=".2f",
-    cmap="YlOrRd",
-    vmin=0,
-    vmax=6,  # Cap at 6% for better visualization
-    cbar_kws={'label': 'Annual Probability (%)'}
-)
-plt.title("Annual Insider Threat Probability by Role × Region", fontsize=14, fontweight='bold')
-plt.ylabel("Role", fontsize=12)
-plt.xlabel("Region", fontsize=12)
-plt.tight_layout()
-plot_path = OUTPUT_DIR_RISK / 'risk_heatmap.jpg'
-plt.savefig(plot_path, dpi=300, bbox_inches='tight', format="jpeg")
-# plt.show()
-
-risk_scores_per_region = role_region_annual * 100  # Convert to percentage
-
-# Convert to make a CSV
-risk_csv = []
-for role in risk_scores_per_region.index:
-    for region in risk_scores_per_region.columns:
-        risk_csv.append({
-            'role': role,
-            'region': region,
-            'annual_probability_percent': risk_scores_per_region.loc[role, region],
-            'headcount': ROLE_HEADCOUNT.get(role, 0)
-        })
-
-risk_df = pd.DataFrame(risk_csv)
-csv_path = OUTPUT_DIR_RISK / 'risk_scores_by_region.csv'
-risk_df.to_csv(csv_path, index=False)
+
+def load_user_had_incident(feature_cache=None):
+    """One row per user with role, region and had_incident (>= 1 malicious day)."""
+    # Load data - from the memory-mapped feature cache when it is up to date
+    if feature_cache is not None:
+        return feature_cache.incident_table()
+
+    df = pd.read_csv(OUTPUT_DIR / "Dataset/billybank_activity.csv", keep_default_na=False)
+    df['region'] = df['region'].replace({np.nan: "NA"})
+
+    # Calculate annual probability = (# users with ≥1 malicious day) / (total users)
+    return df.groupby(['user_id', 'role', 'region'])['is_malicious'].agg([
+        ('had_incident', lambda x: int(x.sum() > 0))
+    ]).reset_index()
+
+
+def annual_probabilities(user_had_incident):
+    """(probability by role, role × region probability table)."""
+    # Calculate probability by role
+    role_annual = (
+        user_had_incident.groupby('role')['had_incident']
+        .mean()  # Proportion of users who had ≥1 incident
+        .reindex(ROLES)
+    )
+
+    # Role × Region breakdown
+    role_region_annual = (
+        user_had_incident.groupby(['role', 'region'])['had_incident']
+        .mean()
+        .unstack()
+        .reindex(index=ROLES, columns=REGIONS_ORDER, fill_value=0.0)
+    )
+    return role_annual, role_region_annual
+
+
+def plot_heatmap(role_region_annual, plot_path=OUTPUT_DIR_RISK / 'risk_heatmap.jpg'):
+    """Role × region probability heatmap, saved as JPEG. Imports matplotlib/seaborn on first use."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # Heatmap for risk analysis
+    # Build the heatmap using references from
+    # https://www.geeksforgeeks.org/python/display-the-pandas-dataframe-in-heatmap-style/ 
+
+    plt.figure(figsize=(10, 6))
+    sns.heatmap(
+        role_region_annual * 100,
+        annot=True, 
+        fmt=".2f",
+        cmap="YlOrRd",
+        vmin=0,
+        vmax=6,  # Cap at 6% for better visualization
+        cbar_kws={'label': 'Annual Probability (%)'}
+    )
+    plt.title("Annual Insider Threat Probability by Role × Region", fontsize=14, fontweight='bold')
+    plt.ylabel("Role", fontsize=12)
+    plt.xlabel("Region", fontsize=12)
+    plt.tight_layout()
+    plt.savefig(plot_path, dpi=300, bbox_inches='tight', format="jpeg")
+    # plt.show()
+
+
+def write_risk_scores(role_region_annual, csv_path=OUTPUT_DIR_RISK / 'risk_scores_by_region.csv'):
+    risk_scores_per_region = role_region_annual * 100  # Convert to percentage
+
+    # Convert to make a CSV
+    risk_csv = []
+    for role in risk_scores_per_region.index:
+        for region in risk_scores_per_region.columns:
+            risk_csv.append({
+                'role': role,
+                'region': region,
+                'annual_probability_percent': risk_scores_per_region.loc[role, region],
+                'headcount': ROLE_HEADCOUNT.get(role, 0)
+            })
+
+    risk_df = pd.DataFrame(risk_csv)
+    risk_df.to_csv(csv_path, index=False)
+    return risk_df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Role and role x region incident probabilities")
+    parser.add_argument("--no-plot", action="store_true", help="skip the heatmap (no matplotlib/seaborn import)")
+    parser.add_argument("--no-cube", action="store_true", help="skip rebuilding the dashboard drill-down cube")
+    args = parser.parse_args()
+
+    feature_cache = open_feature_cache()
+    role_annual, role_region_annual = annual_probabilities(load_user_had_incident(feature_cache))
+    if not args.no_plot:
+        plot_heatmap(role_region_annual)
+    write_risk_scores(role_region_annual)
+
+    if not args.no_cube:
+        # Precompute the role x region x day aggregate cube behind the dashboard drill-down
+        from drilldown import build_cube
+
+        build_cube(feature_cache if feature_cache is not None else build_feature_cache())
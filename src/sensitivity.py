@@ -0,0 +1,214 @@
+"""
+Global sensitivity analysis of the Monte Carlo inputs.
+
+Varies the hand-set model constants together and measures how much of the
+spread in mean EAL, P95 and per-role loss each one explains:
+  - base_vulnerability   BASE_VULNERABILITY
+  - attempts_mean        ATTEMPTS_MEAN
+  - min_loss_scale / max_loss_scale   multipliers on the loss range table
+  - tier_<role>          shift of ROLE_MAPPING by -1/0/+1 loss tiers
+                         (tiers ordered by geometric-mean loss)
+  - poa_<role>           role_poa, between 0 and the 97.5% point of its
+                         Jeffreys Beta posterior
+
+Two designs are available:
+  - morris: elementary effects (mu*, sigma), cheap screening, r * (k + 1) runs
+  - sobol:  Saltelli sampling with the Saltelli/Jansen estimators for first-
+            order (S1) and total (ST) indices, N * (k + 2) runs
+
+Parameter sets are evaluated in blocks through simulate_compound_losses, so
+one numpy call simulates (block, iterations, roles) at once.
+
+Usage:
+    python3 sensitivity.py --method sobol --samples 256 --iterations 2000
+"""
+import argparse
+import json
+import numpy as np
+
+from monte_carlo import (ATTEMPTS_MEAN, BASE_VULNERABILITY, OUTPUT_DIR, ROLE_HEADCOUNT,
+                         ROLE_MAPPING, ROLES, load_loss_dict, load_role_poa, simulate_compound_losses)
+from poa_uncertainty import incident_counts
+
+OUTPUT_DIR_SENSITIVITY = OUTPUT_DIR / "sensitivity"
+
+SA_ITERATIONS = 2000     # Monte Carlo iterations per parameter set
+BLOCK_SIZE = 32          # parameter sets simulated per numpy call
+SA_SEED = 80
+
+
+def loss_tiers():
+    """Loss tiers ordered from smallest to largest geometric-mean loss."""
+    loss_dict = load_loss_dict()
+    return sorted(loss_dict, key=lambda k: np.log(loss_dict[k]['min']) + np.log(loss_dict[k]['max']))
+
+
+def poa_upper_bounds():
+    """97.5% point of the Jeffreys Beta(k + 0.5, n - k + 0.5) posterior per role."""
+    from scipy.stats import beta
+
+    k, n = incident_counts()
+    return {role: float(beta.ppf(0.975, k[i] + 0.5, n[i] - k[i] + 0.5)) for i, role in enumerate(ROLES)}
+
+
+def parameter_space():
+    """List of (name, low, high, baseline) for every varied input."""
+    space = [
+        ("base_vulnerability", 0.5, 0.95, BASE_VULNERABILITY),
+        ("attempts_mean", 1.5, 6.0, ATTEMPTS_MEAN),
+        ("min_loss_scale", 0.5, 2.0, 1.0),
+        ("max_loss_scale", 0.5, 2.0, 1.0),
+    ]
+    space += [(f"tier_{role}", -1.5, 1.5, 0.0) for role in ROLES]
+    upper = poa_upper_bounds()
+    role_poa = load_role_poa()
+    space += [(f"poa_{role}", 0.0, max(upper[role], role_poa[role]), float(role_poa[role])) for role in ROLES]
+    return space
+
+
+def output_names():
+    return ["mean_eal", "p95"] + [f"loss_{role}" for role in ROLES]
+
+
+def _unpack(X, names):
+    """Turn a (P, k) parameter matrix into the arrays simulate_compound_losses expects."""
+    col = {name: X[:, i] for i, name in enumerate(names)}
+    tiers, loss_dict = loss_tiers(), load_loss_dict()
+    base_tier = np.array([tiers.index(ROLE_MAPPING[r]) for r in ROLES])
+    shift = np.column_stack([np.rint(col[f"tier_{r}"]) for r in ROLES]).astype(int)
+    tier = np.clip(base_tier + shift, 0, len(tiers) - 1)
+    tier_min = np.array([loss_dict[t]['min'] for t in tiers], dtype=float)
+    tier_max = np.array([loss_dict[t]['max'] for t in tiers], dtype=float)
+    min_loss = tier_min[tier] * col["min_loss_scale"][:, None]
+    # Keep the range valid when the scales push min above max
+    max_loss = np.maximum(tier_max[tier] * col["max_loss_scale"][:, None], min_loss * 1.01)
+    poa = np.column_stack([col[f"poa_{r}"] for r in ROLES])
+    return {
+        "poa": poa[:, None, :],
+        "attempts_mean": col["attempts_mean"][:, None, None],
+        "vulnerability": col["base_vulnerability"][:, None, None],
+        "min_loss": min_loss[:, None, :],
+        "max_loss": max_loss[:, None, :],
+    }
+
+
+def evaluate(X, names, n_iterations=SA_ITERATIONS, seed=SA_SEED, block_size=BLOCK_SIZE):
+    """Simulate every parameter set (rows of X). Returns (P, n_outputs) outputs."""
+    rng = np.random.default_rng(seed)
+    headcount = np.array([ROLE_HEADCOUNT[r] for r in ROLES])
+    out = np.empty((len(X), len(output_names())))
+    for start in range(0, len(X), block_size):
+        block = X[start:start + block_size]
+        args = _unpack(block, names)
+        _, losses = simulate_compound_losses((len(block), n_iterations, len(ROLES)), rng=rng,
+                                             headcount=headcount, **args)
+        total = losses.sum(axis=2)
+        out[start:start + len(block), 0] = total.mean(axis=1)
+        out[start:start + len(block), 1] = np.percentile(total, 95, axis=1)
+        out[start:start + len(block), 2:] = losses.mean(axis=1)
+    return out
+
+
+def _scale(unit, space):
+    low = np.array([s[1] for s in space])
+    high = np.array([s[2] for s in space])
+    return low + unit * (high - low)
+
+
+def morris(space, trajectories=20, levels=4, seed=SA_SEED, **eval_kwargs):
+    """Elementary-effects screening. Returns {output: {param: {mu_star, sigma}}}."""
+    rng = np.random.default_rng(seed)
+    k = len(space)
+    delta = levels / (2 * (levels - 1))
+    grid = np.arange(levels // 2) / (levels - 1)   # start points that leave room for +delta
+
+    points, steps = [], []
+    for _ in range(trajectories):
+        x = rng.choice(grid, size=k)
+        order = rng.permutation(k)
+        sign = rng.choice([-1, 1], size=k)
+        x = np.where(sign < 0, x + delta, x)       # start high where we step down
+        traj = [x.copy()]
+        for i in order:
+            x = x.copy()
+            x[i] += sign[i] * delta
+            traj.append(x)
+        points.append(np.array(traj))
+        steps.append((order, sign))
+
+    X = _scale(np.concatenate(points), space)
+    Y = evaluate(X, [s[0] for s in space], **eval_kwargs).reshape(trajectories, k + 1, -1)
+
+    effects = np.empty((trajectories, k, Y.shape[2]))
+    for t, (order, sign) in enumerate(steps):
+        for j, i in enumerate(order):
+            effects[t, i] = (Y[t, j + 1] - Y[t, j]) / (sign[i] * delta)
+
+    return {
+        out: {
+            s[0]: {"mu_star": float(np.abs(effects[:, i, o]).mean()),
+                   "sigma": float(effects[:, i, o].std(ddof=1))}
+            for i, s in enumerate(space)
+        }
+        for o, out in enumerate(output_names())
+    }
+
+
+def sobol(space, samples=256, seed=SA_SEED, **eval_kwargs):
+    """
+    Saltelli design with the Saltelli (2010) S1 and Jansen ST estimators.
+    Returns {output: {param: {S1, ST}}}.
+    """
+    k = len(space)
+    try:
+        from scipy.stats import qmc
+        base = qmc.Sobol(d=2 * k, scramble=True, seed=seed).random(samples)
+    except ImportError:
+        base = np.random.default_rng(seed).random((samples, 2 * k))
+    A, B = base[:, :k], base[:, k:]
+    AB = np.repeat(A[None], k, axis=0)
+    AB[np.arange(k), :, np.arange(k)] = B.T
+
+    X = _scale(np.concatenate([A, B, AB.reshape(-1, k)]), space)
+    Y = evaluate(X, [s[0] for s in space], **eval_kwargs)
+    fA, fB = Y[:samples], Y[samples:2 * samples]
+    fAB = Y[2 * samples:].reshape(k, samples, -1)
+
+    var = np.var(np.concatenate([fA, fB]), axis=0)
+    var = np.where(var > 0, var, np.nan)
+    S1 = (fB[None] * (fAB - fA[None])).mean(axis=1) / var
+    ST = 0.5 * ((fA[None] - fAB) ** 2).mean(axis=1) / var
+
+    return {
+        out: {s[0]: {"S1": float(np.nan_to_num(S1[i, o])), "ST": float(np.nan_to_num(ST[i, o]))}
+              for i, s in enumerate(space)}
+        for o, out in enumerate(output_names())
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sobol / Morris sensitivity analysis of the Monte Carlo inputs")
+    parser.add_argument("--method", choices=["sobol", "morris"], default="sobol")
+    parser.add_argument("--samples", type=int, default=256, help="Sobol base samples N")
+    parser.add_argument("--trajectories", type=int, default=20, help="Morris trajectories r")
+    parser.add_argument("--iterations", type=int, default=SA_ITERATIONS)
+    parser.add_argument("--seed", type=int, default=SA_SEED)
+    args = parser.parse_args()
+
+    space = parameter_space()
+    if args.method == "sobol":
+        indices = sobol(space, args.samples, seed=args.seed, n_iterations=args.iterations)
+        rank_key = "ST"
+    else:
+        indices = morris(space, args.trajectories, seed=args.seed, n_iterations=args.iterations)
+        rank_key = "mu_star"
+
+    OUTPUT_DIR_SENSITIVITY.mkdir(parents=True, exist_ok=True)
+    json_path = OUTPUT_DIR_SENSITIVITY / f"sensitivity_{args.method}.json"
+    with open(json_path, "w") as f:
+        json.dump({"method": args.method, "parameters": [s[0] for s in space], "indices": indices}, f, indent=2)
+
+    print(f"Sensitivity of mean EAL ({args.method}), ranked by {rank_key}:")
+    for name, idx in sorted(indices["mean_eal"].items(), key=lambda kv: -kv[1][rank_key]):
+        print(f"  {name:<22} " + "  ".join(f"{k}={v:.3g}" for k, v in idx.items()))
+    print(f"Saved to {json_path}")
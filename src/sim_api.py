@@ -0,0 +1,308 @@
+"""
+Local HTTP API for Monte Carlo EAL numbers.
+
+Reporting notebooks and the budget exporter need the same statistics the
+dashboard shows without driving Streamlit. This service answers them as JSON
+(no figures, nothing written to Outputs/):
+
+    POST /simulate   {"mitigation_weight": 0.4} or {"controls": [name or key, ...]},
+                     plus optional iterations, seed, percentiles, dependence
+    GET  /simulate?controls=insiderriskdlp&iterations=20000&percentiles=50,99
+    GET  /controls   control catalogue with weights
+    GET  /health     cache and in-flight counters
+
+Requests are normalised to a key: the model inputs fingerprint (inputs_hash,
+recomputed when the dataset or loss table changes on disk), the resolved
+mitigation weight, iterations, seed, sorted percentiles and
+dependence model. Two control sets with the same summed weight share a key. Per key:
+  - a finished result is served from an LRU cache (CACHE_SIZE entries);
+  - a result still being computed is awaited by every identical request,
+    so a burst of the same question costs one simulation;
+  - otherwise the simulation (mitigated and baseline run, vectorised engine)
+    goes to a ProcessPoolExecutor, so the event loop keeps serving other
+    requests while the CPU work runs.
+The X-Cache response header says which of the three happened (hit,
+coalesced, miss).
+
+Usage:
+    python3 sim_api.py --port 8081 --workers 4
+    curl -s localhost:8081/simulate -d '{"controls": ["Insider Risk & DLP"], "percentiles": [50, 99]}'
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from batch_runner import resolve_mitigation_weight
+from monte_carlo import (DEPENDENCE_MODELS, N_ITER, ROLES, SEED, inputs_hash, refresh_inputs,
+                         run_vectorized_simulation)
+
+CACHE_SIZE = 256                 # finished results kept (LRU)
+MAX_ITERATIONS = 1_000_000       # per run; each request runs two
+DEFAULT_PERCENTILES = (5, 50, 95)
+MAX_BODY_BYTES = 64 * 1024
+REQUEST_TIMEOUT = 30.0           # seconds to receive a request's headers and body
+
+
+def simulation_key(params, solutions):
+    """
+    Canonical (mitigation_weight, iterations, seed, percentiles, dependence)
+    of a request dict. Raises ValueError on anything the simulation cannot take.
+    """
+    unknown = set(params) - {"mitigation_weight", "controls", "iterations", "seed", "percentiles", "dependence"}
+    if unknown:
+        raise ValueError(f"unknown parameters: {sorted(unknown)}")
+    if "controls" in params and "mitigation_weight" in params:
+        raise ValueError("give either controls or mitigation_weight, not both")
+
+    if isinstance(params.get("controls"), str):
+        params = {**params, "controls": [params["controls"]]}
+    weight = resolve_mitigation_weight({"name": "request", **params}, solutions)
+    if not 0.0 <= weight <= 1.0:
+        raise ValueError(f"mitigation weight {weight:g} is outside [0, 1]")
+    iterations = int(params.get("iterations", N_ITER))
+    if not 1 <= iterations <= MAX_ITERATIONS:
+        raise ValueError(f"iterations must be between 1 and {MAX_ITERATIONS:,}")
+    percentiles = tuple(sorted({float(q) for q in params.get("percentiles", DEFAULT_PERCENTILES)}))
+    if not all(0.0 <= q <= 100.0 for q in percentiles):
+        raise ValueError("percentiles must be between 0 and 100")
+    dependence = params.get("dependence") or None
+    if dependence == "independent":
+        dependence = None
+    if dependence is not None and dependence not in DEPENDENCE_MODELS:
+        raise ValueError(f"unknown dependence model {dependence!r}, expected one of {list(DEPENDENCE_MODELS)}")
+    return round(weight, 6), iterations, int(params.get("seed", SEED)), percentiles, dependence
+
+
+def simulation_stats(mitigation_weight, iterations, seed, percentiles, dependence):
+    """
+    Pool entry point: the generate_monte_carlo_results statistics for one key,
+    with the requested percentiles, as a JSON-ready dict.
+    """
+    from tail_metrics import tail_metrics
+
+    refresh_inputs()                 # this worker may still hold the inputs of an older dataset
+    start = time.perf_counter()
+    results = run_vectorized_simulation(mitigation_weight, iterations, dependence, seed)
+    baseline = run_vectorized_simulation(0.0, iterations, dependence, seed)
+
+    def distribution(x):
+        x = np.asarray(x, dtype=float)
+        values = np.percentile(x, percentiles) if percentiles else []
+        return {f"p{q:g}": float(v) for q, v in zip(percentiles, values)} | {"min": float(x.min()),
+                                                                              "max": float(x.max())}
+
+    total = results['total_loss']
+    mean_loss, baseline_mean = float(total.mean()), float(baseline['total_loss'].mean())
+    savings = baseline_mean - mean_loss
+    role_matrix = np.column_stack([results['by_role'][role] for role in ROLES])
+    return {
+        'request': {'mitigation_weight': mitigation_weight, 'effective_vulnerability': results['effective_vulnerability'],
+                    'iterations': iterations, 'seed': seed, 'percentiles': list(percentiles),
+                    'dependence': dependence or 'independent'},
+        'total_company_loss': {'mean_eal': mean_loss, **distribution(total)},
+        'loss_by_role': {
+            role: {'mean_loss': float(results['by_role'][role].mean()),
+                   'mean_incidents': float(results['incidents_by_role'][role].mean()),
+                   **distribution(results['by_role'][role])}
+            for role in ROLES
+        },
+        'tail_metrics': tail_metrics(total, role_matrix, ROLES)['levels'],
+        'comparison': {
+            'baseline_mean_eal': baseline_mean,
+            'with_mitigation_mean_eal': mean_loss,
+            'total_savings': savings,
+            'savings_percentage': savings / baseline_mean * 100 if baseline_mean > 0 else 0.0,
+        },
+        'seconds': time.perf_counter() - start,
+    }
+
+
+class SimulationService:
+    """
+    Request coalescing, LRU cache and process-pool offload around simulation_stats.
+
+    Args:
+        workers (int): simulation processes (default: one per core)
+        cache_size (int): finished results kept
+    """
+
+    def __init__(self, workers=None, cache_size=CACHE_SIZE):
+        from portfolio import load_software_solutions
+
+        self.solutions = load_software_solutions()
+        self.workers = workers or os.cpu_count()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        # Load the model inputs here and in the workers now, not on the first request. Starting the
+        # workers before any client connects also keeps client sockets out of the forked processes.
+        inputs_hash()
+        self.pool.submit(inputs_hash).result()
+        self.cache_size = cache_size
+        self.cache = OrderedDict()     # key -> result, most recently used last
+        self.in_flight = {}            # key -> asyncio.Future of the running simulation
+        self.counters = {"requests": 0, "hits": 0, "coalesced": 0, "misses": 0, "errors": 0}
+
+    async def simulate(self, params):
+        """(result, 'hit' | 'coalesced' | 'miss') for a request dict."""
+        key = (inputs_hash(),) + simulation_key(params, self.solutions)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.counters["hits"] += 1
+            return self.cache[key], "hit"
+        if key in self.in_flight:
+            self.counters["coalesced"] += 1
+            # shield: one client going away must not cancel the shared run
+            return await asyncio.shield(self.in_flight[key]), "coalesced"
+
+        self.counters["misses"] += 1
+        future = asyncio.get_running_loop().run_in_executor(self.pool, simulation_stats, *key[1:])
+        self.in_flight[key] = future
+        try:
+            result = await asyncio.shield(future)
+        finally:
+            self.in_flight.pop(key, None)
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result, "miss"
+
+    def health(self):
+        return {"status": "ok", "cached": len(self.cache), "in_flight": len(self.in_flight), **self.counters}
+
+    async def route(self, method, target, body):
+        """(status, payload, extra headers) for one request."""
+        url = urlsplit(target)
+        if url.path == "/health":
+            return HTTPStatus.OK, self.health(), {}
+        if url.path == "/controls":
+            return HTTPStatus.OK, {name: {"key": m["key"], "weight": m["weight"], "cost": m["cost"]}
+                                   for name, m in self.solutions.items()}, {}
+        if url.path != "/simulate":
+            return HTTPStatus.NOT_FOUND, {"error": f"no such endpoint {url.path}"}, {}
+
+        if method == "POST":
+            params = json.loads(body or b"{}")
+            if not isinstance(params, dict):
+                raise ValueError("request body must be a JSON object")
+        elif method == "GET":
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            for k in ("controls", "percentiles"):
+                if k in params:
+                    params[k] = [v.strip() for v in params[k].split(",") if v.strip()]
+        else:
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "use GET or POST"}, {}
+        result, cache = await self.simulate(params)
+        return HTTPStatus.OK, result, {"X-Cache": cache}
+
+    async def handle_connection(self, reader, writer):
+        """HTTP/1.1 with keep-alive; one request at a time per connection."""
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), REQUEST_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except ValueError as exc:                  # malformed request line or Content-Length
+                    self.counters["errors"] += 1
+                    writer.write(encode_response(HTTPStatus.BAD_REQUEST, {"error": str(exc)}, keep_alive=False))
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, target, headers, body = request
+                self.counters["requests"] += 1
+                try:
+                    status, payload, extra = await self.route(method, target, body)
+                except (ValueError, TypeError) as exc:     # includes malformed JSON
+                    status, payload, extra = HTTPStatus.BAD_REQUEST, {"error": str(exc)}, {}
+                except Exception as exc:
+                    status, payload, extra = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": repr(exc)}, {}
+                if status >= 400:
+                    self.counters["errors"] += 1
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(encode_response(status, payload, extra, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+async def read_request(reader):
+    """
+    (method, target, headers, body) of the next request, or None when the client
+    is done. Raises ValueError on a malformed request line or Content-Length.
+    """
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    parts = line.decode("latin-1").split()
+    if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+        raise ValueError(f"malformed request line {line[:80]!r}")
+    method, target, _ = parts
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise ValueError(f"invalid Content-Length {headers['content-length']!r}") from None
+    if length < 0:
+        raise ValueError(f"invalid Content-Length {length}")
+    if length > MAX_BODY_BYTES:
+        raise ConnectionError(f"request body of {length} bytes is too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+def encode_response(status, payload, extra_headers=None, keep_alive=True):
+    body = json.dumps(payload).encode()
+    headers = {"Content-Type": "application/json", "Content-Length": str(len(body)),
+               "Connection": "keep-alive" if keep_alive else "close", **(extra_headers or {})}
+    head = f"HTTP/1.1 {status.value} {status.phrase}\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+    return head.encode("latin-1") + b"\r\n" + body
+
+
+async def main(args):
+    service = SimulationService(args.workers, args.cache_size)
+    server = await asyncio.start_server(service.handle_connection, args.host, args.port)
+    print(f"Simulation API on http://{args.host}:{args.port} "
+          f"({service.workers} simulation workers)", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Monte Carlo EAL statistics over local HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--workers", type=int, default=None, help="simulation processes (default: one per core)")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
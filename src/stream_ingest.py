@@ -0,0 +1,374 @@
+"""
+Streaming ingest service for BillyBank activity records.
+
+Records follow the row schema written by generator.py (user_id, role, region,
+day, the nine behavioural features, ...). They are read as newline-delimited
+JSON or CSV, either tailed from a file or received on a local TCP socket,
+micro-batched, scored and turned into alerts.
+
+Scoring per record:
+  - opportunity: the role-weighted >2 sigma deviation score from generator.py
+  - z-spike: the largest per-feature z-score against the user's own running
+    baseline (Welford mean/variance), once the user has WARMUP_DAYS of history
+
+Memory is bounded in two places: the record queue has a fixed size (a full
+queue stops the readers, which stops reading from the socket/file) and the
+per-user state lives in fixed-size arrays with least-recently-seen eviction.
+
+Usage:
+    python3 stream_ingest.py --socket --port 8765
+    python3 generator.py --replay --port 8765 --rate 20000
+"""
+import argparse
+import asyncio
+import csv
+import json
+import sys
+import time
+from collections import OrderedDict, deque
+import numpy as np
+
+from generator import FEATURES, ROLE_INDEX, ROLE_BEHAVIOR_STD, ROLES, opportunity_scores
+
+QUEUE_MAXSIZE = 10000        # records buffered between readers and the scorer
+BATCH_SIZE = 512             # max records per micro-batch
+BATCH_TIMEOUT = 0.05         # seconds to wait for a micro-batch to fill
+MAX_TRACKED_USERS = 100000   # per-user baselines kept in memory
+WARMUP_DAYS = 20             # history needed before z-spikes are trusted
+Z_SPIKE_ALERT = 4.0
+OPPORTUNITY_ALERT = 2.0
+LATENCY_SAMPLES = 100000     # latency observations kept for percentiles
+READ_CHUNK_BYTES = 1 << 16   # read_file reads about this much (whole lines) per worker-thread call
+NUMERIC_FIELDS = FEATURES + ["is_hr_flagged", "conscientiousness", "neuroticism"]
+
+# Floor for the per-user standard deviation, so a user with a perfectly flat
+# history does not alert on a +1 change. Half the role-level std.
+_STD_FLOOR = 0.5 * np.array([[ROLE_BEHAVIOR_STD[r][f] for f in FEATURES] for r in ROLES])
+
+
+class UserState:
+    """
+    Running per-user feature mean/variance in preallocated arrays.
+    Slots are recycled least-recently-seen first once MAX_TRACKED_USERS is hit.
+    """
+
+    def __init__(self, capacity=MAX_TRACKED_USERS):
+        self.capacity = capacity
+        self.slots = OrderedDict()   # user_id -> slot
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.mean = np.zeros((capacity, len(FEATURES)))
+        self.m2 = np.zeros((capacity, len(FEATURES)))
+        self.evicted = 0
+
+    def lookup(self, user_ids):
+        slots = np.empty(len(user_ids), dtype=np.int64)
+        for i, uid in enumerate(user_ids):
+            slot = self.slots.get(uid)
+            if slot is not None:
+                self.slots.move_to_end(uid)
+            elif len(self.slots) < self.capacity:
+                slot = len(self.slots)
+                self.slots[uid] = slot
+            else:
+                _, slot = self.slots.popitem(last=False)
+                self.slots[uid] = slot
+                self.count[slot] = 0
+                self.mean[slot] = 0.0
+                self.m2[slot] = 0.0
+                self.evicted += 1
+            slots[i] = slot
+        return slots
+
+    def z_spikes(self, slots, role_codes, X):
+        """Largest positive z-score per record against the user baseline (0 during warm-up)."""
+        n = self.count[slots]
+        var = np.divide(self.m2[slots], (n - 1)[:, None], out=np.zeros(X.shape), where=(n > 1)[:, None])
+        std = np.maximum(np.sqrt(var), _STD_FLOOR[role_codes])
+        z = (X - self.mean[slots]) / std
+        z[n < WARMUP_DAYS] = 0.0
+        return np.maximum(z.max(axis=1), 0.0)
+
+    def update(self, slots, X):
+        # A user can appear more than once in a batch; apply those updates in
+        # rounds so every round touches each slot at most once.
+        order = np.argsort(slots, kind="stable")
+        sorted_slots = slots[order]
+        first = np.r_[True, sorted_slots[1:] != sorted_slots[:-1]]
+        group_start = np.maximum.accumulate(np.where(first, np.arange(len(order)), 0))
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order)) - group_start
+
+        for r in range(rank.max() + 1 if len(rank) else 0):
+            idx = np.flatnonzero(rank == r)
+            s, x = slots[idx], X[idx]
+            self.count[s] += 1
+            delta = x - self.mean[s]
+            self.mean[s] += delta / self.count[s][:, None]
+            self.m2[s] += delta * (x - self.mean[s])
+
+
+def decode_line(raw):
+    """Stripped text of one raw input line, or None if it is not valid UTF-8."""
+    try:
+        return raw.decode().strip()
+    except UnicodeDecodeError:
+        return None
+
+
+def parse_record(line, fmt, header=None):
+    """Parse one NDJSON or CSV line into a record dict (None if it is unusable)."""
+    if fmt == "json":
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            return None
+    else:
+        values = next(csv.reader([line]))
+        if header is None or len(values) != len(header):
+            return None
+        record = dict(zip(header, values))
+    if not isinstance(record, dict) or record.get("role") not in ROLE_INDEX:
+        return None
+    if not record.get("user_id") or not record.get("day"):
+        return None
+    # Coerce numeric fields here so one bad value drops this record, not the scorer
+    try:
+        for field in NUMERIC_FIELDS:
+            record[field] = float(record.get(field) or 0)
+        if record.get("emitted_at") is not None:
+            record["emitted_at"] = float(record["emitted_at"])
+    except (TypeError, ValueError):
+        return None
+    return record
+
+
+class IngestService:
+    """
+    Scores micro-batches of activity records and emits alerts as NDJSON.
+
+    Args:
+        alert_stream: file-like object alerts are written to
+        detector: optional train_detector.Detector; its probability is added
+                  to each alert
+    """
+
+    def __init__(self, alert_stream=sys.stdout, batch_size=BATCH_SIZE, batch_timeout=BATCH_TIMEOUT,
+                 queue_maxsize=QUEUE_MAXSIZE, max_users=MAX_TRACKED_USERS, detector=None):
+        self.queue = asyncio.Queue(maxsize=queue_maxsize)
+        self.state = UserState(max_users)
+        self.alert_stream = alert_stream
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.detector = detector
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.processed = 0
+        self.batches = 0
+        self.alerts = 0
+        self.rejected = 0
+        self.failed_batches = 0
+        self.started = None
+
+    async def submit(self, record):
+        # Blocks when the queue is full - this is the backpressure point
+        await self.queue.put(record)
+
+    async def read_file(self, path, fmt="json", follow=False, poll_interval=0.2):
+        """
+        Read (and optionally tail, like `tail -f`) an NDJSON or CSV file.
+        The blocking reads run in a worker thread, about READ_CHUNK_BYTES of
+        whole lines at a time, so the event loop keeps serving the scorer and
+        the sockets meanwhile.
+        """
+        header, partial = None, b""
+        with open(path, "rb") as f:
+            while True:
+                lines = await asyncio.to_thread(f.readlines, READ_CHUNK_BYTES)
+                if not lines:
+                    if not follow:
+                        break
+                    await asyncio.sleep(poll_interval)
+                    continue
+                lines[0] = partial + lines[0]
+                partial = b""
+                if follow and not lines[-1].endswith(b"\n"):
+                    partial = lines.pop()      # the writer is mid-line; finish it on the next read
+                for raw in lines:
+                    line = decode_line(raw)
+                    if line is None:
+                        self.rejected += 1
+                        continue
+                    if not line:
+                        continue
+                    if fmt == "csv" and header is None:
+                        header = next(csv.reader([line]))
+                        continue
+                    await self._accept(parse_record(line, fmt, header))
+
+    async def handle_connection(self, reader, writer):
+        """One socket client: NDJSON by default, CSV if the first line is a CSV header."""
+        fmt, header = "json", None
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            line = decode_line(line)
+            if line is None:                 # not UTF-8: count it, keep the connection
+                self.rejected += 1
+                continue
+            if not line:
+                continue
+            if header is None and fmt == "json" and not line.startswith("{"):
+                fmt, header = "csv", next(csv.reader([line]))
+                continue
+            await self._accept(parse_record(line, fmt, header))
+        writer.close()
+
+    async def _accept(self, record):
+        if record is None:
+            self.rejected += 1
+            return
+        record["_received_at"] = time.time()
+        await self.submit(record)
+
+    async def _next_batch(self):
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.batch_timeout
+        while len(batch) < self.batch_size and batch[-1] is not None:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        """Consume the queue until a None sentinel is received."""
+        while True:
+            batch = await self._next_batch()
+            if self.started is None:
+                self.started = time.perf_counter()
+            done = batch[-1] is None
+            records = [r for r in batch if r is not None]
+            if records:
+                try:
+                    self.score_batch(records)
+                except Exception as exc:
+                    # Skip the batch rather than end the consumer (readers would block on a full queue)
+                    self.failed_batches += 1
+                    self.rejected += len(records)
+                    print(f"Dropped a batch of {len(records)} records: {exc!r}", file=sys.stderr)
+            if done:
+                break
+
+    def score_batch(self, records):
+        user_ids = [r["user_id"] for r in records]
+        role_codes = np.array([ROLE_INDEX[r["role"]] for r in records])
+        X = np.array([[float(r.get(f) or 0) for f in FEATURES] for r in records])
+
+        slots = self.state.lookup(user_ids)
+        opportunity = opportunity_scores(role_codes, X)
+        z_spike = self.state.z_spikes(slots, role_codes, X)
+        self.state.update(slots, X)
+        probability = self._detector_probability(records, role_codes, X) if self.detector is not None else None
+
+        flagged = np.flatnonzero((opportunity >= OPPORTUNITY_ALERT) | (z_spike >= Z_SPIKE_ALERT))
+        for i in flagged:
+            r = records[i]
+            alert = {
+                "user_id": r["user_id"],
+                "role": r["role"],
+                "region": r.get("region"),
+                "day": r.get("day"),
+                "opportunity": round(float(opportunity[i]), 3),
+                "z_spike": round(float(z_spike[i]), 3),
+            }
+            if probability is not None:
+                alert["probability"] = float(probability[i])
+            self.alert_stream.write(json.dumps(alert) + "\n")
+        self.alerts += len(flagged)
+
+        now = time.time()
+        for r in records:
+            emitted = r.get("emitted_at")
+            self.latencies.append(now - float(emitted if emitted is not None else r["_received_at"]))
+        self.processed += len(records)
+        self.batches += 1
+
+    def _detector_probability(self, records, role_codes, X):
+        from train_detector import design_matrix
+        hr = [float(r.get("is_hr_flagged") or 0) for r in records]
+        consc = [float(r.get("conscientiousness") or 0) for r in records]
+        neuro = [float(r.get("neuroticism") or 0) for r in records]
+        return self.detector.predict_proba(design_matrix(role_codes, X, hr, consc, neuro, self.detector.table))
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        lat = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+        return {
+            "events": self.processed,
+            "batches": self.batches,
+            "alerts": self.alerts,
+            "rejected": self.rejected,
+            "failed_batches": self.failed_batches,
+            "evicted_users": self.state.evicted,
+            "elapsed_s": round(elapsed, 3),
+            "events_per_s": round(self.processed / elapsed, 1) if elapsed > 0 else 0.0,
+            "latency_ms": {"p50": round(p50, 2), "p95": round(p95, 2), "p99": round(p99, 2)},
+        }
+
+
+async def main(args):
+    detector = None
+    if args.model:
+        from train_detector import load_detector
+        detector = load_detector(args.model)
+    alert_stream = open(args.alerts, "a") if args.alerts else sys.stdout
+    service = IngestService(alert_stream, args.batch_size, args.batch_timeout,
+                            args.queue_size, args.max_users, detector)
+    consumer = asyncio.create_task(service.run())
+
+    if args.socket:
+        server = await asyncio.start_server(service.handle_connection, args.host, args.port)
+        print(f"Listening on {args.host}:{args.port}", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+    else:
+        try:
+            await service.read_file(args.file, args.format, args.follow)
+        except asyncio.CancelledError:
+            pass
+
+    await service.queue.put(None)
+    await consumer
+    if alert_stream is not sys.stdout:
+        alert_stream.close()
+    print(json.dumps(service.summary(), indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score BillyBank activity records as they arrive")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="NDJSON/CSV file to read")
+    source.add_argument("--socket", action="store_true", help="accept records on a local TCP socket")
+    parser.add_argument("--format", choices=["json", "csv"], default="json", help="file format (sockets auto-detect)")
+    parser.add_argument("--follow", action="store_true", help="keep tailing the file for new records")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--alerts", help="append alerts to this file instead of stdout")
+    parser.add_argument("--model", help="detector artifact from train_detector.py")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--batch-timeout", type=float, default=BATCH_TIMEOUT)
+    parser.add_argument("--queue-size", type=int, default=QUEUE_MAXSIZE)
+    parser.add_argument("--max-users", type=int, default=MAX_TRACKED_USERS)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,302 @@
+"""
+Tail metrics for the simulated annual loss distribution.
+
+Risk committees read the loss distribution through its tail: the 1-in-100
+and 1-in-200 year losses (VaR), the average loss given that such a year
+happens (TVaR / expected shortfall) and the loss-exceedance curve. Only the
+largest ceil(n * (1 - level)) losses matter for any of these, so nothing is
+sorted in full:
+  - TailReservoir keeps the top `capacity` annual losses (and the per-role
+    split of those years) seen so far. Each update drops the chunk years
+    below the smallest kept loss and runs one np.argpartition over the rest
+    plus the reservoir, so 100M+ simulated years can be streamed in chunks
+    with memory bounded by the chunk size and the capacity.
+  - VaR / TVaR at several levels come from a single np.partition of the
+    reservoir with one kth index per level.
+  - Per-role TVaR contributions use the Euler allocation: the contribution
+    of role r is E[L_r | L >= VaR], the mean role loss over the tail years.
+    The contributions add up exactly to the TVaR.
+
+Conventions: with k = ceil(n * (1 - level)) tail years, VaR is the smallest
+and TVaR the mean of the k largest annual losses.
+
+Usage:
+    python3 tail_metrics.py --iterations 10000000 --chunk-size 100000
+    python3 tail_metrics.py --iterations 100000000 --backend pool --workers 8
+"""
+import argparse
+import json
+import time
+import numpy as np
+
+TAIL_LEVELS = [0.95, 0.99, 0.995]        # 1-in-20, 1-in-100, 1-in-200 years
+RETURN_PERIODS = np.unique(np.round(np.logspace(1, 6, 26)).astype(int))   # 10 .. 1,000,000 years
+STREAM_CHUNK_SIZE = 100_000
+TAIL_SEED = 80
+
+
+def tail_size(n, level):
+    """Number of tail years k = ceil(n * (1 - level)), at least 1."""
+    return max(int(np.ceil(n * (1 - level) - 1e-9)), 1)
+
+
+class TailReservoir:
+    """
+    Bounded store of the largest annual losses seen so far.
+
+    Args:
+        capacity (int): number of tail years kept; metrics are available for
+                        levels with tail_size(n, level) <= capacity
+        n_roles (int): width of the per-role loss rows kept with each year
+    """
+
+    def __init__(self, capacity, n_roles=0):
+        self.capacity = int(capacity)
+        self.n = 0
+        self.loss_sum = 0.0
+        self.values = np.empty(0)
+        self.role_values = np.empty((0, n_roles))
+
+    def update(self, total, by_role=None):
+        """Add a chunk of annual losses (n,) and their per-role split (n, roles)."""
+        total = np.asarray(total, dtype=np.float64)
+        by_role = np.empty((len(total), self.role_values.shape[1])) if by_role is None else np.asarray(by_role)
+        self.n += len(total)
+        self.loss_sum += float(total.sum())
+
+        # Once full, only years above the current smallest kept loss can enter
+        if len(self.values) == self.capacity:
+            above = total > self._floor
+            total, by_role = total[above], by_role[above]
+
+        values = np.concatenate([self.values, total])
+        role_values = np.concatenate([self.role_values, by_role])
+        if len(values) > self.capacity:
+            keep = np.argpartition(values, len(values) - self.capacity)[-self.capacity:]
+            values, role_values = values[keep], role_values[keep]
+        self.values, self.role_values = values, role_values
+        self._floor = values.min() if len(values) else -np.inf
+
+    def merge(self, other):
+        """Fold in another reservoir, e.g. the partial result of one chunk from a worker."""
+        n, loss_sum = self.n + other.n, self.loss_sum + other.loss_sum
+        self.update(other.values, other.role_values)
+        self.n, self.loss_sum = n, loss_sum
+
+    def min_level(self):
+        """Lowest level whose tail still fits in the reservoir."""
+        return 1 - self.capacity / self.n if self.n else 1.0
+
+    def _check(self, k, level):
+        if k > len(self.values):
+            raise ValueError(f"level {level} needs {k} tail years, reservoir holds {len(self.values)}")
+
+    def var_tvar(self, levels=TAIL_LEVELS):
+        """{level: (VaR, TVaR)} from one partition of the reservoir."""
+        m = len(self.values)
+        ks = [tail_size(self.n, a) for a in levels]
+        for k, a in zip(ks, levels):
+            self._check(k, a)
+        part = np.partition(self.values, sorted({m - k for k in ks}))
+        return {a: (float(part[m - k]), float(part[m - k:].mean())) for a, k in zip(levels, ks)}
+
+    def allocation(self, level):
+        """Euler allocation of TVaR at `level`: mean per-role loss over the tail years."""
+        k = tail_size(self.n, level)
+        self._check(k, level)
+        tail = np.argpartition(self.values, len(self.values) - k)[-k:]
+        return self.role_values[tail].mean(axis=0)
+
+    def exceedance_curve(self, return_periods=RETURN_PERIODS):
+        """(return periods, exceedance probabilities, losses) for every period the reservoir covers."""
+        periods = np.asarray(return_periods)
+        periods = periods[(periods <= self.n) & (self.n / periods <= len(self.values))]
+        if len(periods) == 0:
+            return periods, np.empty(0), np.empty(0)
+        levels = 1 - 1 / periods
+        var = self.var_tvar(levels)
+        return periods, 1 / periods, np.array([var[a][0] for a in levels])
+
+    def report(self, levels=TAIL_LEVELS, role_names=None, return_periods=RETURN_PERIODS):
+        """JSON-ready summary: VaR, TVaR and per-role TVaR contribution per level, plus the curve."""
+        levels = [a for a in levels if tail_size(self.n, a) <= len(self.values)]
+        var_tvar = self.var_tvar(levels)
+        periods, prob, losses = self.exceedance_curve(return_periods)
+        role_names = role_names or [f"role_{i}" for i in range(self.role_values.shape[1])]
+        return {
+            'iterations': int(self.n),
+            'mean': self.loss_sum / self.n,
+            'levels': [
+                {
+                    'level': float(a),
+                    'return_period': float(1 / (1 - a)),
+                    'var': var_tvar[a][0],
+                    'tvar': var_tvar[a][1],
+                    'tvar_contribution': dict(zip(role_names, map(float, self.allocation(a)))),
+                }
+                for a in levels
+            ],
+            'exceedance_curve': [
+                {'return_period': int(t), 'exceedance_probability': float(p), 'loss': float(x)}
+                for t, p, x in zip(periods, prob, losses)
+            ],
+        }
+
+
+def tail_metrics(total, by_role, role_names, levels=TAIL_LEVELS, return_periods=RETURN_PERIODS):
+    """
+    Tail report for in-memory results.
+
+    Args:
+        total (array): (n,) annual company losses
+        by_role (array): (n, roles) annual loss per role
+        role_names (list): column labels of by_role
+    """
+    n = len(total)
+    lowest = min(list(levels) + [1 - 1 / min(return_periods)])
+    reservoir = TailReservoir(tail_size(n, lowest), len(role_names))
+    reservoir.update(total, by_role)
+    return reservoir.report(levels, role_names, return_periods)
+
+
+def simulate_chunk(params, index):
+    """
+    Simulate chunk `index` of a streamed run and return its TailReservoir
+    (an execution backend task, see backends.py).
+
+    Args:
+        params (dict): n_iterations, chunk_size, capacity, seed, poa,
+            vulnerability, min_loss, max_loss, headcount, dependence. Everything
+            the chunk needs travels in params, so workers need no input files.
+
+    Each chunk draws from its own SeedSequence child (seed, index): the same
+    chunk gives the same years wherever it runs.
+    """
+    from monte_carlo import sample_intensity_multipliers, simulate_compound_losses
+
+    rng = np.random.default_rng(np.random.SeedSequence(params['seed'], spawn_key=(index,)))
+    start = index * params['chunk_size']
+    n = min(params['chunk_size'], params['n_iterations'] - start)
+    poa = np.asarray(params['poa'])
+    if params['dependence'] is not None:
+        poa = np.clip(poa * sample_intensity_multipliers(n, params['dependence'], rng), 0.0, 1.0)
+    _, losses = simulate_compound_losses((n, len(params['headcount'])), poa, rng,
+                                         headcount=np.asarray(params['headcount']),
+                                         vulnerability=params['vulnerability'],
+                                         min_loss=np.asarray(params['min_loss']),
+                                         max_loss=np.asarray(params['max_loss']))
+    reservoir = TailReservoir(min(params['capacity'], n), losses.shape[1])
+    reservoir.update(losses.sum(axis=1), losses)
+    return reservoir
+
+
+def stream_tail_metrics(n_iterations, mitigation_weight=0.0, dependence=None, chunk_size=STREAM_CHUNK_SIZE,
+                        levels=TAIL_LEVELS, capacity=None, seed=TAIL_SEED, backend=None):
+    """
+    Simulate n_iterations years in chunks and keep only the tail.
+
+    Memory is bounded by chunk_size and capacity (default: enough years for
+    the lowest requested level), not by n_iterations.
+
+    Args:
+        backend: backends.py execution backend to run the chunks on (default:
+                 in this process). Chunk reservoirs are merged in chunk order,
+                 so the report does not depend on the backend or worker count.
+    """
+    from monte_carlo import (BASE_VULNERABILITY, DEPENDENCE_MODELS, ROLE_HEADCOUNT, ROLES, load_role_poa,
+                             role_loss_bounds)
+
+    if isinstance(dependence, str):
+        dependence = DEPENDENCE_MODELS[dependence]
+    capacity = capacity or tail_size(n_iterations, min(levels))
+    min_loss, max_loss = role_loss_bounds()
+    params = {
+        'n_iterations': n_iterations,
+        'chunk_size': chunk_size,
+        'capacity': capacity,
+        'seed': seed,
+        'poa': load_role_poa().values.tolist(),
+        'vulnerability': BASE_VULNERABILITY * (1 - mitigation_weight),
+        'min_loss': min_loss.tolist(),
+        'max_loss': max_loss.tolist(),
+        'headcount': [ROLE_HEADCOUNT[r] for r in ROLES],
+        'dependence': dependence,
+    }
+    n_chunks = -(-n_iterations // chunk_size)
+    chunks = (backend.imap("tail_metrics", params, n_chunks) if backend is not None
+              else (simulate_chunk(params, i) for i in range(n_chunks)))
+
+    reservoir = TailReservoir(capacity, len(ROLES))
+    for chunk in chunks:
+        reservoir.merge(chunk)
+    return reservoir.report(levels, ROLES)
+
+
+def plot_tail_metrics(report):
+    """Loss-exceedance curve with VaR markers, and the per-role TVaR split per level."""
+    import matplotlib.pyplot as plt
+
+    fig, (ax_curve, ax_alloc) = plt.subplots(1, 2, figsize=(14, 6), gridspec_kw={'width_ratios': [3, 2]})
+
+    curve = report['exceedance_curve']
+    ax_curve.plot([c['loss'] / 1e6 for c in curve], [c['exceedance_probability'] * 100 for c in curve],
+                  '-o', color='#1e3a8a', markersize=4, linewidth=2)
+    for lvl in report['levels']:
+        ax_curve.axvline(lvl['var'] / 1e6, color='#DC143C', linestyle='--', linewidth=1, alpha=0.7)
+        ax_curve.text(lvl['var'] / 1e6, (1 - lvl['level']) * 100, f" 1-in-{lvl['return_period']:.0f}",
+                      fontsize=9, color='#DC143C', va='bottom')
+    ax_curve.set_yscale('log')
+    ax_curve.set_xlabel('Annual Loss ($ Millions)', fontsize=12, fontweight='bold')
+    ax_curve.set_ylabel('Probability of Exceeding (%)', fontsize=12, fontweight='bold')
+    ax_curve.set_title('Loss-Exceedance Curve', fontsize=14, fontweight='bold')
+    ax_curve.grid(True, alpha=0.3, linestyle='--', linewidth=0.5, which='both')
+
+    labels = [f"1-in-{lvl['return_period']:.0f}" for lvl in report['levels']]
+    bottom = np.zeros(len(labels))
+    roles = list(report['levels'][0]['tvar_contribution']) if report['levels'] else []
+    colors = plt.cm.tab10(np.arange(len(roles)))
+    for role, color in zip(roles, colors):
+        values = np.array([lvl['tvar_contribution'][role] for lvl in report['levels']]) / 1e6
+        if values.any():
+            ax_alloc.bar(labels, values, bottom=bottom, label=role, color=color, edgecolor='black', linewidth=0.8)
+        bottom += values
+    ax_alloc.set_ylabel('TVaR ($ Millions)', fontsize=12, fontweight='bold')
+    ax_alloc.set_title('TVaR Contribution by Role', fontsize=14, fontweight='bold')
+    ax_alloc.legend(fontsize=9)
+    ax_alloc.grid(True, alpha=0.3, axis='y', linestyle='--', linewidth=0.5)
+
+    plt.tight_layout()
+    return fig
+
+
+if __name__ == "__main__":
+    from backends import add_backend_arguments, backend_from_args
+    from monte_carlo import OUTPUT_DIR_MONTE
+
+    parser = argparse.ArgumentParser(description="Streamed VaR / TVaR over a very large number of simulated years")
+    parser.add_argument("--iterations", type=int, default=10_000_000)
+    parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK_SIZE)
+    parser.add_argument("--mitigation-weight", type=float, default=0.0)
+    parser.add_argument("--dependence", default=None, help="DEPENDENCE_MODELS preset")
+    parser.add_argument("--levels", type=float, nargs="+", default=TAIL_LEVELS)
+    parser.add_argument("--seed", type=int, default=TAIL_SEED)
+    add_backend_arguments(parser)
+    args = parser.parse_args()
+
+    backend = backend_from_args(args)
+    start = time.perf_counter()
+    try:
+        report = stream_tail_metrics(args.iterations, args.mitigation_weight, args.dependence,
+                                     args.chunk_size, args.levels, seed=args.seed, backend=backend)
+    finally:
+        backend.close()
+    elapsed = time.perf_counter() - start
+
+    json_path = OUTPUT_DIR_MONTE / "tail_metrics.json"
+    with open(json_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{report['iterations']:,} simulated years in {elapsed:.1f}s ({args.backend}), mean ${report['mean']:,.0f}")
+    for lvl in report['levels']:
+        print(f"  1-in-{lvl['return_period']:<5.0f} VaR ${lvl['var']:>14,.0f}  TVaR ${lvl['tvar']:>14,.0f}")
+    print(f"Saved to {json_path}")
@@ -0,0 +1,248 @@
+"""
+Supervised insider-day detector.
+
+Learns to predict `is_malicious` from the generated activity rows with a
+logistic-regression SGDClassifier trained through partial_fit, so the data is
+streamed in batches (one CSV or a directory of CSV partitions) and never fully
+loaded. Memory and time per step depend on --batch-size, not dataset size.
+
+Malicious days are extremely rare (base daily rates of 0.005%-0.02%), so every
+positive row is kept while negatives are subsampled at NEG_SAMPLE_RATE and
+given weight 1 / NEG_SAMPLE_RATE. The weighted loss is then the same in
+expectation as training on every row, and predicted probabilities stay on the
+true base-rate scale.
+
+Roles are one-hot encoded in RoleTable order. A dataset generated with
+generator.py --role-config needs the same --role-config here; the config is
+stored in the artifact so scoring rebuilds the same table.
+
+The saved artifact is a small .npz of coefficients. Loading it only needs
+numpy, which keeps the scoring path (e.g. stream_ingest.py --model) fast.
+
+Usage:
+    python3 train_detector.py --from-cache
+    python3 train_detector.py --input /tmp/activity.csv --role-config roles.json
+"""
+import argparse
+import json
+from pathlib import Path
+import numpy as np
+
+from feature_cache import FeatureCache, open_feature_cache
+from generator import FEATURES, ROLE_TABLE, build_role_table, load_role_config, opportunity_scores
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+OUTPUT_DIR = BASE_DIR / "Outputs"
+OUTPUT_DIR_MODELS = OUTPUT_DIR / "models"
+DATASET_PATH = OUTPUT_DIR / "Dataset/billybank_activity.csv"
+MODEL_PATH = OUTPUT_DIR_MODELS / "detector.npz"
+
+BATCH_SIZE = 50000
+NEG_SAMPLE_RATE = 0.05    # keep 5% of benign days, each weighted x20
+EPOCHS = 3
+ALPHA = 1e-4              # L2 regularisation strength
+RANDOM_STATE = 42
+
+COLUMNS = ["role"] + FEATURES + ["is_hr_flagged", "conscientiousness", "neuroticism", "is_malicious"]
+
+def feature_names(table=ROLE_TABLE):
+    """Design matrix column names; one role column per role of `table`."""
+    return ([f"log1p_{f}" for f in FEATURES]
+            + ["opportunity", "is_hr_flagged", "conscientiousness", "neuroticism"]
+            + [f"role_{r}" for r in table.roles])
+
+
+FEATURE_NAMES = feature_names()
+
+
+def design_matrix(role_codes, counts, hr_flag, conscientiousness, neuroticism, table=ROLE_TABLE):
+    """
+    Model inputs for a batch of rows, columns in feature_names(table) order.
+    Counts are log1p-compressed and psychometrics scaled to 0-1 so a plain
+    linear model can be trained without a separate scaling pass.
+
+    Args:
+        role_codes: codes in `table` (RoleTable.index)
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    role_onehot = np.zeros((len(role_codes), len(table.roles)))
+    role_onehot[np.arange(len(role_codes)), role_codes] = 1.0
+    return np.column_stack([
+        np.log1p(counts),
+        opportunity_scores(role_codes, counts, table),
+        np.asarray(hr_flag, dtype=np.float64),
+        np.asarray(conscientiousness, dtype=np.float64) / 100.0,
+        np.asarray(neuroticism, dtype=np.float64) / 100.0,
+        role_onehot,
+    ])
+
+
+def role_codes_for(roles, table=ROLE_TABLE):
+    """RoleTable codes for an array of role names. Raises ValueError on a role the table lacks."""
+    roles = np.asarray(roles)
+    unknown = sorted(str(r) for r in set(np.unique(roles)) - set(table.index))
+    if unknown:
+        raise ValueError(f"roles {unknown} are not in the role table; pass the generator's --role-config")
+    return np.array([table.index[r] for r in roles], dtype=np.int64)
+
+
+def frame_to_design(df, table=ROLE_TABLE):
+    role_codes = role_codes_for(df["role"].to_numpy(), table)
+    return design_matrix(role_codes, df[FEATURES].to_numpy(), df["is_hr_flagged"].to_numpy(),
+                         df["conscientiousness"].to_numpy(), df["neuroticism"].to_numpy(), table)
+
+
+def iter_batches(source, batch_size=BATCH_SIZE):
+    """Yield DataFrame batches from a CSV file or every CSV in a directory."""
+    import pandas as pd
+
+    source = Path(source)
+    paths = sorted(source.glob("*.csv")) if source.is_dir() else [source]
+    for path in paths:
+        yield from pd.read_csv(path, usecols=COLUMNS, chunksize=batch_size, keep_default_na=False)
+
+
+def iter_cache_batches(cache, batch_size=BATCH_SIZE):
+    """
+    Yield DataFrame batches straight from a feature_cache.FeatureCache,
+    a block of whole users at a time, without touching the CSV.
+    """
+    import pandas as pd
+
+    users_per_batch = max(1, batch_size // cache.n_days)
+    for start in range(0, cache.n_users, users_per_batch):
+        block = slice(start, start + users_per_batch)
+        users = cache.users[block]
+        values = np.asarray(cache.matrix[block]).reshape(-1, len(cache.channels))
+        batch = pd.DataFrame(values, columns=cache.channels)
+        repeat = cache.n_days
+        batch["role"] = np.repeat(np.array(cache.roles)[users["role"]], repeat)
+        batch["conscientiousness"] = np.repeat(users["conscientiousness"], repeat)
+        batch["neuroticism"] = np.repeat(users["neuroticism"], repeat)
+        yield batch[COLUMNS]
+
+
+def subsample_negatives(y, rng, neg_rate=NEG_SAMPLE_RATE):
+    """Keep all positives and a neg_rate fraction of negatives. Returns (mask, sample_weight)."""
+    keep = (y == 1) | (rng.random(len(y)) < neg_rate)
+    weight = np.where(y[keep] == 1, 1.0, 1.0 / neg_rate)
+    return keep, weight
+
+
+class Detector:
+    """
+    Logistic scoring from a saved artifact (numpy only, no scikit-learn needed).
+
+    Args:
+        table (RoleTable): the role table the model was trained with
+    """
+
+    def __init__(self, coef, intercept, feature_names, table=ROLE_TABLE):
+        self.coef = coef
+        self.intercept = intercept
+        self.feature_names = list(feature_names)
+        self.table = table
+
+    def predict_proba(self, design):
+        z = design @ self.coef + self.intercept
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def score_frame(self, df):
+        return self.predict_proba(frame_to_design(df, self.table))
+
+
+def save_detector(model, path=MODEL_PATH, metadata=None, table=ROLE_TABLE):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(
+        path,
+        coef=model.coef_.ravel().astype(np.float64),
+        intercept=np.float64(model.intercept_[0]),
+        feature_names=np.array(feature_names(table)),
+        role_config=np.array(json.dumps(table.config)),
+        metadata=np.array(json.dumps(metadata or {})),
+    )
+    return path
+
+
+def load_detector(path=MODEL_PATH):
+    with np.load(path) as artifact:
+        config = json.loads(str(artifact["role_config"])) if "role_config" in artifact else {}
+        table = build_role_table(config) if config else ROLE_TABLE
+        if list(artifact["feature_names"]) != feature_names(table):
+            raise ValueError(f"{path} was trained with a different feature layout")
+        return Detector(artifact["coef"], float(artifact["intercept"]), artifact["feature_names"], table)
+
+
+def train(source=DATASET_PATH, batch_size=BATCH_SIZE, neg_rate=NEG_SAMPLE_RATE, epochs=EPOCHS,
+          alpha=ALPHA, seed=RANDOM_STATE, table=ROLE_TABLE):
+    """
+    Stream the dataset `epochs` times through SGDClassifier.partial_fit.
+    `source` is a CSV path, a directory of CSV partitions or a FeatureCache.
+    `table` is the RoleTable the dataset was generated with; roles outside it
+    raise ValueError.
+
+    Each batch is scored before it is trained on (progressive validation), so
+    the reported log loss is an out-of-sample estimate without a holdout pass.
+    """
+    from sklearn.linear_model import SGDClassifier
+
+    if isinstance(source, FeatureCache):
+        role_codes_for(source.roles, table)     # fail before the first epoch, not mid-stream
+    rng = np.random.default_rng(seed)
+    model = SGDClassifier(loss="log_loss", alpha=alpha, learning_rate="optimal", random_state=seed)
+    stats = {"rows_seen": 0, "rows_trained": 0, "positives": 0, "progressive_log_loss": None}
+    loss_sum, loss_weight = 0.0, 0.0
+    fitted = False
+
+    for epoch in range(epochs):
+        batches = iter_cache_batches(source, batch_size) if isinstance(source, FeatureCache) \
+            else iter_batches(source, batch_size)
+        for batch in batches:
+            y = batch["is_malicious"].to_numpy()
+            keep, weight = subsample_negatives(y, rng, neg_rate)
+            if not keep.any():
+                continue
+            X = frame_to_design(batch[keep], table)
+            y = y[keep]
+
+            if fitted and epoch == 0:
+                p = np.clip(model.predict_proba(X)[:, 1], 1e-12, 1 - 1e-12)
+                loss_sum += -(weight * (y * np.log(p) + (1 - y) * np.log(1 - p))).sum()
+                loss_weight += weight.sum()
+
+            model.partial_fit(X, y, classes=np.array([0, 1]), sample_weight=weight)
+            fitted = True
+            if epoch == 0:
+                stats["rows_seen"] += len(batch)
+                stats["positives"] += int(y.sum())
+            stats["rows_trained"] += len(y)
+
+    if loss_weight > 0:
+        stats["progressive_log_loss"] = loss_sum / loss_weight
+    return model, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the insider-day detector out of core")
+    parser.add_argument("--input", default=str(DATASET_PATH), help="activity CSV or directory of CSV partitions")
+    parser.add_argument("--from-cache", action="store_true", help="read batches from the memory-mapped feature cache")
+    parser.add_argument("--output", default=str(MODEL_PATH))
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--neg-rate", type=float, default=NEG_SAMPLE_RATE)
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--seed", type=int, default=RANDOM_STATE)
+    parser.add_argument("--role-config", default=None, help="the generator's --role-config, if it used one")
+    args = parser.parse_args()
+
+    table = build_role_table(load_role_config(args.role_config)) if args.role_config else ROLE_TABLE
+    source = args.input
+    if args.from_cache:
+        source = open_feature_cache()
+        if source is None:
+            raise SystemExit("No up-to-date feature cache found. Run feature_cache.py first.")
+    model, stats = train(source, args.batch_size, args.neg_rate, args.epochs, seed=args.seed, table=table)
+    stats.update({"neg_sample_rate": args.neg_rate, "epochs": args.epochs, "batch_size": args.batch_size})
+    path = save_detector(model, args.output, stats, table)
+    print(json.dumps(stats, indent=2))
+    print(f"Saved detector to {path}")
@@ -0,0 +1,32 @@
+"""
+Shared fixtures. Tests import the flat modules from src/ and never read the
+dataset in Outputs/: the session generates its own with generator.build_dataset.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def dataset(tmp_path_factory):
+    """Activity CSV and feature cache from the current generator, used by the monte_carlo loaders."""
+    import monte_carlo
+    from feature_cache import build_feature_cache
+    from generator import build_dataset
+
+    data_dir = tmp_path_factory.mktemp("dataset")
+    csv_path = data_dir / "billybank_activity.csv"
+    build_dataset().to_csv(csv_path, index=False)
+    build_feature_cache(csv_path, data_dir / "feature_cache")
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(monte_carlo, "DATASET_PATH", csv_path)
+        mp.setattr(monte_carlo, "FEATURE_CACHE_DIR", data_dir / "feature_cache")
+        monte_carlo.load_user_had_incident.cache_clear()
+        monte_carlo.load_role_poa.cache_clear()
+        yield csv_path
+    monte_carlo.load_user_had_incident.cache_clear()
+    monte_carlo.load_role_poa.cache_clear()
@@ -0,0 +1,30 @@
+"""
+Numba engine: distribution parity with the loop engine, and the NumPy
+fallback used when Numba is not installed.
+
+Usage:
+    python3 -m pytest -q tests/test_numba_engine.py
+"""
+import numpy as np
+import pytest
+
+import numba_engine
+from monte_carlo import ROLES, SEED, load_role_poa, role_loss_bounds
+
+
+@pytest.mark.skipif(not numba_engine.HAVE_NUMBA, reason="Numba is not installed")
+def test_parity_with_loop_engine():
+    table, passed = numba_engine.parity_check(seed=SEED)
+    assert passed, f"\n{table.to_string()}"
+
+
+def test_numpy_fallback_shapes(monkeypatch):
+    monkeypatch.setattr(numba_engine, "HAVE_NUMBA", False)
+    min_loss, max_loss = role_loss_bounds()
+    n = 1000
+    incidents, losses = numba_engine.simulate_compound_losses_jit(n, load_role_poa().values,
+                                                                  np.random.default_rng(SEED),
+                                                                  min_loss=min_loss, max_loss=max_loss)
+    assert incidents.shape == losses.shape == (n, len(ROLES))
+    assert (incidents >= 0).all() and (losses >= 0).all()
+    assert (losses[incidents == 0] == 0).all()
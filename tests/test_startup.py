@@ -0,0 +1,56 @@
+"""
+Import-time budget for the modules the dashboard and CLI stages load on
+every run.
+
+Each module is imported in a fresh interpreter with `python -X importtime`
+and its cumulative import time (best of RUNS) must stay within its budget.
+Heavy dependencies those modules only need on some code paths (pandas,
+plotting, scipy, sklearn) must not be imported eagerly.
+
+Usage:
+    python3 -m pytest -q tests/test_startup.py
+"""
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+STARTUP_BUDGET_MS = {
+    "monte_carlo": 200,
+    "tail_metrics": 200,
+    "result_store": 200,
+    "portfolio": 200,
+    "drilldown": 200,
+    "train_detector": 200,
+}
+DEFERRED_MODULES = ["pandas", "matplotlib", "seaborn", "scipy", "sklearn"]
+RUNS = 3
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def import_profile(module):
+    """{imported module: cumulative microseconds} for `import module` in a fresh interpreter."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=SRC_DIR, capture_output=True, text=True, check=True)
+    profile = {}
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            profile[match.group(4)] = int(match.group(2))
+    return profile
+
+
+@pytest.mark.parametrize("module, budget_ms", STARTUP_BUDGET_MS.items())
+def test_import_budget(module, budget_ms):
+    best, eager = float("inf"), set()
+    for _ in range(RUNS):
+        profile = import_profile(module)
+        best = min(best, profile[module] / 1000)
+        eager |= {m for m in DEFERRED_MODULES if m in profile}
+    assert not eager, f"{module} imports {', '.join(sorted(eager))} eagerly"
+    assert best <= budget_ms, f"{module} takes {best:.1f} ms to import, budget {budget_ms} ms"